@@ -13,6 +13,7 @@ https://docs.djangoproject.com/en/5.2/ref/settings/
 from pathlib import Path
 
 import os
+import tempfile
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -131,7 +132,7 @@ CORS_ALLOW_ALL_ORIGINS = True
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'users.authentication.CachedJWTAuthentication',
     ),
     'DEFAULT_SCHEMA_CLASS': 'drf_spectacular.openapi.AutoSchema',
 }
@@ -169,6 +170,8 @@ SIMPLE_JWT = {
     'REFRESH_TOKEN_LIFETIME': timedelta(days=7),
     'ROTATE_REFRESH_TOKENS': False,
     'BLACKLIST_AFTER_ROTATION': True,
+    # tokens carry a digest of the password hash, so changing the password revokes them
+    'CHECK_REVOKE_TOKEN': True,
 }
 
 EMAIL_BACKEND = 'django.core.mail.backends.smtp.EmailBackend'
@@ -189,3 +192,116 @@ AMADEUS_API_SECRET = os.getenv("AMADEUS_API_SECRET")
 
 GENERATOR = os.getenv('TRIP_GENERATOR')
 GEMINI_API_KEY = os.getenv('GEMINI_API_KEY')
+
+REDIS_URL = os.getenv("REDIS_URL")
+FLIGHT_SEARCH_CACHE_TTL = int(os.getenv("FLIGHT_SEARCH_CACHE_TTL", 120))
+
+# Serve the upstream-bound trips views (weather, flights, hotels, city-to-iata) as async views.
+# Only useful when running under ASGI (TravellinoCappuchino.asgi).
+ASYNC_VIEWS = os.getenv("ASYNC_VIEWS", "False") == "True"
+UPSTREAM_TIMEOUT = float(os.getenv("UPSTREAM_TIMEOUT", 15))
+UPSTREAM_CONNECT_TIMEOUT = float(os.getenv("UPSTREAM_CONNECT_TIMEOUT", 3))
+UPSTREAM_KEEPALIVE = 30
+UPSTREAM_POOL_SIZE = int(os.getenv("UPSTREAM_POOL_SIZE", 500))
+UPSTREAM_POOL_PER_HOST = int(os.getenv("UPSTREAM_POOL_PER_HOST", 100))
+
+WEATHER_CACHE_TTL = int(os.getenv("WEATHER_CACHE_TTL", 600))
+WEATHER_TIMEOUT = 5
+WEATHER_BATCH_LIMIT = 50
+WEATHER_MAX_WORKERS = 10
+
+TRIP_PLAN_CACHE_MAX_ENTRIES = int(os.getenv("TRIP_PLAN_CACHE_MAX_ENTRIES", 5000))
+TRIP_PLAN_CACHE_MAX_AGE = timedelta(days=int(os.getenv("TRIP_PLAN_CACHE_MAX_AGE_DAYS", 30)))
+
+# hotel_search prices up to HOTEL_SEARCH_MAX_HOTELS hotels in chunks, several chunks at a time
+HOTEL_SEARCH_MAX_HOTELS = int(os.getenv("HOTEL_SEARCH_MAX_HOTELS", 200))
+HOTEL_OFFERS_CHUNK_SIZE = 20
+HOTEL_OFFERS_MAX_WORKERS = 10
+HOTEL_OFFERS_CHUNK_TIMEOUT = 10
+
+# Optional offline reverse geocoding for hotel addresses: a CSV of address points
+# (lat,lon,street,housenumber or an OpenAddresses export). OSM is used for misses
+# unless OFFLINE_GEOCODER_ONLY is set.
+OFFLINE_GEOCODER_DATASET = os.getenv("OFFLINE_GEOCODER_DATASET")
+OFFLINE_GEOCODER_MAX_DISTANCE_KM = 0.15
+OFFLINE_GEOCODER_ONLY = os.getenv("OFFLINE_GEOCODER_ONLY", "False") == "True"
+# hotel_search asks OSM for at most this many uncached addresses per search; the rest are
+# left out and picked up (and cached) by later searches
+HOTEL_SEARCH_MAX_ONLINE_GEOCODES = int(os.getenv("HOTEL_SEARCH_MAX_ONLINE_GEOCODES", 5))
+
+GEOCODE_TIMEOUT = 5
+GEOCODE_CACHE_TTL = 60 * 60 * 24 * 30
+CATALOG_GEOCODE_BATCH_SIZE = 100
+CATALOG_GEOCODE_WORKERS = 8
+
+# country_list/country_detail responses; invalidated on any Country/City change. Without Redis
+# every worker keeps its own copy, for CATALOG_LOCAL_CACHE_TTL seconds at most
+CATALOG_CACHE_TTL = 60 * 60 * 24
+CATALOG_LOCAL_CACHE_TTL = int(os.getenv("CATALOG_LOCAL_CACHE_TTL", 30))
+CATALOG_CACHE_CONTROL = "public, max-age=0, must-revalidate"
+
+# text search configuration for the tsvector columns behind /search/
+SEARCH_CONFIG = os.getenv("SEARCH_CONFIG", "english")
+
+# /cities/nearby/
+NEARBY_DEFAULT_RADIUS_KM = 300
+NEARBY_MAX_RADIUS_KM = 2000
+
+# /trips/flights/calendar/: ±window days around each date, one cached search per date pair
+PRICE_CALENDAR_DEFAULT_WINDOW = 3
+PRICE_CALENDAR_MAX_WINDOW = 3
+PRICE_CALENDAR_MAX_WORKERS = 5
+PRICE_CALENDAR_TIMEOUT = 20
+
+# Client-side rate limit for every Amadeus endpoint (token bucket, requests per second), optionally
+# shared by all workers through Redis. Calls that would queue longer than AMADEUS_MAX_QUEUE_WAIT get a 429.
+AMADEUS_RATE_LIMIT = float(os.getenv("AMADEUS_RATE_LIMIT", 10))
+AMADEUS_RATE_LIMIT_BURST = int(os.getenv("AMADEUS_RATE_LIMIT_BURST", 10))
+AMADEUS_ENDPOINT_RATE_LIMITS = {}
+AMADEUS_MAX_QUEUE_WAIT = float(os.getenv("AMADEUS_MAX_QUEUE_WAIT", 5))
+AMADEUS_SHARED_RATE_LIMIT = os.getenv("AMADEUS_SHARED_RATE_LIMIT", "False") == "True"
+
+# The Amadeus access token is shared by all workers through Redis, or a file in AMADEUS_TOKEN_DIR
+# without Redis, and refreshed this many seconds before it expires.
+AMADEUS_TOKEN_REFRESH_MARGIN = 60
+AMADEUS_TOKEN_DIR = os.getenv("AMADEUS_TOKEN_DIR", tempfile.gettempdir())
+
+# buckets of the price histogram returned with flight and hotel metrics
+PRICE_HISTOGRAM_BUCKETS = 10
+
+# Every flight and hotel search is recorded for /trips/price-trend/; observations are written in
+# batches of PRICE_HISTORY_BATCH_SIZE or every PRICE_HISTORY_FLUSH_INTERVAL seconds, and
+# `manage.py prune_price_history` drops those older than PRICE_HISTORY_RETENTION_DAYS (rollups stay).
+PRICE_HISTORY_ENABLED = os.getenv("PRICE_HISTORY_ENABLED", "True") == "True"
+PRICE_HISTORY_BATCH_SIZE = 500
+PRICE_HISTORY_FLUSH_INTERVAL = 30
+PRICE_HISTORY_RETENTION_DAYS = int(os.getenv("PRICE_HISTORY_RETENTION_DAYS", 180))
+
+# `manage.py run_price_watches`: every PRICE_WATCH_INTERVAL seconds, one flight search per watched
+# route and dates on PRICE_WATCH_MAX_WORKERS threads; alerts go out through the email outbox
+PRICE_WATCH_INTERVAL = int(os.getenv("PRICE_WATCH_INTERVAL", 60 * 15))
+PRICE_WATCH_MAX_WORKERS = 4
+
+# Registration and password reset emails go through an outbox drained by `manage.py send_outbox`,
+# OUTBOX_BATCH_SIZE per mail connection; failures are retried after OUTBOX_RETRY_BASE * 2^n seconds
+OUTBOX_BATCH_SIZE = 50
+OUTBOX_POLL_INTERVAL = 2
+OUTBOX_CLAIM_TIMEOUT = 300
+OUTBOX_MAX_ATTEMPTS = 8
+OUTBOX_RETRY_BASE = 30
+OUTBOX_RETRY_MAX = 60 * 60
+
+# authenticated requests take the user from this cache (Redis when configured) instead of the database.
+# Without Redis a change is only seen by the other workers once their copy expires
+AUTH_USER_CACHE_TTL = int(os.getenv("AUTH_USER_CACHE_TTL", 60))
+AUTH_USER_LOCAL_CACHE_TTL = int(os.getenv("AUTH_USER_LOCAL_CACHE_TTL", 5))
+# tokens issued before CHECK_REVOKE_TOKEN was enabled carry no password digest and are accepted while
+# this is on; turn it off once REFRESH_TOKEN_LIFETIME has passed since that deploy
+AUTH_ACCEPT_TOKENS_WITHOUT_REVOKE_CLAIM = os.getenv("AUTH_ACCEPT_TOKENS_WITHOUT_REVOKE_CLAIM", "True") == "True"
+
+# Logged-out refresh tokens (users.blacklist): Redis keys expiring with the token, checked through a
+# per-process Bloom filter that catches up with Redis every TOKEN_BLACKLIST_SYNC_INTERVAL seconds
+TOKEN_BLACKLIST_BLOOM_CAPACITY = 100000
+TOKEN_BLACKLIST_BLOOM_ERROR_RATE = 0.001
+TOKEN_BLACKLIST_SYNC_INTERVAL = 1
+TOKEN_BLACKLIST_REBUILD_INTERVAL = 60 * 60
@@ -0,0 +1,148 @@
+"""Login benchmark for users.serializers.CustomTokenObtainPairSerializer.
+
+Compares the single-hash login with the previous serializer (kept below as
+LegacyTokenObtainPairSerializer), which checked the password itself and then authenticated
+again through super().validate(). Both run single-threaded, so logins/s is per core. It also
+reports queries and password hashes per login and checks both issue the same token claims.
+
+    python benchmarks/bench_auth.py
+    python benchmarks/bench_auth.py --number 20
+
+The settings module needs its usual environment (SECRET_KEY, ...). The database is replaced by
+an in-memory SQLite one, and the configured PASSWORD_HASHERS are used unchanged.
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'TravellinoCappuchino.settings')
+
+import django  # noqa: E402
+from django.conf import settings  # noqa: E402
+
+settings.DATABASES = {'default': {'ENGINE': 'django.db.backends.sqlite3', 'NAME': ':memory:'}}
+django.setup()
+
+from django.contrib.auth.hashers import get_hasher  # noqa: E402
+from django.db import connection  # noqa: E402
+from django.test.utils import CaptureQueriesContext  # noqa: E402
+from rest_framework import serializers  # noqa: E402
+from rest_framework_simplejwt.serializers import TokenObtainPairSerializer  # noqa: E402
+from rest_framework_simplejwt.tokens import AccessToken  # noqa: E402
+
+from users.serializers import CustomTokenObtainPairSerializer, CustomUser  # noqa: E402
+
+EMAIL = 'bench@example.com'
+PASSWORD = 'bench-passw0rd'
+# differ between any two tokens
+VOLATILE_CLAIMS = {'jti', 'exp', 'iat'}
+
+
+# users/serializers.py before the single-hash login
+class LegacyTokenObtainPairSerializer(TokenObtainPairSerializer):
+    def validate(self, attrs):
+        email = attrs.get('email') or attrs.get('username')
+        password = attrs.get('password')
+
+        if not email or not password:
+            raise serializers.ValidationError({'non_field_errors': ['Email and password required']})
+
+        try:
+            user = CustomUser.objects.get(email=email)
+        except CustomUser.DoesNotExist:
+            raise serializers.ValidationError({'non_field_errors': ['Invalid email or password']})
+
+        if not user.check_password(password):
+            raise serializers.ValidationError({'non_field_errors': ['Invalid email or password']})
+
+        if not user.is_active:
+            raise serializers.ValidationError({'non_field_errors': ['User account is disabled.']})
+
+        data = super().validate(attrs)
+
+        data['user'] = {
+            'id': self.user.id,
+            'email': self.user.email,
+            'first_name': self.user.first_name,
+            'last_name': self.user.last_name,
+            'phone': self.user.phone,
+        }
+        return data
+
+
+class HashCounter:
+    """Counts verify() calls on the default password hasher."""
+
+    def __init__(self):
+        self.calls = 0
+        self.hasher_class = type(get_hasher('default'))
+        self.verify = self.hasher_class.verify
+
+    def __enter__(self):
+        counter = self
+
+        def verify(hasher, password, encoded):
+            counter.calls += 1
+            return counter.verify(hasher, password, encoded)
+
+        self.hasher_class.verify = verify
+        return self
+
+    def __exit__(self, *exc):
+        self.hasher_class.verify = self.verify
+
+
+def create_user():
+    with connection.schema_editor() as editor:
+        editor.create_model(CustomUser)
+    return CustomUser.objects.create_user(email=EMAIL, phone='+380000000000', password=PASSWORD,
+                                          first_name='Bench', last_name='User', is_active=True)
+
+
+def login(serializer_class):
+    serializer = serializer_class(data={'email': EMAIL, 'password': PASSWORD})
+    serializer.is_valid(raise_exception=True)
+    return serializer.validated_data
+
+
+def claims(data):
+    token = AccessToken(data['access'])
+    return {key: value for key, value in token.payload.items() if key not in VOLATILE_CLAIMS}
+
+
+def measure(serializer_class, number):
+    with CaptureQueriesContext(connection) as queries, HashCounter() as hashes:
+        data = login(serializer_class)
+    start = time.perf_counter()
+    for _ in range(number):
+        login(serializer_class)
+    elapsed = time.perf_counter() - start
+    return data, len(queries), hashes.calls, number / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--number', type=int, default=10, help="Timed logins per serializer.")
+    args = parser.parse_args()
+
+    create_user()
+    print(f"hasher: {get_hasher('default').algorithm}")
+
+    results = {}
+    for name, serializer_class in (('legacy', LegacyTokenObtainPairSerializer),
+                                   ('single-hash', CustomTokenObtainPairSerializer)):
+        data, queries, hashes, rate = measure(serializer_class, args.number)
+        results[name] = (data, rate)
+        print(f"{name:>12}: {rate:7.2f} logins/s per core, {queries} queries, {hashes} password hashes per login")
+
+    legacy, current = results['legacy'][0], results['single-hash'][0]
+    if claims(legacy) != claims(current) or legacy['user'] != current['user'] or legacy.keys() != current.keys():
+        raise AssertionError(f"Responses differ:\n{legacy}\n{current}")
+    print("     payload: identical token claims and user data")
+    print(f"     speedup: {results['single-hash'][1] / results['legacy'][1]:.2f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,213 @@
+"""Micro-benchmark for trips.flight.Flight.construct_flights.
+
+Compares the single-pass normalizer with the previous implementation (kept below as
+LegacyFlight) over a 250-offer flight_offers_search payload and checks both produce
+the same offers for the itineraries the old code supported (1 or 2 segments).
+
+    python benchmarks/bench_flight_normalizer.py
+    python benchmarks/bench_flight_normalizer.py --payload recorded_response.json
+
+--payload takes a recorded Amadeus response ({"data": [...]} or a bare list of offers).
+Without it a deterministic synthetic payload with the same shape is generated.
+"""
+import argparse
+import json
+import os
+import random
+import re
+import sys
+import timeit
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from trips.flight import Flight  # noqa: E402
+
+
+# trips/flight.py before the single-pass rewrite
+class LegacyFlight:
+    def __init__(self, flight):
+        self.flight = flight
+
+    def construct_flights(self):
+        offer = {}
+        index = 0
+        offer['price'] = self.flight['price']['total']
+        offer['id'] = self.flight['id']
+
+        for f in self.flight['itineraries']:
+            # Keys starting from 0 correspond to Outbound flights and the keys starting from 1 tp Return flights
+            if len(self.flight['itineraries'][index]['segments']) == 2:  # one stop flight
+                offer[str(index) + 'firstFlightDepartureAirport'] = self.flight['itineraries'][index]['segments'][0]['departure']['iataCode']
+                offer[str(index) + 'firstFlightAirlineLogo'] = legacy_get_airline_logo(self.flight['itineraries'][index]['segments'][0]['carrierCode'])
+                offer[str(index) + 'firstFlightAirline'] = self.flight['itineraries'][index]['segments'][0]['carrierCode']
+                offer[str(index) + 'firstFlightDepartureDate'] = legacy_get_hour(self.flight['itineraries'][index]['segments'][0]['departure']['at'])
+                offer[str(index) + 'firstFlightArrivalAirport'] = self.flight['itineraries'][index]['segments'][0]['arrival']['iataCode']
+                offer[str(index) + 'firstFlightArrivalDate'] = legacy_get_hour(self.flight['itineraries'][index]['segments'][0]['arrival']['at'])
+                offer[str(index) + 'firstFlightArrivalDuration'] = self.flight['itineraries'][index]['segments'][0]['duration']
+                offer[str(index) + 'secondFlightDepartureAirport'] = self.flight['itineraries'][index]['segments'][1]['departure']['iataCode']
+                offer[str(index) + 'secondFlightDepartureDate'] = legacy_get_hour(self.flight['itineraries'][index]['segments'][1]['departure']['at'])
+                offer[str(index) + 'secondFlightAirlineLogo'] = legacy_get_airline_logo(self.flight['itineraries'][index]['segments'][1]['carrierCode'])
+                offer[str(index) + 'secondFlightAirline'] = self.flight['itineraries'][index]['segments'][1]['carrierCode']
+                offer[str(index) + 'secondFlightArrivalAirport'] = self.flight['itineraries'][index]['segments'][1]['arrival']['iataCode']
+                offer[str(index) + 'secondFlightArrivalDate'] = legacy_get_hour(self.flight['itineraries'][index]['segments'][1]['arrival']['at'])
+                offer[str(index) + 'secondFlightArrivalDuration'] = self.flight['itineraries'][index]['segments'][1]['duration']
+                offer[str(index) + 'FlightTotalDuration'] = self.flight['itineraries'][index]['duration'][2:]
+                offer[str(index) + 'stop_time'] = legacy_get_stoptime(self.flight['itineraries'][index]['duration'],
+                                                               offer[str(index) + 'firstFlightArrivalDuration'],
+                                                               offer[str(index) + 'secondFlightArrivalDuration'])
+
+            elif len(self.flight['itineraries'][index]['segments']) == 1:  # direct flight
+                offer[str(index) + 'firstFlightDepartureAirport'] = self.flight['itineraries'][index]['segments'][0]['departure']['iataCode']
+                offer[str(index) + 'firstFlightAirlineLogo'] = legacy_get_airline_logo(self.flight['itineraries'][index]['segments'][0]['carrierCode'])
+                offer[str(index) + 'firstFlightAirline'] = self.flight['itineraries'][index]['segments'][0]['carrierCode']
+                offer[str(index) + 'firstFlightDepartureDate'] = legacy_get_hour(self.flight['itineraries'][index]['segments'][0]['departure']['at'])
+                offer[str(index) + 'firstFlightArrivalAirport'] = self.flight['itineraries'][index]['segments'][0]['arrival']['iataCode']
+                offer[str(index) + 'firstFlightArrivalDate'] = legacy_get_hour(self.flight['itineraries'][index]['segments'][0]['arrival']['at'])
+                offer[str(index) + 'firstFlightArrivalDuration'] = self.flight['itineraries'][index]['segments'][0]['duration']
+                offer[str(index) + 'FlightTotalDuration'] = self.flight['itineraries'][index]['duration'][2:]
+
+            index += 1
+        return offer
+
+
+def legacy_get_airline_logo(carrier_code):
+    return "https://s1.apideeplink.com/images/airlines/" + carrier_code + ".png"
+
+
+def legacy_get_hour(date_time):
+    return datetime.strptime(date_time[0:19], "%Y-%m-%dT%H:%M:%S").strftime("%H:%M")
+
+
+def legacy_get_stoptime(total_duration, first_flight_duration, second_flight_duration):
+    if re.search('PT(.*)H', total_duration) is None:
+        total_duration_hours = 0
+    else:
+        total_duration_hours = int(re.search('PT(.*)H', total_duration).group(1))
+    if re.search('H(.*)M', total_duration) is None:
+        total_duration_minutes = 0
+    else:
+        total_duration_minutes = int(re.search('H(.*)M', total_duration).group(1))
+
+    if re.search('PT(.*)H', first_flight_duration) is None:
+        first_flight_hours = 0
+    else:
+        first_flight_hours = int(re.search('PT(.*)H', first_flight_duration).group(1))
+    if re.search('H(.*)M', first_flight_duration) is None:
+        first_flight_minutes = 0
+    else:
+        first_flight_minutes = int(re.search('H(.*)M', first_flight_duration).group(1))
+
+    if re.search('PT(.*)H', second_flight_duration) is None:
+        second_flight_hours = 0
+    else:
+        second_flight_hours = int(re.search('PT(.*)H', second_flight_duration).group(1))
+    if re.search('H(.*)M', second_flight_duration) is None:
+        second_flight_minutes = 0
+    else:
+        second_flight_minutes = int(re.search('H(.*)M', second_flight_duration).group(1))
+
+    connection_minutes = (total_duration_hours*60+total_duration_minutes) - (first_flight_hours*60 + first_flight_minutes + second_flight_hours*60 + second_flight_minutes)
+    hours = connection_minutes // 60
+    minutes = connection_minutes % 60
+    return str(hours)+':'+str(minutes)
+
+
+AIRPORTS = ['KBP', 'WAW', 'FRA', 'MUC', 'CDG', 'AMS', 'MAD', 'LHR', 'FCO', 'VIE', 'IST', 'BCN']
+CARRIERS = ['LH', 'LO', 'KL', 'AF', 'IB', 'PS', 'TK', 'OS']
+
+
+def iso_duration(minutes):
+    hours, minutes = divmod(minutes, 60)
+    return 'PT' + (f'{hours}H' if hours else '') + (f'{minutes}M' if minutes else '')
+
+
+def synthetic_itinerary(rng, origin, destination, departure, segment_count):
+    stops = [origin] + rng.sample([a for a in AIRPORTS if a not in (origin, destination)], segment_count - 1) + [destination]
+    segments = []
+    at = departure
+    for i in range(segment_count):
+        flying = rng.randint(55, 260)
+        arrival = at + timedelta(minutes=flying)
+        segments.append({
+            'departure': {'iataCode': stops[i], 'at': at.strftime('%Y-%m-%dT%H:%M:%S')},
+            'arrival': {'iataCode': stops[i + 1], 'at': arrival.strftime('%Y-%m-%dT%H:%M:%S')},
+            'carrierCode': rng.choice(CARRIERS),
+            'number': str(rng.randint(100, 9999)),
+            'duration': iso_duration(flying),
+        })
+        at = arrival + timedelta(minutes=rng.randint(45, 300))
+    total = int((arrival - departure).total_seconds() // 60)
+    return {'duration': iso_duration(total), 'segments': segments}
+
+
+def synthetic_payload(count=250, seed=250):
+    rng = random.Random(seed)
+    offers = []
+    for i in range(count):
+        departure = datetime(2026, 5, 1, rng.randint(5, 22), rng.choice([0, 15, 30, 45]))
+        itineraries = [synthetic_itinerary(rng, 'KBP', 'BCN', departure, rng.choice([1, 2, 2, 2, 3]))]
+        if rng.random() < 0.6:
+            itineraries.append(synthetic_itinerary(rng, 'BCN', 'KBP', departure + timedelta(days=7), rng.choice([1, 2, 2, 3])))
+        offers.append({
+            'type': 'flight-offer',
+            'id': str(i + 1),
+            'itineraries': itineraries,
+            'price': {'currency': 'EUR', 'total': f'{rng.uniform(80, 900):.2f}'},
+        })
+    return offers
+
+
+def load_payload(path):
+    with open(path) as f:
+        payload = json.load(f)
+    return payload['data'] if isinstance(payload, dict) else payload
+
+
+def legacy_misparses(itinerary):
+    # the old get_stoptime read minutes with 'H(.*)M', so hour-less durations such as
+    # "PT59M" counted as 0 minutes; stop_time is only compared where it parsed correctly
+    durations = [itinerary['duration']] + [segment['duration'] for segment in itinerary['segments']]
+    return any('H' not in duration for duration in durations)
+
+
+def check_equivalence(offers):
+    compared = 0
+    for offer in offers:
+        if all(len(itinerary['segments']) in (1, 2) for itinerary in offer['itineraries']):
+            expected = LegacyFlight(offer).construct_flights()
+            actual = Flight(offer).construct_flights()
+            for index, itinerary in enumerate(offer['itineraries']):
+                if legacy_misparses(itinerary):
+                    expected.pop(f'{index}stop_time', None)
+                    actual.pop(f'{index}stop_time', None)
+            if expected != actual:
+                raise AssertionError(f"Offer {offer['id']} differs:\n{expected}\n{actual}")
+            compared += 1
+    return compared
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--payload', help="Recorded flight_offers_search response (JSON).")
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--number', type=int, default=20)
+    args = parser.parse_args()
+
+    offers = load_payload(args.payload) if args.payload else synthetic_payload()
+    compared = check_equivalence(offers)
+    print(f"{len(offers)} offers, {compared} compared with the legacy normalizer: identical output")
+
+    def run(cls):
+        return lambda: [cls(offer).construct_flights() for offer in offers]
+
+    results = {}
+    for name, cls in (('legacy', LegacyFlight), ('single-pass', Flight)):
+        best = min(timeit.repeat(run(cls), repeat=args.repeat, number=args.number)) / args.number
+        results[name] = best
+        print(f"{name:>12}: {best * 1000:8.3f} ms per payload  ({best / len(offers) * 1e6:6.2f} us per offer)")
+    print(f"     speedup: {results['legacy'] / results['single-pass']:.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,103 @@
+"""Startup benchmark: import time of the WSGI/ASGI entry points plus the URLconf.
+
+Each sample runs in a fresh interpreter under `python -X importtime`, imports the entry point
+and resolves the URLconf (which imports every view module), like a worker serving its first
+request. It reports wall time, total import time, the heaviest top-level packages, and whether
+the integrations that should load on first use (Gemini, the Amadeus SDK, requests, aiohttp)
+were imported anyway.
+
+    python benchmarks/bench_startup.py
+    python benchmarks/bench_startup.py --target asgi --repeat 7 --top 15
+
+The settings module needs its usual environment (SECRET_KEY, ...); no database connection is made.
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+from collections import defaultdict
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+TARGETS = {
+    'wsgi': 'import TravellinoCappuchino.wsgi',
+    'asgi': 'import TravellinoCappuchino.asgi',
+}
+URLCONF = 'from django.urls import get_resolver; get_resolver().url_patterns'
+
+# should only be imported by the first request that needs them (rest_framework.compat imports
+# requests on its own, so that one shows up as loaded regardless of our views)
+DEFERRED = ['google.genai', 'amadeus', 'requests', 'aiohttp', 'geocoder', 'numpy']
+
+
+def parse_importtime(output):
+    """{module: (self_us, cumulative_us)} from `-X importtime` stderr."""
+    modules = {}
+    for line in output.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        modules[name.strip()] = (int(self_us), int(cumulative_us))
+    return modules
+
+
+def sample(target):
+    env = dict(os.environ)
+    env.setdefault('DJANGO_SETTINGS_MODULE', 'TravellinoCappuchino.settings')
+    env['PYTHONPATH'] = os.pathsep.join(filter(None, [ROOT, env.get('PYTHONPATH')]))
+    start = time.perf_counter()
+    process = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f'{TARGETS[target]}; {URLCONF}'],
+        cwd=ROOT, env=env, capture_output=True, text=True,
+    )
+    wall = time.perf_counter() - start
+    if process.returncode:
+        sys.exit(process.stderr[-3000:])
+    return wall, parse_importtime(process.stderr)
+
+
+def by_package(modules):
+    totals = defaultdict(int)
+    for name, (self_us, _) in modules.items():
+        totals[name.split('.')[0]] += self_us
+    return totals
+
+
+def report(target, samples, top):
+    walls = [wall for wall, _ in samples]
+    imports = [sum(self_us for self_us, _ in modules.values()) for _, modules in samples]
+    print(f"{target}: wall {statistics.median(walls) * 1000:.0f} ms, "
+          f"imports {statistics.median(imports) / 1000:.0f} ms (median of {len(samples)})")
+
+    packages = defaultdict(list)
+    for _, modules in samples:
+        for package, self_us in by_package(modules).items():
+            packages[package].append(self_us)
+    heaviest = sorted(packages.items(), key=lambda item: -statistics.median(item[1]))[:top]
+    for package, times in heaviest:
+        print(f"  {statistics.median(times) / 1000:8.1f} ms  {package}")
+
+    modules = samples[0][1]
+    for name in DEFERRED:
+        if name in modules:
+            print(f"  loaded at startup: {name} ({modules[name][1] / 1000:.1f} ms cumulative)")
+        else:
+            print(f"  deferred: {name}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--target', choices=sorted(TARGETS) + ['all'], default='all')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--top', type=int, default=10, help="Heaviest packages to list.")
+    args = parser.parse_args()
+
+    for target in sorted(TARGETS) if args.target == 'all' else [args.target]:
+        sample(target)  # warm the bytecode and filesystem caches
+        report(target, [sample(target) for _ in range(args.repeat)], args.top)
+
+
+if __name__ == '__main__':
+    main()
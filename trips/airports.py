@@ -0,0 +1,99 @@
+import threading
+import unicodedata
+from bisect import bisect_left
+
+
+def normalize_term(value):
+    value = unicodedata.normalize('NFKD', value or '')
+    value = ''.join(ch for ch in value if not unicodedata.combining(ch))
+    return ' '.join(value.lower().split())
+
+
+class AirportIndex:
+    """Sorted prefix index over airport/city names and IATA codes.
+
+    Locations are kept in the same shape as Amadeus `reference_data.locations` items
+    ({'name', 'iataCode', 'subType'}), so results can be passed to `get_city_airport_list`.
+    """
+
+    def __init__(self, locations):
+        self.locations = locations
+        entries = set()
+        for position, location in enumerate(locations):
+            for term in self._terms(location):
+                entries.add((term, position))
+        entries = sorted(entries)
+        self._keys = [term for term, _ in entries]
+        self._positions = [position for _, position in entries]
+
+    @staticmethod
+    def _terms(location):
+        terms = {normalize_term(location['iataCode'])}
+        for value in (location['name'], location.get('cityName')):
+            value = normalize_term(value)
+            if not value:
+                continue
+            words = value.split(' ')
+            # every word boundary is a searchable prefix: "de gaulle", "gaulle", ...
+            for i in range(len(words)):
+                terms.add(' '.join(words[i:]))
+        return terms
+
+    def search(self, term, limit=10):
+        prefix = normalize_term(term)
+        if not prefix:
+            return []
+
+        matches = []
+        seen = set()
+        i = bisect_left(self._keys, prefix)
+        while i < len(self._keys) and self._keys[i].startswith(prefix):
+            position = self._positions[i]
+            if position not in seen:
+                seen.add(position)
+                matches.append(position)
+            i += 1
+
+        code = prefix.upper()
+
+        def rank(position):
+            location = self.locations[position]
+            return (
+                location['iataCode'] != code,
+                location['subType'] != 'CITY',
+                location['name'],
+            )
+
+        matches.sort(key=rank)
+        return [self.locations[position] for position in matches[:limit]]
+
+    def __len__(self):
+        return len(self.locations)
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_airport_index():
+    global _index
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                from .models import Airport
+                rows = Airport.objects.values_list('iata_code', 'name', 'city_name', 'sub_type')
+                _index = AirportIndex([
+                    {
+                        'name': name.upper(),
+                        'iataCode': iata_code.upper(),
+                        'cityName': city_name,
+                        'subType': sub_type,
+                    }
+                    for iata_code, name, city_name, sub_type in rows
+                ])
+    return _index
+
+
+def reset_airport_index():
+    global _index
+    _index = None
@@ -4,3 +4,13 @@ from django.apps import AppConfig
 class TripsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'trips'
+
+    def ready(self):
+        from django.db.models.signals import post_migrate
+
+        from . import signals  # noqa: F401
+        from .search import create_search_indexes
+        from .price_history import create_price_history_indexes
+
+        post_migrate.connect(create_search_indexes, sender=self)
+        post_migrate.connect(create_price_history_indexes, sender=self)
@@ -0,0 +1,156 @@
+"""Async counterparts of the upstream-bound views in `views.py`, served when ASYNC_VIEWS is on.
+
+Under ASGI every upstream call awaits on one pooled keep-alive session (see `services/http.py`)
+instead of holding a worker thread, so a single worker can keep hundreds of calls in flight.
+"""
+import asyncio
+import json
+
+from asgiref.sync import sync_to_async
+from django.http import JsonResponse
+from django.views.decorators.csrf import csrf_exempt
+
+from TravellinoCappuchino import settings
+from .cache import flight_search_cache, weather_cache
+from .models import City
+from .price_history import record_flight_search, record_hotel_search
+from .services.amadeus_async import get_async_amadeus
+from .services.amadeus_client import RateLimited
+from .services.flights import normalize_flight_search, construct_flight_offers
+from .services.http import get_json, UpstreamError
+from .views import (WEATHER_URL, weather_location, weather_params, build_weather, parse_city_ids,
+                    lookup_cached_weather, store_weather, weather_batch_result, flight_search_kwargs,
+                    build_price_metrics, hotel_search_params, chunk_hotel_ids, hotel_offers_response)
+
+
+async def fetch_weather(city):
+    location = weather_location(city)
+    data = await sync_to_async(weather_cache.get, thread_sensitive=False)(location)
+    if data is None:
+        data = await get_json(WEATHER_URL, params=weather_params(city), timeout=settings.WEATHER_TIMEOUT)
+        await sync_to_async(weather_cache.set, thread_sensitive=False)(location, data)
+    return data
+
+
+async def get_weather(request, city_id):
+    try:
+        city = await City.objects.aget(id=city_id)
+    except City.DoesNotExist:
+        return JsonResponse({'error': 'City not found'}, status=404)
+
+    try:
+        data = await fetch_weather(city)
+    except Exception as e:
+        return JsonResponse({"error": "Failed to fetch weather", "details": str(e)}, status=500)
+
+    return JsonResponse(build_weather(city, data))
+
+
+async def get_weather_batch(request):
+    try:
+        city_ids = parse_city_ids(request)
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+
+    cities = await sync_to_async(City.objects.only('id', 'name', 'latitude', 'longitude').in_bulk)(city_ids)
+    readings, errors, misses = await sync_to_async(lookup_cached_weather, thread_sensitive=False)(cities)
+
+    groups = list(misses.values())
+    results = await asyncio.gather(
+        *(get_json(WEATHER_URL, params=weather_params(group[0]), timeout=settings.WEATHER_TIMEOUT)
+          for group in groups),
+        return_exceptions=True,
+    )
+    for group, data in zip(groups, results):
+        if isinstance(data, BaseException):
+            for city in group:
+                errors[str(city.id)] = f"Failed to fetch weather: {data}"
+        else:
+            await sync_to_async(store_weather, thread_sensitive=False)(data, group, readings)
+
+    return JsonResponse(weather_batch_result(city_ids, cities, readings, errors))
+
+
+async def get_flight_offers(**kwargs):
+    params = normalize_flight_search(kwargs)
+    flight_offers = await sync_to_async(flight_search_cache.get, thread_sensitive=False)(params)
+    if flight_offers is None:
+        data = await get_async_amadeus().get('/v2/shopping/flight-offers', **params)
+        record_flight_search(params, data)
+        flight_offers = construct_flight_offers(data)
+        await sync_to_async(flight_search_cache.set, thread_sensitive=False)(params, flight_offers)
+    return flight_offers
+
+
+@csrf_exempt
+async def flight_offers(request):
+    if request.method != "POST":
+        return JsonResponse({'error': 'POST method required'}, status=405)
+
+    kwargs = flight_search_kwargs(json.loads(request.body))
+    try:
+        flight_offers = await get_flight_offers(**kwargs)
+        return JsonResponse({
+            'flight_offers': flight_offers,
+            'metrics': build_price_metrics(flight_offers)
+        })
+    except RateLimited as e:
+        return JsonResponse({'error': e.body}, status=429)
+    except UpstreamError as e:
+        return JsonResponse({'error': e.body}, status=400)
+    except Exception as e:
+        return JsonResponse({'error': str(e)}, status=400)
+
+
+@csrf_exempt
+async def hotel_search(request):
+    if request.method != "POST":
+        return JsonResponse({"error": "POST required"}, status=405)
+
+    params = hotel_search_params(json.loads(request.body))
+    if not all(params.values()):
+        return JsonResponse({"error": "Missing params"}, status=400)
+
+    try:
+        hotels = await get_async_amadeus().get('/v1/reference-data/locations/hotels/by-city', cityCode=params['cityCode'])
+    except RateLimited as e:
+        return JsonResponse({"error": e.body}, status=429)
+    except UpstreamError as e:
+        return JsonResponse({"error": e.body}, status=400)
+
+    chunks = chunk_hotel_ids(hotels)
+    semaphore = asyncio.Semaphore(settings.HOTEL_OFFERS_MAX_WORKERS)
+
+    async def fetch_chunk(hotel_ids):
+        async with semaphore:
+            return await asyncio.wait_for(get_async_amadeus().get(
+                '/v3/shopping/hotel-offers',
+                hotelIds=hotel_ids,
+                checkInDate=params['checkInDate'],
+                checkOutDate=params['checkOutDate'],
+                adults=params['adults']
+            ), timeout=settings.HOTEL_OFFERS_CHUNK_TIMEOUT)
+
+    results = await asyncio.gather(*(fetch_chunk(chunk) for chunk in chunks), return_exceptions=True)
+    record_hotel_search(params, results)
+    # addresses come from the ReverseGeocode table
+    return await sync_to_async(hotel_offers_response)(chunks, results)
+
+
+async def city_to_iata(request):
+    if request.method != "GET":
+        return JsonResponse({"detail": f'Method "{request.method}" not allowed.'}, status=405)
+
+    city_name = request.GET.get("city")
+    if not city_name:
+        return JsonResponse({"error": "City is required"}, status=400)
+
+    try:
+        data = await get_async_amadeus().get('/v1/reference-data/locations', keyword=city_name, subType='CITY')
+        if not data:
+            return JsonResponse({"error": "No IATA code found"}, status=404)
+        return JsonResponse({"iata": data[0]['iataCode']})
+    except RateLimited as e:
+        return JsonResponse({"error": e.body}, status=429)
+    except UpstreamError as e:
+        return JsonResponse({"error": str(e)}, status=500)
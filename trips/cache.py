@@ -0,0 +1,158 @@
+import hashlib
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+from TravellinoCappuchino import settings
+
+logger = logging.getLogger(__name__)
+
+_redis_client = None
+_redis_checked = False
+_redis_lock = threading.Lock()
+
+
+def get_redis():
+    """Shared Redis connection, or None when REDIS_URL is unset or the server is unreachable."""
+    global _redis_client, _redis_checked
+    if _redis_checked:
+        return _redis_client
+    with _redis_lock:
+        if _redis_checked:
+            return _redis_client
+        url = settings.REDIS_URL
+        if url:
+            try:
+                import redis
+                client = redis.Redis.from_url(url, socket_timeout=0.5, socket_connect_timeout=0.5)
+                client.ping()
+                _redis_client = client
+            except Exception as e:
+                logger.warning("Redis unavailable, using in-process cache: %s", e)
+                _redis_client = None
+        _redis_checked = True
+    return _redis_client
+
+
+class LRUCache:
+    def __init__(self, maxsize=1024):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            expires_at, value = item
+            if expires_at < time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl):
+        with self._lock:
+            self._data[key] = (time.monotonic() + ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+class ResultCache:
+    """TTL cache for JSON-serializable results, stored in Redis with an in-process LRU fallback.
+
+    `local_ttl` (default `ttl`) applies to the fallback: entries that can only be invalidated in the
+    process that holds them should not outlive their data by much in the other workers.
+    """
+
+    def __init__(self, namespace, ttl, maxsize=1024, local_ttl=None):
+        self.namespace = namespace
+        self.ttl = ttl
+        self.local_ttl = ttl if local_ttl is None else local_ttl
+        self.hits = 0
+        self.misses = 0
+        self._local = LRUCache(maxsize)
+
+    def make_key(self, params):
+        raw = json.dumps(params, sort_keys=True, default=str)
+        return f"{self.namespace}:{hashlib.sha1(raw.encode()).hexdigest()}"
+
+    def get(self, params):
+        key = self.make_key(params)
+        value = None
+        redis_client = get_redis()
+        if redis_client is not None:
+            try:
+                raw = redis_client.get(key)
+                if raw is not None:
+                    value = json.loads(raw)
+            except Exception as e:
+                logger.warning("Redis read failed for %s: %s", key, e)
+                value = self._local.get(key)
+        else:
+            value = self._local.get(key)
+
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value
+
+    def set(self, params, value):
+        key = self.make_key(params)
+        redis_client = get_redis()
+        if redis_client is not None:
+            try:
+                redis_client.set(key, json.dumps(value), ex=self.ttl)
+                return
+            except Exception as e:
+                logger.warning("Redis write failed for %s: %s", key, e)
+        self._local.set(key, value, self.local_ttl)
+
+    def delete(self, params):
+        key = self.make_key(params)
+        redis_client = get_redis()
+        if redis_client is not None:
+            try:
+                redis_client.delete(key)
+            except Exception as e:
+                logger.warning("Redis delete failed for %s: %s", key, e)
+        self._local.delete(key)
+
+    def get_or_set(self, params, func):
+        value = self.get(params)
+        if value is None:
+            value = func()
+            self.set(params, value)
+        return value
+
+    def stats(self):
+        total = self.hits + self.misses
+        shared = get_redis() is not None
+        return {
+            'backend': 'redis' if shared else 'local',
+            'ttl': self.ttl if shared else self.local_ttl,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / total, 4) if total else None,
+        }
+
+
+flight_search_cache = ResultCache('flight_offers', ttl=settings.FLIGHT_SEARCH_CACHE_TTL)
+weather_cache = ResultCache('weather', ttl=settings.WEATHER_CACHE_TTL)
+geocode_cache = ResultCache('geocode', ttl=settings.GEOCODE_CACHE_TTL, maxsize=10000)
@@ -0,0 +1,87 @@
+import hashlib
+import logging
+import threading
+from functools import wraps
+
+from django.http import HttpResponse, HttpResponseNotModified
+from django.utils.http import parse_etags
+
+from TravellinoCappuchino import settings
+from .cache import ResultCache, get_redis
+
+logger = logging.getLogger(__name__)
+
+VERSION_KEY = 'catalog:version'
+
+# without Redis the version is per process, so other workers only see a change once their copy expires
+catalog_cache = ResultCache('catalog', ttl=settings.CATALOG_CACHE_TTL, local_ttl=settings.CATALOG_LOCAL_CACHE_TTL)
+
+_local_version = 0
+_version_lock = threading.Lock()
+
+
+def catalog_version():
+    redis_client = get_redis()
+    if redis_client is not None:
+        try:
+            return int(redis_client.get(VERSION_KEY) or 0)
+        except Exception as e:
+            logger.warning("Could not read catalog version: %s", e)
+    return _local_version
+
+
+def bump_catalog_version():
+    """Invalidate every cached catalog response (called whenever a Country or City changes)."""
+    global _local_version
+    with _version_lock:
+        _local_version += 1
+    redis_client = get_redis()
+    if redis_client is not None:
+        try:
+            redis_client.incr(VERSION_KEY)
+        except Exception as e:
+            logger.warning("Could not bump catalog version: %s", e)
+
+
+def etag_matches(request, etag):
+    header = request.META.get('HTTP_IF_NONE_MATCH')
+    if not header:
+        return False
+    etags = parse_etags(header)
+    # If-None-Match uses weak comparison, so W/"x" matches "x"
+    return '*' in etags or etag in [value.removeprefix('W/') for value in etags]
+
+
+def cached_catalog_response(view):
+    """Serve a JSON catalog view from a cache versioned by catalog changes, with a strong ETag.
+
+    Only 200 responses are cached. A request whose If-None-Match matches gets a 304 without a body.
+    """
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if request.method not in ('GET', 'HEAD'):
+            return view(request, *args, **kwargs)
+
+        params = {'view': view.__name__, 'kwargs': kwargs, 'version': catalog_version()}
+        cached = catalog_cache.get(params)
+        if cached is None:
+            response = view(request, *args, **kwargs)
+            if response.status_code != 200:
+                return response
+            body = response.content.decode(response.charset)
+            cached = {
+                'body': body,
+                'content_type': response['Content-Type'],
+                'etag': '"%s"' % hashlib.sha256(response.content).hexdigest()[:32],
+            }
+            catalog_cache.set(params, cached)
+
+        if etag_matches(request, cached['etag']):
+            response = HttpResponseNotModified()
+        else:
+            response = HttpResponse(cached['body'], content_type=cached['content_type'])
+        response['ETag'] = cached['etag']
+        response['Cache-Control'] = settings.CATALOG_CACHE_CONTROL
+        return response
+
+    return wrapper
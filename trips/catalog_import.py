@@ -0,0 +1,234 @@
+import csv
+import io
+import json
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.db import connection, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from TravellinoCappuchino import settings
+from .catalog_cache import bump_catalog_version
+from .geocoding import geocode_place
+from .models import Country, City, CatalogImport
+from .search import update_search_vectors, reset_search_index
+
+logger = logging.getLogger(__name__)
+
+COUNTRY_FIELDS = ['description', 'flag_url', 'currency']
+CITY_FIELDS = ['description', 'img_url']
+
+
+def read_records(fileobj, filename):
+    """Rows of a CSV, JSON Lines or JSON array file (chosen by extension) as a list."""
+    text = fileobj.read()
+    if isinstance(text, bytes):
+        text = text.decode('utf-8-sig')
+    filename = filename.lower()
+    if filename.endswith(('.jsonl', '.ndjson')):
+        return [json.loads(line) for line in text.splitlines() if line.strip()]
+    if filename.endswith('.json'):
+        records = json.loads(text)
+        if not isinstance(records, list):
+            raise ValueError("a .json file must hold a list of rows")
+        return records
+    return list(csv.DictReader(io.StringIO(text)))
+
+
+def parse_coordinate(value):
+    if value in (None, ''):
+        return None
+    return float(value)
+
+
+def import_countries(records, batch_size=1000):
+    """bulk_create countries not already in the catalog. Returns (created, errors)."""
+    existing = set(Country.objects.values_list('name', flat=True))
+    countries = []
+    errors = []
+    for row, record in enumerate(records, start=1):
+        if not isinstance(record, dict):
+            errors.append(f"Country row {row}: expected an object, got {type(record).__name__}")
+            continue
+        name = str(record.get('name') or '').strip()
+        if not name or name in existing:
+            continue
+        try:
+            latitude = parse_coordinate(record.get('latitude'))
+            longitude = parse_coordinate(record.get('longitude'))
+        except (TypeError, ValueError) as e:
+            errors.append(f"Country row {row}: invalid coordinates ({e})")
+            continue
+        existing.add(name)
+        countries.append(Country(
+            name=name,
+            latitude=latitude,
+            longitude=longitude,
+            **{field: record.get(field) or '' for field in COUNTRY_FIELDS},
+        ))
+    Country.objects.bulk_create(countries, batch_size=batch_size)
+    return len(countries), errors
+
+
+def import_cities(records, batch_size=1000):
+    """bulk_create cities; `country` (name) or `country_id` picks the country.
+
+    Returns (created cities, errors).
+    """
+    country_ids = {name.lower(): pk for pk, name in Country.objects.values_list('id', 'name')}
+    known_ids = set(country_ids.values())
+    existing = set(City.objects.values_list('country_id', 'name'))
+    cities = []
+    errors = []
+    for row, record in enumerate(records, start=1):
+        if not isinstance(record, dict):
+            errors.append(f"City row {row}: expected an object, got {type(record).__name__}")
+            continue
+        name = str(record.get('name') or '').strip()
+        country = str(record.get('country') or record.get('country_id') or '').strip()
+        try:
+            country_id = int(record.get('country_id') or country_ids.get(country.lower()) or 0)
+            latitude = parse_coordinate(record.get('latitude'))
+            longitude = parse_coordinate(record.get('longitude'))
+        except (TypeError, ValueError) as e:
+            errors.append(f"City row {row}: invalid value ({e})")
+            continue
+        if not name or country_id not in known_ids:
+            errors.append(f"City row {row}: missing name or unknown country {country!r}")
+            continue
+        if (country_id, name) in existing:
+            continue
+        existing.add((country_id, name))
+        # bulk_create skips City.save(), so no geocoding happens here; see geocode_missing_cities
+        cities.append(City(
+            country_id=country_id,
+            name=name,
+            latitude=latitude,
+            longitude=longitude,
+            **{field: record.get(field) or '' for field in CITY_FIELDS},
+        ))
+    City.objects.bulk_create(cities, batch_size=batch_size)
+    return cities, errors
+
+
+def import_catalog(countries=(), cities=()):
+    with transaction.atomic():
+        countries_created, country_errors = import_countries(countries)
+        created_cities, city_errors = import_cities(cities)
+    # bulk_create sends no post_save signals
+    transaction.on_commit(bump_catalog_version)
+    update_search_vectors(Country, search_vector__isnull=True)
+    update_search_vectors(City, search_vector__isnull=True)
+    reset_search_index()
+    # the job only geocodes the cities it created, so concurrent imports do not overlap
+    to_geocode = [city.pk for city in created_cities if city.latitude is None or city.longitude is None]
+    return CatalogImport.objects.create(
+        status='geocoding',
+        countries_created=countries_created,
+        cities_created=len(created_cities),
+        cities_to_geocode=len(to_geocode),
+        city_ids=to_geocode,
+        errors=country_errors + city_errors,
+    )
+
+
+def cities_missing_coordinates():
+    return City.objects.filter(Q(latitude__isnull=True) | Q(longitude__isnull=True))
+
+
+def safe_geocode(name):
+    try:
+        return geocode_place(name)
+    except Exception as e:
+        logger.warning("Geocoding %s failed: %s", name, e)
+        return None
+
+
+def geocode_missing_cities(batch_size=None, workers=None, progress=None, city_ids=None):
+    """Fill in coordinates of cities that have none, geocoding each batch concurrently.
+
+    With `city_ids`, only those cities are considered.
+    `progress(processed, total, geocoded, failed)` is called after every batch.
+    Returns (geocoded, failed).
+    """
+    batch_size = batch_size or settings.CATALOG_GEOCODE_BATCH_SIZE
+    workers = workers or settings.CATALOG_GEOCODE_WORKERS
+    if city_ids is None:
+        pending_ids = list(cities_missing_coordinates().order_by('id').values_list('id', flat=True))
+    else:
+        pending_ids = []
+        for start in range(0, len(city_ids), batch_size):
+            pending_ids.extend(cities_missing_coordinates().filter(
+                id__in=city_ids[start:start + batch_size]).order_by('id').values_list('id', flat=True))
+    total = len(pending_ids)
+    processed = geocoded = failed = 0
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for start in range(0, total, batch_size):
+            batch_ids = pending_ids[start:start + batch_size]
+            # skips cities someone else geocoded in the meantime
+            batch = list(cities_missing_coordinates().filter(id__in=batch_ids).order_by('id').only('id', 'name'))
+
+            updated = []
+            for city, coordinates in zip(batch, pool.map(safe_geocode, [city.name for city in batch])):
+                if coordinates:
+                    city.latitude, city.longitude = coordinates
+                    updated.append(city)
+                else:
+                    failed += 1
+            City.objects.bulk_update(updated, ['latitude', 'longitude'])
+
+            processed += len(batch_ids)
+            geocoded += len(updated)
+            if progress:
+                progress(processed, total, geocoded, failed)
+
+    return geocoded, failed
+
+
+def geocode_import(job, batch_size=None, workers=None, progress=None):
+    """Geocode the cities `job` created that still have no coordinates, then mark it done (or failed).
+
+    Safe to run again on a job that was interrupted: cities geocoded earlier are skipped and
+    the ones that were not found are tried again.
+    """
+    geocoded_before = job.cities_geocoded
+
+    def save_progress(processed, total, geocoded, failed):
+        CatalogImport.objects.filter(pk=job.pk).update(cities_geocoded=geocoded_before + geocoded,
+                                                       geocoding_failed=failed)
+        if progress:
+            progress(processed, total, geocoded, failed)
+
+    try:
+        geocoded, failed = geocode_missing_cities(batch_size, workers, save_progress, city_ids=job.city_ids)
+        job.cities_geocoded = geocoded_before + geocoded
+        job.geocoding_failed = failed
+        job.status = 'done'
+    except Exception as e:
+        logger.exception("Geocoding for catalog import #%s failed", job.pk)
+        job.status = 'failed'
+        job.errors = job.errors + [f"Geocoding failed: {e}"]
+    finally:
+        job.finished_at = timezone.now()
+        job.save()
+    return job
+
+
+def run_geocoding(job):
+    try:
+        geocode_import(job)
+    finally:
+        connection.close()
+
+
+def start_geocoding(job):
+    """Geocode the imported cities in a background thread; progress is saved on the job.
+
+    A job left in 'geocoding' by a process that exited is picked up by `manage.py geocode_cities --resume`.
+    """
+    thread = threading.Thread(target=run_geocoding, args=(job,), name=f"catalog-geocode-{job.pk}", daemon=True)
+    thread.start()
+    return thread
@@ -0,0 +1,161 @@
+import csv
+import logging
+import threading
+
+from TravellinoCappuchino import settings
+from .cache import geocode_cache
+from .kdtree import KDTree
+from .models import ReverseGeocode
+
+logger = logging.getLogger(__name__)
+
+OPENWEATHER_GEOCODING_URL = "http://api.openweathermap.org/geo/1.0/direct"
+
+# 4 decimals ~ 11 m: hotels in the same building share one cached address
+COORDINATE_PRECISION = 4
+
+
+def coordinate_key(latitude, longitude):
+    scale = 10 ** COORDINATE_PRECISION
+    return round(float(latitude) * scale), round(float(longitude) * scale)
+
+
+def format_address(address):
+    if not address or not address.get('street'):
+        return None
+    if address.get('housenumber'):
+        return address['street'] + ' ' + address['housenumber']
+    return address['street']
+
+
+class OfflineGeocoder:
+    """Nearest-address lookups over a local CSV of address points.
+
+    Accepts `lat,lon,street,housenumber` columns or an OpenAddresses export (LAT, LON, STREET, NUMBER).
+    """
+
+    def __init__(self, path, max_distance_km):
+        self.max_distance_km = max_distance_km
+        coordinates = []
+        addresses = []
+        with open(path, newline='', encoding='utf-8') as f:
+            for row in csv.DictReader(f):
+                row = {key.lower(): value for key, value in row.items() if key}
+                try:
+                    coordinates.append((float(row['lat']), float(row['lon'])))
+                except (KeyError, TypeError, ValueError):
+                    continue
+                addresses.append({
+                    'street': (row.get('street') or '').strip(),
+                    'housenumber': (row.get('housenumber') or row.get('number') or '').strip(),
+                })
+        self.tree = KDTree(coordinates, addresses)
+        logger.info("Loaded %s address points for offline geocoding from %s", len(addresses), path)
+
+    def reverse(self, latitude, longitude):
+        address, distance = self.tree.nearest(float(latitude), float(longitude))
+        if address is None or distance > self.max_distance_km:
+            return None
+        return address
+
+
+_offline = None
+_offline_lock = threading.Lock()
+
+
+def get_offline_geocoder():
+    global _offline
+    if not settings.OFFLINE_GEOCODER_DATASET:
+        return None
+    if _offline is None:
+        with _offline_lock:
+            if _offline is None:
+                _offline = OfflineGeocoder(
+                    settings.OFFLINE_GEOCODER_DATASET,
+                    settings.OFFLINE_GEOCODER_MAX_DISTANCE_KM,
+                )
+    return _offline
+
+
+def reverse_geocode_online(latitude, longitude):
+    import geocoder
+
+    result = geocoder.osm([latitude, longitude], method='reverse').json or {}
+    return {
+        'street': result.get('street') or '',
+        'housenumber': result.get('houseNumber') or result.get('housenumber') or '',
+    }
+
+
+def reverse_geocode_many(coordinates, max_online=None):
+    """Resolve many (latitude, longitude) pairs to {'street', 'housenumber'} dicts (or None).
+
+    Looks in the cache table with one query, then the offline dataset, and only calls OSM
+    (serially, as Nominatim's usage policy asks) for what is still missing, at most `max_online`
+    times. OSM answers are cached.
+    """
+    keys = {coordinate_key(lat, lon): (lat, lon) for lat, lon in coordinates}
+    found = {}
+    if keys:
+        cached = ReverseGeocode.objects.filter(
+            lat_key__in={lat for lat, _ in keys},
+            lon_key__in={lon for _, lon in keys},
+        ).values_list('lat_key', 'lon_key', 'street', 'house_number')
+        for lat_key, lon_key, street, house_number in cached:
+            if (lat_key, lon_key) in keys:
+                found[(lat_key, lon_key)] = {'street': street, 'housenumber': house_number}
+
+    offline = get_offline_geocoder()
+    new_rows = []
+    online_calls = 0
+    for key, (lat, lon) in keys.items():
+        if key in found:
+            continue
+        if offline is not None:
+            address = offline.reverse(lat, lon)
+            if address is not None or settings.OFFLINE_GEOCODER_ONLY:
+                found[key] = address
+                continue
+        if max_online is not None and online_calls >= max_online:
+            continue
+        online_calls += 1
+        try:
+            address = reverse_geocode_online(lat, lon)
+        except Exception as e:
+            logger.warning("Reverse geocoding %s,%s failed: %s", lat, lon, e)
+            continue
+        found[key] = address
+        new_rows.append(ReverseGeocode(
+            lat_key=key[0],
+            lon_key=key[1],
+            street=address['street'],
+            house_number=address['housenumber'],
+        ))
+
+    if new_rows:
+        ReverseGeocode.objects.bulk_create(new_rows, ignore_conflicts=True)
+
+    return [found.get(coordinate_key(lat, lon)) for lat, lon in coordinates]
+
+
+def reverse_geocode(latitude, longitude):
+    return reverse_geocode_many([(latitude, longitude)])[0]
+
+
+def geocode_place(name):
+    """(latitude, longitude) of a place name via OpenWeather geocoding, or None if unknown. Cached."""
+    def fetch():
+        import requests
+
+        response = requests.get(
+            OPENWEATHER_GEOCODING_URL,
+            params={'q': name, 'limit': 1, 'appid': settings.WEATHER_API_KEY},
+            timeout=settings.GEOCODE_TIMEOUT,
+        )
+        response.raise_for_status()
+        data = response.json()
+        # an empty dict is cached too, so unknown names are not looked up again
+        return {'lat': data[0]['lat'], 'lon': data[0]['lon']} if data else {}
+
+    result = geocode_cache.get_or_set({'q': ' '.join(name.lower().split())}, fetch)
+    return (result['lat'], result['lon']) if result else None
@@ -0,0 +1,67 @@
+import math
+
+EARTH_RADIUS_KM = 6371.0088
+
+
+def to_cartesian(latitude, longitude):
+    """Unit-sphere coordinates: straight-line distance between them grows with great-circle distance."""
+    lat = math.radians(latitude)
+    lon = math.radians(longitude)
+    return (math.cos(lat) * math.cos(lon), math.cos(lat) * math.sin(lon), math.sin(lat))
+
+
+def chord_to_km(chord):
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, chord / 2))
+
+
+class KDTree:
+    """Static 3-d tree over (latitude, longitude) points for nearest-neighbour lookups."""
+
+    def __init__(self, coordinates, items):
+        self.items = items
+        self._points = [to_cartesian(lat, lon) for lat, lon in coordinates]
+        self._root = self._build(list(range(len(self._points))), 0)
+
+    def _build(self, indexes, depth):
+        if not indexes:
+            return None
+        axis = depth % 3
+        indexes.sort(key=lambda i: self._points[i][axis])
+        middle = len(indexes) // 2
+        return (
+            indexes[middle],
+            axis,
+            self._build(indexes[:middle], depth + 1),
+            self._build(indexes[middle + 1:], depth + 1),
+        )
+
+    def nearest(self, latitude, longitude):
+        """Return (item, distance_km) of the closest point, or (None, None) for an empty tree."""
+        if self._root is None:
+            return None, None
+
+        target = to_cartesian(latitude, longitude)
+        best_index = None
+        best_distance = float('inf')
+        stack = [self._root]
+        while stack:
+            node = stack.pop()
+            if node is None:
+                continue
+            index, axis, left, right = node
+            point = self._points[index]
+            distance = sum((a - b) ** 2 for a, b in zip(point, target))
+            if distance < best_distance:
+                best_index, best_distance = index, distance
+
+            delta = target[axis] - point[axis]
+            near, far = (left, right) if delta < 0 else (right, left)
+            # the far side can only hold a closer point if the splitting plane is within reach
+            if delta * delta < best_distance:
+                stack.append(far)
+            stack.append(near)
+
+        return self.items[best_index], chord_to_km(math.sqrt(best_distance))
+
+    def __len__(self):
+        return len(self.items)
@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand
+
+from trips.catalog_import import geocode_missing_cities, geocode_import
+from trips.models import CatalogImport
+
+
+class Command(BaseCommand):
+    help = "Fill in latitude/longitude of cities that have none, in concurrent cached batches."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int)
+        parser.add_argument('--workers', type=int)
+        parser.add_argument('--resume', action='store_true',
+                            help="Only geocode the cities of catalog imports still in 'geocoding' (e.g. because "
+                                 "the server stopped mid-import) and finish those imports.")
+
+    def handle(self, *args, **options):
+        if options['resume']:
+            for job in CatalogImport.objects.filter(status='geocoding').order_by('id'):
+                self.stdout.write(f"Resuming catalog import #{job.pk}")
+                geocode_import(job, options['batch_size'], options['workers'], progress=self.report_progress)
+                self.stdout.write(f"Catalog import #{job.pk}: {job.status}")
+            return
+
+        geocoded, failed = geocode_missing_cities(
+            batch_size=options['batch_size'],
+            workers=options['workers'],
+            progress=self.report_progress,
+        )
+        self.stdout.write(self.style.SUCCESS(f"Geocoded {geocoded} cities, {failed} not found."))
+
+    def report_progress(self, processed, total, geocoded, failed):
+        self.stdout.write(f"{processed}/{total} processed ({geocoded} geocoded, {failed} not found)")
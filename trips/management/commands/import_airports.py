@@ -0,0 +1,75 @@
+import csv
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from trips.airports import reset_airport_index
+from trips.models import Airport
+
+# OurAirports (https://ourairports.com/data/airports.csv) airport types worth suggesting
+OURAIRPORTS_TYPES = {'large_airport', 'medium_airport'}
+
+
+class Command(BaseCommand):
+    help = (
+        "Import airports and cities for the local autocomplete index. Accepts either the "
+        "OurAirports airports.csv export or a CSV with iata_code,name,city_name,country_code,sub_type columns."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument('--replace', action='store_true', help="Delete existing airports before importing.")
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        try:
+            with open(options['path'], newline='', encoding='utf-8') as f:
+                airports = list(self.read_rows(csv.DictReader(f)))
+        except OSError as e:
+            raise CommandError(f"Could not read {options['path']}: {e}")
+
+        with transaction.atomic():
+            if options['replace']:
+                Airport.objects.all().delete()
+            Airport.objects.bulk_create(
+                airports,
+                batch_size=options['batch_size'],
+                ignore_conflicts=True,
+            )
+        reset_airport_index()
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Imported {len(airports)} locations. Restart workers to reload their autocomplete index."
+        ))
+
+    def read_rows(self, reader):
+        ourairports = 'iata_code' in reader.fieldnames and 'municipality' in reader.fieldnames
+        seen = set()
+        for row in reader:
+            code = (row.get('iata_code') or '').strip().upper()
+            if len(code) != 3:
+                continue
+
+            if ourairports:
+                if row.get('type') not in OURAIRPORTS_TYPES:
+                    continue
+                airport = Airport(
+                    iata_code=code,
+                    name=row['name'].strip(),
+                    city_name=(row.get('municipality') or '').strip(),
+                    country_code=(row.get('iso_country') or '').strip().upper(),
+                    sub_type='AIRPORT',
+                )
+            else:
+                airport = Airport(
+                    iata_code=code,
+                    name=row['name'].strip(),
+                    city_name=(row.get('city_name') or '').strip(),
+                    country_code=(row.get('country_code') or '').strip().upper(),
+                    sub_type=(row.get('sub_type') or 'AIRPORT').strip().upper(),
+                )
+
+            if (airport.iata_code, airport.sub_type) in seen:
+                continue
+            seen.add((airport.iata_code, airport.sub_type))
+            yield airport
@@ -0,0 +1,49 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from trips.catalog_import import read_records, import_catalog, geocode_import
+
+
+class Command(BaseCommand):
+    help = ("Bulk import countries and cities from CSV, JSON Lines or JSON files, then geocode the new cities "
+            "without coordinates.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--countries', help="CSV/JSONL/JSON with name, description, flag_url, currency, "
+                                                "latitude, longitude.")
+        parser.add_argument('--cities', help="CSV/JSONL/JSON with country (name) or country_id, name, description, "
+                                             "img_url, latitude, longitude.")
+        parser.add_argument('--skip-geocoding', action='store_true',
+                            help="Only import; run `manage.py geocode_cities --resume` later to fill in coordinates.")
+        parser.add_argument('--workers', type=int, help="Concurrent geocoding requests.")
+
+    def handle(self, *args, **options):
+        if not options['countries'] and not options['cities']:
+            raise CommandError("Pass --countries and/or --cities.")
+
+        records = {}
+        for kind in ('countries', 'cities'):
+            path = options[kind]
+            if not path:
+                continue
+            try:
+                with open(path, encoding='utf-8-sig') as f:
+                    records[kind] = read_records(f, path)
+            except (OSError, ValueError) as e:
+                raise CommandError(f"Could not read {path}: {e}")
+
+        job = import_catalog(records.get('countries', ()), records.get('cities', ()))
+        self.stdout.write(f"Created {job.countries_created} countries and {job.cities_created} cities.")
+        for error in job.errors:
+            self.stderr.write(error)
+
+        if options['skip_geocoding']:
+            self.stdout.write(f"Catalog import #{job.pk} left {job.cities_to_geocode} cities to geocode.")
+            return
+
+        geocode_import(job, workers=options['workers'], progress=self.report_progress)
+        if job.status == 'failed':
+            raise CommandError(f"Catalog import #{job.pk} failed: {job.errors[-1]}")
+        self.stdout.write(self.style.SUCCESS(f"Catalog import #{job.pk} finished."))
+
+    def report_progress(self, processed, total, geocoded, failed):
+        self.stdout.write(f"Geocoded {geocoded}/{total} cities ({processed} processed, {failed} not found)")
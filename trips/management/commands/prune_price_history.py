@@ -0,0 +1,18 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+
+from TravellinoCappuchino import settings
+from trips.price_history import prune_price_history
+
+
+class Command(BaseCommand):
+    help = "Delete price observations older than the retention period, in batches (daily rollups are kept)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=settings.PRICE_HISTORY_RETENTION_DAYS)
+        parser.add_argument('--batch-size', type=int, default=10000)
+
+    def handle(self, *args, **options):
+        deleted = prune_price_history(timedelta(days=options['days']), batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f"Deleted {deleted} price observations."))
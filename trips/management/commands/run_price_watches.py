@@ -0,0 +1,48 @@
+import logging
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from TravellinoCappuchino import settings
+from trips.price_watch import run_cycle
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = "Check all active price watches every --interval seconds, one flight search per route and dates."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--interval', type=int, default=settings.PRICE_WATCH_INTERVAL)
+        parser.add_argument('--once', action='store_true', help="Run a single cycle and exit.")
+
+    def handle(self, *args, **options):
+        interval = timedelta(seconds=options['interval'])
+        scheduled_at = timezone.now()
+        while True:
+            delay = (scheduled_at - timezone.now()).total_seconds()
+            if delay > 0:
+                time.sleep(delay)
+            try:
+                cycle = run_cycle(scheduled_at)
+            except Exception:
+                # e.g. the database was briefly unreachable; the schedule keeps going
+                logger.exception("Price watch cycle scheduled at %s failed", scheduled_at)
+                if options['once']:
+                    raise
+            else:
+                self.stdout.write(
+                    f"{cycle.started_at:%Y-%m-%d %H:%M:%S} lag {cycle.lag:.1f}s, {cycle.watches} watches, "
+                    f"{cycle.routes} routes, {cycle.api_calls} API calls, {cycle.cache_hits} cached, "
+                    f"{cycle.failed_routes} failed, {cycle.alerts} alerts in {cycle.emails} emails, "
+                    f"took {cycle.duration:.1f}s"
+                )
+            if options['once']:
+                return
+
+            # a cycle that overran skips the slots it missed; the next one reports how late it started
+            scheduled_at += interval
+            while scheduled_at + interval <= timezone.now():
+                scheduled_at += interval
@@ -0,0 +1,27 @@
+# Generated by Django 5.2.7 on 2026-10-18 10:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('trips', '0003_savedtrip_user_visitedcountry_user_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Airport',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('iata_code', models.CharField(db_index=True, max_length=3)),
+                ('name', models.CharField(max_length=200)),
+                ('city_name', models.CharField(blank=True, max_length=100)),
+                ('country_code', models.CharField(blank=True, max_length=2)),
+                ('sub_type', models.CharField(default='AIRPORT', max_length=10)),
+            ],
+            options={
+                'unique_together': {('iata_code', 'sub_type')},
+            },
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.2.7 on 2026-10-18 10:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('trips', '0005_cachedtripplan'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReverseGeocode',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('lat_key', models.IntegerField()),
+                ('lon_key', models.IntegerField()),
+                ('street', models.CharField(blank=True, max_length=255)),
+                ('house_number', models.CharField(blank=True, max_length=50)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'unique_together': {('lat_key', 'lon_key')},
+            },
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.7 on 2026-10-18 10:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('trips', '0006_reversegeocode'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CatalogImport',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(choices=[('importing', 'Importing'), ('geocoding', 'Geocoding'), ('done', 'Done'), ('failed', 'Failed')], default='importing', max_length=20)),
+                ('countries_created', models.PositiveIntegerField(default=0)),
+                ('cities_created', models.PositiveIntegerField(default=0)),
+                ('cities_to_geocode', models.PositiveIntegerField(default=0)),
+                ('cities_geocoded', models.PositiveIntegerField(default=0)),
+                ('geocoding_failed', models.PositiveIntegerField(default=0)),
+                ('errors', models.JSONField(blank=True, default=list)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 5.2.7 on 2026-10-18 10:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('trips', '0007_catalogimport'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='city',
+            index=models.Index(fields=['name', 'id'], name='trips_city_name_e189d7_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='trip',
+            index=models.Index(fields=['city', 'price', 'id'], name='trips_trip_city_id_46309d_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='trip',
+            index=models.Index(fields=['price', 'id'], name='trips_trip_price_e7108f_idx'),
+        ),
+    ]
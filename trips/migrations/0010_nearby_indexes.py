@@ -0,0 +1,17 @@
+# Generated by Django 5.2.7 on 2026-10-18 10:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('trips', '0009_search_vector'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='city',
+            index=models.Index(fields=['latitude', 'longitude'], name='trips_city_latitud_f688e0_idx'),
+        ),
+    ]
@@ -0,0 +1,50 @@
+# Generated by Django 5.2.7 on 2026-10-18 10:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('trips', '0010_nearby_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PriceDailyRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('flight', 'Flight'), ('hotel', 'Hotel')], max_length=6)),
+                ('route', models.CharField(max_length=16)),
+                ('round_trip', models.BooleanField(default=False)),
+                ('travel_date', models.DateField()),
+                ('day', models.DateField()),
+                ('count', models.PositiveIntegerField(default=0)),
+                ('min_price', models.FloatField()),
+                ('max_price', models.FloatField()),
+                ('sum_price', models.FloatField(default=0)),
+                ('sketch', models.JSONField(default=dict)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['kind', 'route', 'day'], name='trips_price_kind_ac75b4_idx')],
+                'unique_together': {('kind', 'route', 'round_trip', 'travel_date', 'day')},
+            },
+        ),
+        migrations.CreateModel(
+            name='PriceObservation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('flight', 'Flight'), ('hotel', 'Hotel')], max_length=6)),
+                ('route', models.CharField(max_length=16)),
+                ('round_trip', models.BooleanField(default=False)),
+                ('travel_date', models.DateField()),
+                ('observed_at', models.DateTimeField()),
+                ('price', models.FloatField()),
+                ('currency', models.CharField(blank=True, max_length=3)),
+                ('carrier', models.CharField(blank=True, max_length=8)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['kind', 'route', 'travel_date'], name='trips_price_kind_84240a_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,53 @@
+# Generated by Django 5.2.7 on 2026-10-18 10:36
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('trips', '0011_price_history'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PriceWatchCycle',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('scheduled_at', models.DateTimeField()),
+                ('started_at', models.DateTimeField()),
+                ('duration', models.FloatField(default=0)),
+                ('watches', models.PositiveIntegerField(default=0)),
+                ('routes', models.PositiveIntegerField(default=0)),
+                ('api_calls', models.PositiveIntegerField(default=0)),
+                ('cache_hits', models.PositiveIntegerField(default=0)),
+                ('failed_routes', models.PositiveIntegerField(default=0)),
+                ('alerts', models.PositiveIntegerField(default=0)),
+                ('emails', models.PositiveIntegerField(default=0)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='PriceWatch',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('origin', models.CharField(max_length=3)),
+                ('destination', models.CharField(max_length=3)),
+                ('departure_date', models.DateField()),
+                ('return_date', models.DateField(blank=True, null=True)),
+                ('max_price', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('is_active', models.BooleanField(default=True)),
+                ('last_price', models.FloatField(blank=True, null=True)),
+                ('last_checked_at', models.DateTimeField(blank=True, null=True)),
+                ('notified_price', models.FloatField(blank=True, null=True)),
+                ('notified_at', models.DateTimeField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='price_watches', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['is_active', 'origin', 'destination', 'departure_date'], name='trips_price_is_acti_38e607_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.7 on 2026-10-18 10:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('trips', '0012_price_watch'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='catalogimport',
+            name='city_ids',
+            field=models.JSONField(blank=True, default=list, editable=False),
+        ),
+    ]
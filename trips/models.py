@@ -1,13 +1,14 @@
-import os
+import logging
 
-import requests
 from django.contrib import admin
 from django.contrib.auth.models import User
+from django.contrib.postgres.search import SearchVectorField
 from django.db import models
-import geocoder
 
 from TravellinoCappuchino import settings
 
+logger = logging.getLogger(__name__)
+
 
 class Country(models.Model):
     name = models.CharField(max_length=100, unique=True)
@@ -16,6 +17,8 @@ class Country(models.Model):
     currency = models.CharField(max_length=50, blank=True, null=True)
     latitude = models.FloatField(null=True, blank=True)
     longitude = models.FloatField(null=True, blank=True)
+    # kept up to date by trips.signals; GIN-indexed on PostgreSQL (see trips.search)
+    search_vector = SearchVectorField(null=True, editable=False)
 
 
     def __str__(self):
@@ -30,36 +33,76 @@ class City(models.Model):
     img_url = models.URLField(blank=True, null=True)
     latitude = models.FloatField(null=True, blank=True)
     longitude = models.FloatField(null=True, blank=True)
+    search_vector = SearchVectorField(null=True, editable=False)
 
     class Meta:
         unique_together = ("country", "name")
+        indexes = [
+            models.Index(fields=["name", "id"]),
+            # bounding-box prefilter of /cities/nearby/
+            models.Index(fields=["latitude", "longitude"]),
+        ]
 
     def __str__(self):
         return f"{self.name} ({self.country.name})"
 
     def save(self, *args, **kwargs):
         if (self.latitude is None or self.longitude is None) and self.name and self.country:
-            API_KEY = os.getenv("WEATHER_API_KEY")
-            url = (
-                f"http://api.openweathermap.org/geo/1.0/direct"
-                f"?q={self.name}&limit=1&appid={API_KEY}"
-            )
-            response = requests.get(url).json()
+            from .geocoding import geocode_place
+
+            try:
+                coordinates = geocode_place(self.name)
+            except Exception as e:
+                # saved without coordinates; `manage.py geocode_cities` fills them in later
+                logger.warning("Geocoding %s failed: %s", self.name, e)
+                coordinates = None
 
-            if response: # check if it is not empty
-                self.latitude = response[0]["lat"]
-                self.longitude = response[0]["lon"]
+            if coordinates: # check if it is not empty
+                self.latitude, self.longitude = coordinates
 
         super().save(*args, **kwargs)
 
 admin.site.register(City)
 
+class CatalogImport(models.Model):
+    STATUS_CHOICES = [
+        ('importing', 'Importing'),
+        ('geocoding', 'Geocoding'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+    ]
+
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='importing')
+    countries_created = models.PositiveIntegerField(default=0)
+    cities_created = models.PositiveIntegerField(default=0)
+    cities_to_geocode = models.PositiveIntegerField(default=0)
+    cities_geocoded = models.PositiveIntegerField(default=0)
+    geocoding_failed = models.PositiveIntegerField(default=0)
+    errors = models.JSONField(default=list, blank=True)
+    # cities this import created without coordinates; its geocoding is limited to them
+    city_ids = models.JSONField(default=list, blank=True, editable=False)
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"Catalog import #{self.pk} ({self.status})"
+
+admin.site.register(CatalogImport)
+
 class Trip(models.Model):
     city = models.ForeignKey(City, on_delete=models.CASCADE, related_name="trips")
     title = models.CharField(max_length=200)
     description = models.TextField()
     price = models.DecimalField(max_digits=10, decimal_places=2)
     duration_days = models.PositiveIntegerField(default=1)
+    search_vector = SearchVectorField(null=True, editable=False)
+
+    class Meta:
+        # keyset pagination of /trips/ by (price, id), optionally within a city
+        indexes = [
+            models.Index(fields=["city", "price", "id"]),
+            models.Index(fields=["price", "id"]),
+        ]
 
     def __str__(self):
         return self.title
@@ -84,31 +127,185 @@ class Flight(models.Model):
 
 admin.site.register(Flight)
 
+class Airport(models.Model):
+    iata_code = models.CharField(max_length=3, db_index=True)
+    name = models.CharField(max_length=200)
+    city_name = models.CharField(max_length=100, blank=True)
+    country_code = models.CharField(max_length=2, blank=True)
+    sub_type = models.CharField(max_length=10, default='AIRPORT')  # AIRPORT or CITY, as in Amadeus locations
+
+    class Meta:
+        unique_together = ("iata_code", "sub_type")
+
+    def __str__(self):
+        return f"{self.name} ({self.iata_code})"
+
+admin.site.register(Airport)
+
+class ReverseGeocode(models.Model):
+    # coordinates rounded to 4 decimals and stored as integers (lat * 10^4, lon * 10^4)
+    lat_key = models.IntegerField()
+    lon_key = models.IntegerField()
+    street = models.CharField(max_length=255, blank=True)
+    house_number = models.CharField(max_length=50, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        unique_together = ("lat_key", "lon_key")
+
+    def __str__(self):
+        return f"{self.lat_key},{self.lon_key}: {self.street} {self.house_number}".strip()
+
+
 class Hotel:
     def __init__(self, hotel):
         self.hotel = hotel
 
-    def construct_hotel(self):
+    @classmethod
+    def construct_hotels(cls, hotels, max_online=None):
+        """Construct a page of hotel offers, resolving all their addresses in one batch.
+
+        `max_online` caps the OSM lookups (see `reverse_geocode_many`); hotels beyond it get no address.
+        """
+        from .geocoding import reverse_geocode_many
+
+        coordinates = []
+        for hotel in hotels:
+            try:
+                coordinates.append((hotel['hotel']['latitude'], hotel['hotel']['longitude']))
+            except (TypeError, KeyError):
+                coordinates.append(None)
+        addresses = reverse_geocode_many([c for c in coordinates if c is not None], max_online=max_online)
+        addresses = iter(addresses)
+        return [
+            cls(hotel).construct_hotel(address=(next(addresses) if coordinate is not None else None) or {})
+            for hotel, coordinate in zip(hotels, coordinates)
+        ]
+
+    def construct_hotel(self, address=None):
+        from .geocoding import reverse_geocode, format_address
+
         try:
             offer = {}
             offer['price'] = self.hotel['offers'][0]['price']['total']
             offer['name'] = self.hotel['hotel']['name']
             offer['hotelID'] = self.hotel['hotel']['hotelId']
-            address = geocoder.osm(
-                [self.hotel['hotel']['latitude'], self.hotel['hotel']['longitude']],
-                method='reverse'
-            )
-            if address.json.get('houseNumber') is not None:
-                offer['address'] = address.json['street'] + ' ' +  address.json['houseNumber']
-            elif address.json.get('housenumber') is not None:
-                offer['address'] = address.json['street'] + ' ' +  address.json['housenumber']
-            else:
-                offer['address'] = address.json['street']
-        except (TypeError, AttributeError, KeyError):
+            if address is None:
+                address = reverse_geocode(self.hotel['hotel']['latitude'], self.hotel['hotel']['longitude'])
+            if format_address(address) is not None:
+                offer['address'] = format_address(address)
+        except (TypeError, AttributeError, KeyError, ValueError):
             pass
         return offer
 
 
+class CachedTripPlan(models.Model):
+    key = models.CharField(max_length=64, unique=True)
+    city = models.ForeignKey(City, on_delete=models.CASCADE, related_name="cached_plans")
+    preferences = models.JSONField(default=dict)
+    trip_plan = models.TextField()
+    hits = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    last_used_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    def __str__(self):
+        return f"{self.city_id} - {self.preferences}"
+
+
+class PriceObservation(models.Model):
+    """One price seen in a flight or hotel search (append-only; see trips.price_history).
+
+    `route` is "IST-CDG" for flights and the city code for hotels. `travel_date` is the departure or
+    check-in date. `price` is per adult for flights and per night for hotels.
+    """
+    KIND_CHOICES = [('flight', 'Flight'), ('hotel', 'Hotel')]
+
+    kind = models.CharField(max_length=6, choices=KIND_CHOICES)
+    route = models.CharField(max_length=16)
+    round_trip = models.BooleanField(default=False)
+    travel_date = models.DateField()
+    observed_at = models.DateTimeField()
+    price = models.FloatField()
+    currency = models.CharField(max_length=3, blank=True)
+    carrier = models.CharField(max_length=8, blank=True)
+
+    class Meta:
+        # observed_at is also BRIN-indexed on PostgreSQL, where rows arrive in time order
+        indexes = [models.Index(fields=["kind", "route", "travel_date"])]
+
+    def __str__(self):
+        return f"{self.route} {self.travel_date} {self.price}"
+
+
+class PriceDailyRollup(models.Model):
+    """Prices observed for one route and travel date on one day, with a mergeable quantile sketch."""
+    kind = models.CharField(max_length=6, choices=PriceObservation.KIND_CHOICES)
+    route = models.CharField(max_length=16)
+    round_trip = models.BooleanField(default=False)
+    travel_date = models.DateField()
+    day = models.DateField()
+    count = models.PositiveIntegerField(default=0)
+    min_price = models.FloatField()
+    max_price = models.FloatField()
+    sum_price = models.FloatField(default=0)
+    sketch = models.JSONField(default=dict)
+
+    class Meta:
+        unique_together = ("kind", "route", "round_trip", "travel_date", "day")
+        indexes = [models.Index(fields=["kind", "route", "day"])]
+
+    def __str__(self):
+        return f"{self.route} {self.travel_date} @ {self.day}"
+
+
+class PriceWatch(models.Model):
+    """A user's alert for a flight getting cheaper than `max_price` per adult (see trips.price_watch)."""
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="price_watches")
+    origin = models.CharField(max_length=3)
+    destination = models.CharField(max_length=3)
+    departure_date = models.DateField()
+    return_date = models.DateField(null=True, blank=True)
+    max_price = models.DecimalField(max_digits=10, decimal_places=2)
+    is_active = models.BooleanField(default=True)
+    last_price = models.FloatField(null=True, blank=True)
+    last_checked_at = models.DateTimeField(null=True, blank=True)
+    notified_price = models.FloatField(null=True, blank=True)
+    notified_at = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        # the scheduler reads active watches grouped by route and dates
+        indexes = [models.Index(fields=["is_active", "origin", "destination", "departure_date"])]
+
+    def __str__(self):
+        return f"{self.user} - {self.origin}-{self.destination} {self.departure_date} <= {self.max_price}"
+
+admin.site.register(PriceWatch)
+
+
+class PriceWatchCycle(models.Model):
+    """One run of `manage.py run_price_watches`: how late it started and how many searches it made."""
+    scheduled_at = models.DateTimeField()
+    started_at = models.DateTimeField()
+    duration = models.FloatField(default=0)
+    watches = models.PositiveIntegerField(default=0)
+    routes = models.PositiveIntegerField(default=0)
+    api_calls = models.PositiveIntegerField(default=0)
+    cache_hits = models.PositiveIntegerField(default=0)
+    failed_routes = models.PositiveIntegerField(default=0)
+    alerts = models.PositiveIntegerField(default=0)
+    emails = models.PositiveIntegerField(default=0)
+
+    @property
+    def lag(self):
+        return (self.started_at - self.scheduled_at).total_seconds()
+
+    def __str__(self):
+        return f"Price watch cycle {self.started_at:%Y-%m-%d %H:%M} ({self.routes} routes)"
+
+admin.site.register(PriceWatchCycle)
+
+
 class SavedTrip(models.Model):
     user = models.ForeignKey(
         settings.AUTH_USER_MODEL,
@@ -0,0 +1,64 @@
+import math
+
+from django.db.models import Q
+
+from .kdtree import EARTH_RADIUS_KM
+from .models import City
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    """Great-circle distances; any argument can be a NumPy array."""
+    import numpy as np
+
+    lat1, lon1, lat2, lon2 = map(np.radians, (lat1, lon1, lat2, lon2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.minimum(1.0, np.sqrt(a)))
+
+
+def bounding_box(latitude, longitude, radius_km):
+    """(min_lat, max_lat, [(min_lon, max_lon), ...]) enclosing the circle; split at the antimeridian."""
+    angle = radius_km / EARTH_RADIUS_KM
+    delta_lat = math.degrees(angle)
+    min_lat, max_lat = latitude - delta_lat, latitude + delta_lat
+    if min_lat <= -90 or max_lat >= 90:
+        # the circle covers a pole, so every longitude is in range
+        return max(min_lat, -90), min(max_lat, 90), [(-180, 180)]
+
+    ratio = math.sin(angle) / math.cos(math.radians(latitude))
+    if ratio >= 1:
+        return min_lat, max_lat, [(-180, 180)]
+    delta_lon = math.degrees(math.asin(ratio))
+    min_lon, max_lon = longitude - delta_lon, longitude + delta_lon
+    if min_lon < -180:
+        return min_lat, max_lat, [(min_lon + 360, 180), (-180, max_lon)]
+    if max_lon > 180:
+        return min_lat, max_lat, [(min_lon, 180), (-180, max_lon - 360)]
+    return min_lat, max_lat, [(min_lon, max_lon)]
+
+
+def nearby_cities(latitude, longitude, radius_km, limit=50):
+    """Cities within `radius_km`, nearest first, as (city, distance_km) pairs.
+
+    The (latitude, longitude) index narrows the table to the bounding box; only the ids and
+    coordinates of those candidates are loaded, and their exact distances computed in one NumPy pass.
+    """
+    import numpy as np
+
+    min_lat, max_lat, longitude_ranges = bounding_box(latitude, longitude, radius_km)
+    in_box = Q()
+    for low, high in longitude_ranges:
+        in_box |= Q(longitude__range=(low, high))
+    candidates = City.objects.filter(in_box, latitude__range=(min_lat, max_lat)).values_list(
+        'id', 'latitude', 'longitude')
+
+    rows = np.array(list(candidates), dtype=float).reshape(-1, 3)
+    ids = rows[:, 0].astype(np.int64)
+    distances = haversine_km(latitude, longitude, rows[:, 1], rows[:, 2])
+    inside = distances <= radius_km
+    ids, distances = ids[inside], distances[inside]
+    order = np.lexsort((ids, distances))[:limit]
+    nearest = ids[order].tolist()
+    distances = dict(zip(nearest, distances[order].tolist()))
+
+    cities = City.objects.select_related('country').in_bulk(nearest)
+    return [(cities[pk], distances[pk]) for pk in nearest if pk in cities]
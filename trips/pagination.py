@@ -0,0 +1,101 @@
+import base64
+import json
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """Forward-only keyset pagination.
+
+    The view sets `keyset_ordering` (or `get_keyset_ordering()`), e.g. ('price', 'id'); the last
+    field must be unique. The cursor holds the ordering values of the last row of the page, so
+    the next page is a range scan over a matching index instead of an OFFSET.
+    """
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'page_size'
+    page_size = 50
+    max_page_size = 200
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.ordering = self.get_ordering(view)
+        self.fields = [field.lstrip('-') for field in self.ordering]
+        page_size = self.get_page_size(request)
+
+        queryset = queryset.order_by(*self.ordering)
+        cursor = request.query_params.get(self.cursor_query_param)
+        if cursor:
+            queryset = queryset.filter(self.after(self.decode_cursor(queryset.model, cursor)))
+
+        rows = list(queryset[:page_size + 1])
+        self.has_next = len(rows) > page_size
+        self.page = rows[:page_size]
+        return self.page
+
+    def get_ordering(self, view):
+        if hasattr(view, 'get_keyset_ordering'):
+            return view.get_keyset_ordering()
+        return view.keyset_ordering
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return min(max(size, 1), self.max_page_size)
+
+    def after(self, values):
+        """Rows strictly after `values` in the ordering.
+
+        For (a, b) this is `a >= x AND (a > x OR b > y)` rather than `a > x OR (a = x AND b > y)`,
+        so the database can start the index scan at x.
+        """
+        condition = None
+        for position in reversed(range(len(self.ordering))):
+            field = self.fields[position]
+            op = 'lt' if self.ordering[position].startswith('-') else 'gt'
+            value = values[position]
+            strictly = Q(**{f'{field}__{op}': value})
+            if condition is None:
+                condition = strictly
+            else:
+                condition = Q(**{f'{field}__{op}e': value}) & (strictly | condition)
+        return condition
+
+    def encode_cursor(self, row):
+        values = [str(getattr(row, field)) for field in self.fields]
+        return base64.urlsafe_b64encode(json.dumps(values).encode()).decode()
+
+    def decode_cursor(self, model, cursor):
+        """The cursor's ordering values, converted to the fields' Python types."""
+        try:
+            values = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+            if not isinstance(values, list) or len(values) != len(self.fields):
+                raise NotFound("Invalid cursor")
+            return [model._meta.get_field(field).to_python(value) for field, value in zip(self.fields, values)]
+        except (TypeError, ValueError, IndexError, ValidationError):
+            raise NotFound("Invalid cursor")
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, self.encode_cursor(self.page[-1]))
+
+    def get_paginated_response(self, data):
+        return Response({'next': self.get_next_link(), 'results': data})
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
@@ -0,0 +1,141 @@
+import hashlib
+import json
+import re
+
+from django.db.models import F, Sum
+from django.utils import timezone
+
+from TravellinoCappuchino import settings
+from .models import CachedTripPlan
+
+MONTHS = ['january', 'february', 'march', 'april', 'may', 'june', 'july',
+          'august', 'september', 'october', 'november', 'december']
+
+BUDGET_STEP = 100
+BUDGET_RE = re.compile(r'^(\D*?)\s*(\d[\d\s,.]*)\s*(\D*)$')
+THOUSANDS_RE = re.compile(r'^\d{1,3}([.,]\d{3})+$')
+
+stats = {'hits': 0, 'misses': 0}
+
+
+def normalize_text(value):
+    if value is None:
+        return None
+    value = ' '.join(str(value).lower().split())
+    return value or None
+
+
+def canonical_days(value):
+    try:
+        return max(1, int(round(float(value))))
+    except (TypeError, ValueError):
+        return normalize_text(value)
+
+
+def canonical_month(value):
+    value = normalize_text(value)
+    if value is None:
+        return None
+    if value.isdigit() and 1 <= int(value) <= 12:
+        return MONTHS[int(value) - 1]
+    for month in MONTHS:
+        if len(value) >= 3 and month.startswith(value.rstrip('.')):
+            return month
+    return value
+
+
+def canonical_budget(value):
+    """Round numeric budgets to BUDGET_STEP ("1,049 usd" -> "1000 usd"), otherwise normalize the text.
+
+    Budgets below one step are kept as they are rather than rounded down to nothing.
+    """
+    value = normalize_text(value)
+    if value is None:
+        return None
+    match = BUDGET_RE.match(value)
+    if not match:
+        return value
+    prefix, amount, suffix = match.groups()
+    amount = re.sub(r'\s', '', amount)
+    # "1,049" and "1.000" group thousands; otherwise commas are dropped and "." is the decimal point
+    amount = re.sub(r'[.,]', '', amount) if THOUSANDS_RE.match(amount) else amount.replace(',', '')
+    try:
+        amount = float(amount)
+    except ValueError:
+        return value
+    if amount >= BUDGET_STEP:
+        amount = round(amount / BUDGET_STEP) * BUDGET_STEP
+    if amount == int(amount):
+        amount = int(amount)
+    return f"{prefix.strip()}{amount} {suffix.strip()}".strip()
+
+
+def canonical_preferences(days=None, travel_goal=None, month=None, budget=None, style=None, company=None):
+    preferences = {
+        'days': canonical_days(days) if days else None,
+        'travel_goal': normalize_text(travel_goal),
+        'month': canonical_month(month),
+        'budget': canonical_budget(budget),
+        'style': normalize_text(style),
+        'company': normalize_text(company),
+    }
+    return {key: value for key, value in preferences.items() if value is not None}
+
+
+def plan_cache_key(city_id, preferences):
+    raw = json.dumps({'city': str(city_id).strip(), **preferences}, sort_keys=True)
+    return hashlib.sha256(raw.encode()).hexdigest()
+
+
+def get_cached_plan(city_id, preferences):
+    key = plan_cache_key(city_id, preferences)
+    oldest = timezone.now() - settings.TRIP_PLAN_CACHE_MAX_AGE
+    plan = CachedTripPlan.objects.filter(key=key, created_at__gte=oldest).values_list('trip_plan', flat=True).first()
+    if plan is None:
+        stats['misses'] += 1
+        return None
+
+    stats['hits'] += 1
+    CachedTripPlan.objects.filter(key=key).update(hits=F('hits') + 1, last_used_at=timezone.now())
+    return plan
+
+
+def store_plan(city_id, preferences, trip_plan):
+    now = timezone.now()
+    CachedTripPlan.objects.update_or_create(
+        key=plan_cache_key(city_id, preferences),
+        defaults={
+            'city_id': city_id,
+            'preferences': preferences,
+            'trip_plan': trip_plan,
+            'hits': 0,
+            'created_at': now,
+            'last_used_at': now,
+        },
+    )
+    evict_plans()
+
+
+def evict_plans():
+    CachedTripPlan.objects.filter(created_at__lt=timezone.now() - settings.TRIP_PLAN_CACHE_MAX_AGE).delete()
+
+    # least recently used entries beyond the size bound
+    stale = CachedTripPlan.objects.order_by('-last_used_at').values_list('id', flat=True)[
+        settings.TRIP_PLAN_CACHE_MAX_ENTRIES:]
+    stale_ids = list(stale)
+    if stale_ids:
+        CachedTripPlan.objects.filter(id__in=stale_ids).delete()
+
+
+def plan_cache_stats():
+    total = stats['hits'] + stats['misses']
+    stored = CachedTripPlan.objects.aggregate(hits=Sum('hits'))
+    return {
+        'backend': 'database',
+        'hits': stats['hits'],
+        'misses': stats['misses'],
+        'hit_rate': round(stats['hits'] / total, 4) if total else None,
+        'entries': CachedTripPlan.objects.count(),
+        'stored_hits': stored['hits'] or 0,
+        'max_entries': settings.TRIP_PLAN_CACHE_MAX_ENTRIES,
+    }
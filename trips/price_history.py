@@ -0,0 +1,272 @@
+"""Price history fed by flight and hotel searches.
+
+Searches hand their raw results to `record_flight_search` / `record_hotel_search`, which keep the
+cheapest price per carrier (hotel chain) and buffer it. `PriceRecorder` writes the buffered
+observations in batches on a background thread and folds them into per route/travel date/day
+rollups in the same transaction, so `price_trend` only reads a handful of rollup rows.
+"""
+import atexit
+import logging
+import threading
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+
+from django.db import IntegrityError, connection, connections, transaction
+from django.utils import timezone
+
+from TravellinoCappuchino import settings
+from .models import PriceObservation, PriceDailyRollup
+
+logger = logging.getLogger(__name__)
+
+
+def parse_date(value):
+    return date.fromisoformat(str(value)[:10])
+
+
+def flight_route(origin, destination):
+    return f"{origin}-{destination}".upper()
+
+
+def flight_observations(params, data, observed_at):
+    """Cheapest price per adult for each validating carrier in one flight_offers_search response."""
+    adults = int(params.get('adults') or 1)
+    cheapest = {}
+    for offer in data or []:
+        try:
+            price = float(offer['price']['total']) / adults
+            currency = offer['price'].get('currency', '')
+        except (KeyError, TypeError, ValueError):
+            continue
+        carrier = (offer.get('validatingAirlineCodes') or [''])[0]
+        if carrier not in cheapest or price < cheapest[carrier][0]:
+            cheapest[carrier] = (price, currency)
+
+    route = flight_route(params['originLocationCode'], params['destinationLocationCode'])
+    travel_date = parse_date(params['departureDate'])
+    return [
+        PriceObservation(kind='flight', route=route, round_trip=bool(params.get('returnDate')),
+                         travel_date=travel_date, observed_at=observed_at, price=round(price, 2),
+                         currency=currency, carrier=carrier)
+        for carrier, (price, currency) in cheapest.items()
+    ]
+
+
+def hotel_observations(params, results, observed_at):
+    """Cheapest nightly price per hotel chain across the chunk results of one hotel search."""
+    check_in = parse_date(params['checkInDate'])
+    nights = max((parse_date(params['checkOutDate']) - check_in).days, 1)
+    cheapest = {}
+    for result in results:
+        if isinstance(result, BaseException):
+            continue
+        for hotel in result or []:
+            chain = hotel.get('hotel', {}).get('chainCode', '')
+            for offer in hotel.get('offers', []):
+                try:
+                    price = float(offer['price']['total']) / nights
+                    currency = offer['price'].get('currency', '')
+                except (KeyError, TypeError, ValueError):
+                    continue
+                if chain not in cheapest or price < cheapest[chain][0]:
+                    cheapest[chain] = (price, currency)
+
+    route = str(params['cityCode']).upper()
+    return [
+        PriceObservation(kind='hotel', route=route, travel_date=check_in, observed_at=observed_at,
+                         price=round(price, 2), currency=currency, carrier=chain)
+        for chain, (price, currency) in cheapest.items()
+    ]
+
+
+def rollup_key(observation):
+    return (observation.kind, observation.route, observation.round_trip, observation.travel_date,
+            timezone.localdate(observation.observed_at))
+
+
+def roll_up(observations):
+    """Fold observations into their PriceDailyRollup rows (call inside a transaction)."""
+    from .price_stats import QuantileSketch
+
+    groups = defaultdict(list)
+    for observation in observations:
+        groups[rollup_key(observation)].append(observation.price)
+
+    existing = {}
+    candidates = PriceDailyRollup.objects.select_for_update().filter(
+        route__in={key[1] for key in groups},
+        travel_date__in={key[3] for key in groups},
+        day__in={key[4] for key in groups},
+    )
+    for rollup in candidates:
+        existing[rollup.kind, rollup.route, rollup.round_trip, rollup.travel_date, rollup.day] = rollup
+
+    created = []
+    updated = []
+    for key, prices in groups.items():
+        rollup = existing.get(key)
+        if rollup is None:
+            kind, route, round_trip, travel_date, day = key
+            rollup = PriceDailyRollup(kind=kind, route=route, round_trip=round_trip, travel_date=travel_date,
+                                      day=day, min_price=min(prices), max_price=max(prices))
+            created.append(rollup)
+        else:
+            updated.append(rollup)
+        sketch = QuantileSketch.from_dict(rollup.sketch) if rollup.sketch else QuantileSketch()
+        rollup.sketch = sketch.add(prices).to_dict()
+        rollup.count += len(prices)
+        rollup.sum_price += sum(prices)
+        rollup.min_price = min(rollup.min_price, min(prices))
+        rollup.max_price = max(rollup.max_price, max(prices))
+
+    PriceDailyRollup.objects.bulk_create(created)
+    PriceDailyRollup.objects.bulk_update(updated, ['count', 'sum_price', 'min_price', 'max_price', 'sketch'])
+
+
+def write_batch(observations):
+    try:
+        for attempt in range(2):
+            try:
+                with transaction.atomic():
+                    PriceObservation.objects.bulk_create(observations, batch_size=1000)
+                    roll_up(observations)
+                break
+            except IntegrityError:
+                # another worker created one of the same rollup rows first; it is locked on the retry
+                if attempt:
+                    raise
+    except Exception:
+        logger.exception("Could not store %s price observations", len(observations))
+    finally:
+        connection.close()
+
+
+class PriceRecorder:
+    """Buffers observations; a batch is written when it is full or PRICE_HISTORY_FLUSH_INTERVAL after it began."""
+
+    def __init__(self):
+        self.pending = []
+        self._lock = threading.Lock()
+        self._timer = None
+        self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix='price-history')
+
+    def record(self, observations):
+        if not observations:
+            return
+        with self._lock:
+            self.pending.extend(observations)
+            full = len(self.pending) >= settings.PRICE_HISTORY_BATCH_SIZE
+            if not full and self._timer is None:
+                self._timer = threading.Timer(settings.PRICE_HISTORY_FLUSH_INTERVAL, self.flush)
+                self._timer.daemon = True
+                self._timer.start()
+        if full:
+            self.flush()
+
+    def take(self):
+        with self._lock:
+            batch, self.pending = self.pending, []
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+        return batch
+
+    def flush(self):
+        """Hand the buffered observations to the writer thread; returns its future (or None)."""
+        batch = self.take()
+        if batch:
+            return self._writer.submit(write_batch, batch)
+        return None
+
+    def close(self):
+        # the executor no longer takes work at interpreter exit, so the last batch is written here
+        self._writer.shutdown(wait=True)
+        batch = self.take()
+        if batch:
+            write_batch(batch)
+
+
+recorder = PriceRecorder()
+atexit.register(recorder.close)
+
+
+def record_flight_search(params, data):
+    if not settings.PRICE_HISTORY_ENABLED:
+        return
+    try:
+        recorder.record(flight_observations(params, data, timezone.now()))
+    except Exception:
+        logger.exception("Could not record flight prices")
+
+
+def record_hotel_search(params, results):
+    if not settings.PRICE_HISTORY_ENABLED:
+        return
+    try:
+        recorder.record(hotel_observations(params, results, timezone.now()))
+    except Exception:
+        logger.exception("Could not record hotel prices")
+
+
+def price_trend(kind, route, round_trip=False, travel_date=None, days=30):
+    """Prices of a route from the daily rollups.
+
+    With `travel_date`: how that date's prices moved over the last `days` days of searches.
+    Without: prices per travel date for the next `days` days.
+    """
+    from .price_stats import QuantileSketch
+
+    today = timezone.localdate()
+    rollups = PriceDailyRollup.objects.filter(kind=kind, route=route, round_trip=round_trip)
+    if travel_date:
+        rollups = rollups.filter(travel_date=travel_date, day__gte=today - timedelta(days=days))
+        group_by = 'day'
+    else:
+        rollups = rollups.filter(travel_date__range=(today, today + timedelta(days=days)))
+        group_by = 'travel_date'
+
+    points = {}
+    overall = QuantileSketch()
+    for rollup in rollups.order_by(group_by):
+        sketch = QuantileSketch.from_dict(rollup.sketch)
+        overall.merge(sketch)
+        point = points.setdefault(getattr(rollup, group_by), {'sketch': QuantileSketch(), 'sum': 0.0})
+        point['sketch'].merge(sketch)
+        point['sum'] += rollup.sum_price
+
+    series = []
+    for day, point in points.items():
+        sketch = point['sketch']
+        series.append({
+            'date': day.isoformat(),
+            'count': sketch.count,
+            'min': sketch.min,
+            'median': round(sketch.quantile(0.5), 2),
+            'max': sketch.max,
+            'average': round(point['sum'] / sketch.count, 2),
+        })
+    metrics = overall.summary()
+    if metrics:
+        metrics = {key: round(value, 2) for key, value in metrics.items()}
+    return {'series': series, 'metrics': metrics}
+
+
+def prune_price_history(older_than, batch_size=10000):
+    """Delete observations older than `older_than` in batches (the daily rollups are kept)."""
+    cutoff = timezone.now() - older_than
+    deleted = 0
+    while True:
+        ids = list(PriceObservation.objects.filter(observed_at__lt=cutoff).values_list('id', flat=True)[:batch_size])
+        if not ids:
+            return deleted
+        deleted += PriceObservation.objects.filter(id__in=ids).delete()[0]
+
+
+def create_price_history_indexes(using='default', **kwargs):
+    """post_migrate: a BRIN index on observed_at, tiny for an append-only, time-ordered table (PostgreSQL)."""
+    if connections[using].vendor != 'postgresql':
+        return
+    table = PriceObservation._meta.db_table
+    with connections[using].cursor() as cursor:
+        cursor.execute(f'CREATE INDEX IF NOT EXISTS "{table}_observed_brin" ON "{table}" USING brin (observed_at)')
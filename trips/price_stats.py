@@ -0,0 +1,129 @@
+"""Price statistics for flight and hotel offers.
+
+`summarize` computes exact statistics over one result set; a search response holds all of its
+offers anyway, so chunked hotel results are summarized together. `QuantileSketch` keeps approximate
+quantiles in a small, mergeable form for prices that are no longer held: the daily price history
+rollups (see `price_history`) are merged across days and routes without keeping every observation.
+"""
+import math
+
+import numpy as np
+
+from TravellinoCappuchino import settings
+
+QUARTILES = [0.0, 0.25, 0.5, 0.75, 1.0]
+
+
+def price_array(prices):
+    """Prices as a float array, dropping anything missing or not a finite number."""
+    array = np.asarray([price for price in prices if price is not None], dtype=float)
+    return array[np.isfinite(array)]
+
+
+def histogram(prices, buckets=None):
+    counts, edges = np.histogram(prices, bins=buckets or settings.PRICE_HISTOGRAM_BUCKETS)
+    return {'edges': np.round(edges, 2).tolist(), 'counts': counts.tolist()}
+
+
+def summarize(prices, buckets=None):
+    """count, min, first/median/third quartile, max and a histogram of `prices`; None if there are none."""
+    prices = price_array(prices)
+    if not prices.size:
+        return None
+    low, first, median, third, high = np.quantile(prices, QUARTILES).tolist()
+    return {
+        'count': int(prices.size),
+        'min': low,
+        'first': first,
+        'median': median,
+        'third': third,
+        'max': high,
+        'histogram': histogram(prices, buckets),
+    }
+
+
+class QuantileSketch:
+    """Mergeable quantile sketch with bounded relative error (logarithmic buckets, as in DDSketch).
+
+    A price p lands in bucket ceil(log(p) / log(gamma)); any quantile read back is within
+    `relative_accuracy` of the exact one. Sketches with the same accuracy merge by adding counts.
+    """
+
+    def __init__(self, relative_accuracy=0.01):
+        self.relative_accuracy = relative_accuracy
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self.log_gamma = math.log(self.gamma)
+        self.buckets = {}
+        self.zero_count = 0
+        self.count = 0
+        self.min = math.inf
+        self.max = -math.inf
+
+    def add(self, prices):
+        prices = price_array(prices)
+        if not prices.size:
+            return self
+        positive = prices[prices > 0]
+        self.zero_count += int(prices.size - positive.size)
+        if positive.size:
+            keys, counts = np.unique(np.ceil(np.log(positive) / self.log_gamma).astype(int), return_counts=True)
+            for key, count in zip(keys.tolist(), counts.tolist()):
+                self.buckets[key] = self.buckets.get(key, 0) + count
+        self.count += int(prices.size)
+        self.min = min(self.min, float(prices.min()))
+        self.max = max(self.max, float(prices.max()))
+        return self
+
+    def merge(self, other):
+        if other.relative_accuracy != self.relative_accuracy:
+            raise ValueError("Only sketches with the same relative accuracy can be merged")
+        for key, count in other.buckets.items():
+            self.buckets[key] = self.buckets.get(key, 0) + count
+        self.zero_count += other.zero_count
+        self.count += other.count
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        return self
+
+    def quantile(self, q):
+        if not self.count:
+            return None
+        rank = q * (self.count - 1)
+        if rank < self.zero_count:
+            return max(self.min, 0.0)
+        seen = self.zero_count
+        for key in sorted(self.buckets):
+            seen += self.buckets[key]
+            if seen > rank:
+                # the bucket covers (gamma^(key-1), gamma^key]; this point is within the accuracy of both ends
+                value = 2 * self.gamma ** key / (self.gamma + 1)
+                return min(max(value, self.min), self.max)
+        return self.max
+
+    def summary(self):
+        if not self.count:
+            return None
+        first, median, third = (self.quantile(q) for q in QUARTILES[1:4])
+        return {'count': self.count, 'min': self.min, 'first': first, 'median': median, 'third': third,
+                'max': self.max}
+
+    def to_dict(self):
+        return {
+            'relative_accuracy': self.relative_accuracy,
+            'buckets': {str(key): count for key, count in self.buckets.items()},
+            'zero_count': self.zero_count,
+            'count': self.count,
+            'min': self.min if self.count else None,
+            'max': self.max if self.count else None,
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        sketch = cls(data['relative_accuracy'])
+        sketch.buckets = {int(key): count for key, count in data['buckets'].items()}
+        sketch.zero_count = data['zero_count']
+        sketch.count = data['count']
+        if sketch.count:
+            sketch.min = data['min']
+            sketch.max = data['max']
+        return sketch
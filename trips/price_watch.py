@@ -0,0 +1,165 @@
+"""Price watches, checked by `manage.py run_price_watches`.
+
+Each cycle groups the active watches by route and dates and searches every group once, for one
+adult, through the shared flight search cache (a route a user searched moments ago costs no call).
+Watches whose limit is met are queued in the email outbox, one message per user, in the same
+transaction that records them as notified; `manage.py send_outbox` delivers them.
+"""
+import logging
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+from django.db import transaction
+from django.utils import timezone
+
+from TravellinoCappuchino import settings
+from users.outbox import enqueue_email
+from .cache import flight_search_cache
+from .models import PriceWatch, PriceWatchCycle
+from .services.flights import normalize_flight_search, search_flight_offers
+
+logger = logging.getLogger(__name__)
+
+
+def route_key(watch):
+    return (watch.origin, watch.destination, watch.departure_date, watch.return_date)
+
+
+def route_search_params(key):
+    origin, destination, departure_date, return_date = key
+    params = {
+        'originLocationCode': origin,
+        'destinationLocationCode': destination,
+        'departureDate': departure_date.isoformat(),
+        'adults': 1,
+    }
+    if return_date:
+        params['returnDate'] = return_date.isoformat()
+    return normalize_flight_search(params)
+
+
+def cheapest_route_price(key):
+    """(cheapest price or None, whether Amadeus was called) for one route."""
+    params = route_search_params(key)
+    offers = flight_search_cache.get(params)
+    searched = offers is None
+    if searched:
+        offers = search_flight_offers(**params)
+        flight_search_cache.set(params, offers)
+    return min((float(offer['price']) for offer in offers), default=None), searched
+
+
+def check_routes(keys):
+    """{route key: (price, searched) or the exception the search raised}, searched on a bounded pool."""
+    if not keys:
+        return {}
+    with ThreadPoolExecutor(max_workers=min(len(keys), settings.PRICE_WATCH_MAX_WORKERS)) as pool:
+        futures = {key: pool.submit(cheapest_route_price, key) for key in keys}
+    results = {}
+    for key, future in futures.items():
+        try:
+            results[key] = future.result()
+        except Exception as e:
+            logger.warning("Price watch search for %s failed: %s", key, e)
+            results[key] = e
+    return results
+
+
+def should_alert(watch, price):
+    if price is None or price > float(watch.max_price):
+        return False
+    # only alert again when it got cheaper than what the user was last told
+    return watch.notified_price is None or price < watch.notified_price
+
+
+def alert_body(watches):
+    lines = []
+    for watch in watches:
+        dates = f"{watch.departure_date}" + (f" - {watch.return_date}" if watch.return_date else "")
+        lines.append(f"{watch.origin} -> {watch.destination}, {dates}: {watch.last_price:.2f} "
+                     f"(your limit {watch.max_price})")
+    return 'Good news! These flights are now within your price limit:\n\n' + '\n'.join(lines)
+
+
+def queue_price_alerts(alerts):
+    """Queue the alerts in the email outbox, one message per user; returns the number of messages."""
+    by_user = defaultdict(list)
+    for watch in alerts:
+        by_user[watch.user].append(watch)
+    for user, watches in by_user.items():
+        enqueue_email('Flights you are watching got cheaper', alert_body(watches), [user.email])
+    return len(by_user)
+
+
+def run_cycle(scheduled_at=None):
+    """Check every active watch once; returns the saved PriceWatchCycle."""
+    started_at = timezone.now()
+    cycle = PriceWatchCycle(scheduled_at=scheduled_at or started_at, started_at=started_at)
+    start = time.perf_counter()
+
+    PriceWatch.objects.filter(is_active=True, departure_date__lt=timezone.localdate()).update(is_active=False)
+    watches = list(PriceWatch.objects.filter(is_active=True).select_related('user'))
+    groups = defaultdict(list)
+    for watch in watches:
+        groups[route_key(watch)].append(watch)
+
+    results = check_routes(list(groups))
+    checked_at = timezone.now()
+    alerts = []
+    for key, group in groups.items():
+        result = results[key]
+        if isinstance(result, Exception):
+            cycle.failed_routes += 1
+            continue
+        price, searched = result
+        cycle.api_calls += searched
+        cycle.cache_hits += not searched
+        for watch in group:
+            watch.last_price = price
+            watch.last_checked_at = checked_at
+            if should_alert(watch, price):
+                alerts.append(watch)
+
+    for watch in alerts:
+        watch.notified_price = watch.last_price
+        watch.notified_at = checked_at
+    # no mail server is involved here: an alert is queued exactly when its watch is marked notified
+    with transaction.atomic():
+        cycle.emails = queue_price_alerts(alerts)
+        PriceWatch.objects.bulk_update(
+            [watch for watch in watches if watch.last_checked_at == checked_at],
+            ['last_price', 'last_checked_at', 'notified_price', 'notified_at'],
+            batch_size=500,
+        )
+
+    cycle.watches = len(watches)
+    cycle.routes = len(groups)
+    cycle.alerts = len(alerts)
+    cycle.duration = time.perf_counter() - start
+    cycle.save()
+    logger.info("Price watch cycle: %s watches, %s routes, %s API calls, %s alerts, lag %.1fs, took %.1fs",
+                cycle.watches, cycle.routes, cycle.api_calls, cycle.alerts, cycle.lag, cycle.duration)
+    return cycle
+
+
+def cycle_stats(limit=20):
+    cycles = list(PriceWatchCycle.objects.order_by('-started_at')[:limit])
+    return {
+        'active_watches': PriceWatch.objects.filter(is_active=True).count(),
+        'cycles': [
+            {
+                'started_at': cycle.started_at,
+                'lag': round(cycle.lag, 3),
+                'duration': round(cycle.duration, 3),
+                'watches': cycle.watches,
+                'routes': cycle.routes,
+                'api_calls': cycle.api_calls,
+                'cache_hits': cycle.cache_hits,
+                'failed_routes': cycle.failed_routes,
+                'alerts': cycle.alerts,
+                'emails': cycle.emails,
+            }
+            for cycle in cycles
+        ],
+    }
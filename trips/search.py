@@ -0,0 +1,138 @@
+import math
+import re
+import threading
+import unicodedata
+from collections import defaultdict
+
+from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVector
+from django.db import connections
+from django.db.models import F
+
+from TravellinoCappuchino import settings
+from .models import Country, City, Trip
+
+# result type -> (model, field weighted A, field weighted B)
+SEARCHABLE = {
+    'country': (Country, 'name', 'description'),
+    'city': (City, 'name', 'description'),
+    'trip': (Trip, 'title', 'description'),
+}
+
+# Postgres' default ts_rank weights for A and B, so both backends rank alike
+NAME_WEIGHT = 1.0
+TEXT_WEIGHT = 0.4
+
+TOKEN_RE = re.compile(r'\w+')
+
+
+def uses_postgres(using='default'):
+    return connections[using].vendor == 'postgresql'
+
+
+def search_vector(name_field, text_field):
+    return (SearchVector(name_field, weight='A', config=settings.SEARCH_CONFIG)
+            + SearchVector(text_field, weight='B', config=settings.SEARCH_CONFIG))
+
+
+def update_search_vectors(model, **filters):
+    """Recompute `search_vector` for the matching rows in one UPDATE (PostgreSQL only)."""
+    if not uses_postgres():
+        return
+    _, name_field, text_field = next(spec for spec in SEARCHABLE.values() if spec[0] is model)
+    model.objects.filter(**filters).update(search_vector=search_vector(name_field, text_field))
+
+
+def create_search_indexes(using='default', **kwargs):
+    """post_migrate: GIN indexes on the tsvector columns, then fill vectors that were never computed."""
+    if not uses_postgres(using):
+        return
+    with connections[using].cursor() as cursor:
+        for model, _, _ in SEARCHABLE.values():
+            table = model._meta.db_table
+            cursor.execute(f'CREATE INDEX IF NOT EXISTS "{table}_search_gin" ON "{table}" USING gin (search_vector)')
+    for model, _, _ in SEARCHABLE.values():
+        update_search_vectors(model, search_vector__isnull=True)
+
+
+def tokenize(text):
+    text = unicodedata.normalize('NFKD', text or '')
+    text = ''.join(char for char in text if not unicodedata.combining(char))
+    return TOKEN_RE.findall(text.lower())
+
+
+class InvertedIndex:
+    """In-memory token -> documents index, used instead of tsvector columns outside PostgreSQL.
+
+    Every query token has to match (like websearch_to_tsquery); documents are ranked by the
+    field weights of the matched tokens scaled by how rare each token is.
+    """
+
+    def __init__(self, documents):
+        self.names = {}
+        self.postings = defaultdict(dict)
+        for key, name, text in documents:
+            self.names[key] = name
+            for value, weight in ((name, NAME_WEIGHT), (text, TEXT_WEIGHT)):
+                for token in tokenize(value):
+                    postings = self.postings[token]
+                    postings[key] = postings.get(key, 0) + weight
+
+    def search(self, text, types):
+        scores = None
+        for token in set(tokenize(text)):
+            postings = self.postings.get(token)
+            if not postings:
+                return []
+            idf = math.log(1 + len(self.names) / len(postings))
+            if scores is None:
+                scores = {key: weight * idf for key, weight in postings.items() if key[0] in types}
+            else:
+                scores = {key: score + postings[key] * idf for key, score in scores.items() if key in postings}
+        if not scores:
+            return []
+        ranked = sorted(scores.items(), key=lambda item: (-item[1], item[0]))
+        return [{'type': kind, 'id': pk, 'name': self.names[kind, pk], 'rank': score}
+                for (kind, pk), score in ranked]
+
+    def __len__(self):
+        return len(self.names)
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_search_index():
+    global _index
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                documents = []
+                for kind, (model, name_field, text_field) in SEARCHABLE.items():
+                    rows = model.objects.values_list('pk', name_field, text_field)
+                    documents += [((kind, pk), name, text) for pk, name, text in rows.iterator()]
+                _index = InvertedIndex(documents)
+    return _index
+
+
+def reset_search_index():
+    global _index
+    _index = None
+
+
+def search_catalog(text, types=SEARCHABLE, limit=20, offset=0):
+    """Ranked countries, cities and trips matching `text`, as {'type', 'id', 'name', 'rank'} dicts."""
+    if not uses_postgres():
+        return get_search_index().search(text, types)[offset:offset + limit]
+
+    query = SearchQuery(text, search_type='websearch', config=settings.SEARCH_CONFIG)
+    results = []
+    for kind in types:
+        model, name_field, _ = SEARCHABLE[kind]
+        rows = (model.objects.filter(search_vector=query)
+                .annotate(rank=SearchRank(F('search_vector'), query))
+                .order_by('-rank', 'pk')
+                .values_list('pk', name_field, 'rank')[:offset + limit])
+        results += [{'type': kind, 'id': pk, 'name': name, 'rank': rank} for pk, name, rank in rows]
+    results.sort(key=lambda result: (-result['rank'], result['type'], result['id']))
+    return results[offset:offset + limit]
@@ -1,8 +1,10 @@
+from datetime import date
+
 from rest_framework import serializers
 
 from TravellinoCappuchino import settings
 from .models import Country, City, Trip, Accommodation, Flight, VisitedCountry
-from .models import Country, City, Trip, Accommodation, Flight, SavedTrip
+from .models import Country, City, Trip, Accommodation, Flight, SavedTrip, CatalogImport, PriceWatch
 from .utils import generate_google_maps_link_city, generate_google_maps_link_country, generate_google_maps_embed_city, generate_google_maps_embed_country
 
 
@@ -57,3 +59,39 @@ class SavedTripSerializer(serializers.ModelSerializer):
     class Meta:
         model = SavedTrip
         fields = ['city', 'tripPlan']
+
+
+class CatalogImportSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = CatalogImport
+        fields = ['id', 'status', 'countries_created', 'cities_created', 'cities_to_geocode', 'cities_geocoded',
+                  'geocoding_failed', 'errors', 'created_at', 'finished_at']
+
+
+class PriceWatchSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = PriceWatch
+        fields = ['id', 'origin', 'destination', 'departure_date', 'return_date', 'max_price', 'is_active',
+                  'last_price', 'last_checked_at', 'notified_price', 'notified_at', 'created_at']
+        read_only_fields = ['last_price', 'last_checked_at', 'notified_price', 'notified_at', 'created_at']
+
+    def validate_origin(self, value):
+        return self.validate_iata(value)
+
+    def validate_destination(self, value):
+        return self.validate_iata(value)
+
+    def validate_iata(self, value):
+        value = value.strip().upper()
+        if len(value) != 3 or not value.isalpha():
+            raise serializers.ValidationError("Must be a 3-letter IATA code.")
+        return value
+
+    def validate(self, data):
+        departure_date = data.get('departure_date', getattr(self.instance, 'departure_date', None))
+        return_date = data.get('return_date', getattr(self.instance, 'return_date', None))
+        if departure_date and departure_date < date.today():
+            raise serializers.ValidationError({'departure_date': "Must not be in the past."})
+        if return_date and departure_date and return_date < departure_date:
+            raise serializers.ValidationError({'return_date': "Must not be before the departure date."})
+        return data
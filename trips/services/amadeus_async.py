@@ -0,0 +1,68 @@
+import asyncio
+
+from asgiref.sync import sync_to_async
+
+from .amadeus_client import gateway, get_amadeus, get_token_store, token_is_fresh, token_from_response, TOKEN_PATH
+from .http import get_json, post_form, UpstreamError
+
+
+class AsyncAmadeus:
+    """Minimal async Amadeus REST client running on the shared pooled session.
+
+    It uses the same shared token store as the SDK client, so sync and async workers reuse one token.
+    """
+
+    def __init__(self, client_id, client_secret, host):
+        self.client_id = client_id
+        self.client_secret = client_secret
+        self.base_url = f"https://{host}"
+        self.token_store = get_token_store(client_id, host)
+        self.token = None
+        self._token_lock = None
+
+    async def _bearer_token(self):
+        if self._token_lock is None:
+            self._token_lock = asyncio.Lock()
+        async with self._token_lock:
+            if not token_is_fresh(self.token):
+                token = await sync_to_async(self.token_store.load, thread_sensitive=False)()
+                if not token_is_fresh(token):
+                    # no cross-worker lock here; at worst two workers refresh at the same moment
+                    data = await post_form(f"{self.base_url}{TOKEN_PATH}", {
+                        'grant_type': 'client_credentials',
+                        'client_id': self.client_id,
+                        'client_secret': self.client_secret,
+                    })
+                    token = token_from_response(data)
+                    await sync_to_async(self.token_store.save, thread_sensitive=False)(token)
+                self.token = token
+        return f"Bearer {self.token['access_token']}"
+
+    async def get(self, path, **params):
+        """GET `path` through the gateway (coalescing and the endpoint's rate limit)."""
+        return await gateway.request_async(path, self._get, path, **params)
+
+    async def _get(self, path, **params):
+        params = {
+            key: ','.join(map(str, value)) if isinstance(value, (list, tuple)) else value
+            for key, value in params.items()
+        }
+        headers = {'Authorization': await self._bearer_token()}
+        try:
+            return (await get_json(f"{self.base_url}{path}", params=params, headers=headers)).get('data')
+        except UpstreamError as e:
+            if e.status == 401:
+                self.token = None
+            raise
+
+
+_client = None
+
+
+def get_async_amadeus():
+    """The async client for the same credentials as `get_amadeus()`, built on first use."""
+    global _client
+    if _client is None:
+        client = get_amadeus()
+        _client = AsyncAmadeus(client.client_id, client.client_secret, client.host)
+    return _client
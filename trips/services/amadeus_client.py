@@ -1,8 +1,436 @@
-from amadeus import Client
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+import weakref
+from concurrent.futures import Future
+from contextlib import contextmanager
+from functools import partial
+
+from asgiref.sync import sync_to_async
 
 from TravellinoCappuchino import settings
+from ..cache import get_redis
+from .http import UpstreamError
+
+try:
+    import fcntl
+except ImportError:  # Windows: the token file is still shared, just without the refresh lock
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+TOKEN_PATH = '/v1/security/oauth2/token'
+
+# amadeus.Location.ANY, without importing the SDK
+ANY_LOCATION = 'AIRPORT,CITY'
+
+
+def __getattr__(name):
+    # the SDK's exceptions (`except amadeus_client.ResponseError`), importing it on first use only
+    if name in ('ResponseError', 'ClientError', 'ServerError', 'NetworkError', 'AuthenticationError',
+                'NotFoundError', 'ParserError'):
+        import amadeus
+        return getattr(amadeus, name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def token_is_fresh(token):
+    return bool(token) and time.time() + settings.AMADEUS_TOKEN_REFRESH_MARGIN < token['expires_at']
+
+
+def token_from_response(data):
+    return {'access_token': data['access_token'], 'expires_at': time.time() + data.get('expires_in', 0)}
+
+
+class RedisTokenStore:
+    def __init__(self, redis_client, key):
+        self.redis = redis_client
+        self.key = key
+
+    def load(self):
+        try:
+            data = self.redis.get(self.key)
+        except Exception as e:
+            logger.warning("Could not read the shared Amadeus token: %s", e)
+            return None
+        return json.loads(data) if data else None
+
+    def save(self, token):
+        ttl = int(token['expires_at'] - time.time())
+        if ttl <= 0:
+            return
+        try:
+            self.redis.set(self.key, json.dumps(token), ex=ttl)
+        except Exception as e:
+            logger.warning("Could not share the Amadeus token: %s", e)
+
+    @contextmanager
+    def lock(self):
+        lock = self.redis.lock(f"{self.key}:lock", timeout=30, blocking_timeout=15)
+        try:
+            acquired = lock.acquire()
+        except Exception as e:
+            logger.warning("Could not lock the shared Amadeus token: %s", e)
+            acquired = False
+        try:
+            yield
+        finally:
+            if acquired:
+                try:
+                    lock.release()
+                except Exception:
+                    pass
+
+
+class FileTokenStore:
+    """The token in a JSON file (readable by its owner only), refreshed under an exclusive file lock."""
+
+    def __init__(self, path):
+        self.path = path
+
+    def load(self):
+        try:
+            with open(self.path) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def save(self, token):
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        try:
+            with os.fdopen(os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600), 'w') as f:
+                json.dump(token, f)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            logger.warning("Could not share the Amadeus token: %s", e)
+
+    @contextmanager
+    def lock(self):
+        if fcntl is None:
+            yield
+            return
+        with open(f"{self.path}.lock", 'a') as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def get_token_store(client_id, host):
+    """Where every worker looks for the current access token of these credentials: Redis, else a file."""
+    name = hashlib.sha1(f"{client_id}@{host}".encode()).hexdigest()[:16]
+    redis_client = get_redis()
+    if redis_client is not None:
+        return RedisTokenStore(redis_client, f"amadeus:token:{name}")
+    return FileTokenStore(os.path.join(settings.AMADEUS_TOKEN_DIR, f"amadeus-token-{name}.json"))
+
+
+def shared_token(store, fetch):
+    token = store.load()
+    if token_is_fresh(token):
+        return token
+    with store.lock():
+        # another worker may have refreshed it while we waited for the lock
+        token = store.load()
+        if not token_is_fresh(token):
+            token = fetch()
+            store.save(token)
+    return token
+
+
+class SharedAccessToken:
+    """Stands in for the SDK's AccessToken so all workers reuse one token, refreshed shortly before expiry."""
+
+    def __init__(self, client, store):
+        self.client = client
+        self.store = store
+        self._token = None
+        self._lock = threading.Lock()
+
+    def _bearer_token(self):
+        return f"Bearer {self.token()}"
+
+    def token(self):
+        if not token_is_fresh(self._token):
+            with self._lock:
+                if not token_is_fresh(self._token):
+                    self._token = shared_token(self.store, self.fetch)
+        return self._token['access_token']
+
+    def fetch(self):
+        response = self.client._unauthenticated_request('POST', TOKEN_PATH, {
+            'grant_type': 'client_credentials',
+            'client_id': self.client.client_id,
+            'client_secret': self.client.client_secret,
+        })
+        return token_from_response(response.result)
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_amadeus():
+    """The process-wide Amadeus SDK client, built on first use.
+
+    Credentials come from AMADEUS_API_KEY/AMADEUS_API_SECRET, or the SDK's own AMADEUS_CLIENT_ID/
+    AMADEUS_CLIENT_SECRET environment variables. The SDK calls urlopen without a timeout, so it is
+    given one that gives up after UPSTREAM_TIMEOUT seconds.
+    """
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                from urllib.request import urlopen
+                from amadeus import Client
+
+                options = {'http': partial(urlopen, timeout=settings.UPSTREAM_TIMEOUT)}
+                if settings.AMADEUS_API_KEY:
+                    options['client_id'] = settings.AMADEUS_API_KEY
+                if settings.AMADEUS_API_SECRET:
+                    options['client_secret'] = settings.AMADEUS_API_SECRET
+                client = Client(**options)
+                client.access_token = SharedAccessToken(client, get_token_store(client.client_id, client.host))
+                _client = client
+    return _client
+
+
+# endpoint names, used to pick the rate limit and to label the metrics
+FLIGHT_OFFERS = '/v2/shopping/flight-offers'
+HOTEL_OFFERS = '/v3/shopping/hotel-offers'
+HOTELS_BY_CITY = '/v1/reference-data/locations/hotels/by-city'
+LOCATIONS = '/v1/reference-data/locations'
+PRICE_METRICS = '/v1/analytics/itinerary-price-metrics'
+TRIP_PURPOSE = '/v1/travel/predictions/trip-purpose'
+
+
+class RateLimited(UpstreamError):
+    """The endpoint's token bucket could not serve the call within AMADEUS_MAX_QUEUE_WAIT."""
+
+    def __init__(self, endpoint):
+        super().__init__(429, f"Too many requests to {endpoint}, try again shortly")
+
+
+class TokenBucket:
+    """Process-local token bucket. `reserve()` takes a token and says how long to sleep before using it."""
+
+    shared = False
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self, max_wait):
+        """Seconds to wait before the call may go out, or None (nothing reserved) if over `max_wait`."""
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            # tokens may go negative: later callers queue up behind the ones already waiting
+            wait = max(0.0, (1 - self.tokens) / self.rate)
+            if wait > max_wait:
+                return None
+            self.tokens -= 1
+            return wait
+
+
+# same algorithm as TokenBucket, on Redis' clock so every worker draws from one bucket
+RESERVE_SCRIPT = """
+local rate = tonumber(ARGV[1])
+local burst = tonumber(ARGV[2])
+local max_wait = tonumber(ARGV[3])
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'updated')
+local tokens = tonumber(state[1]) or burst
+local updated = tonumber(state[2]) or now
+tokens = math.min(burst, tokens + math.max(0, now - updated) * rate)
+local wait = math.max(0, (1 - tokens) / rate)
+if wait > max_wait then
+    return -1
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens - 1), 'updated', tostring(now))
+redis.call('EXPIRE', KEYS[1], math.ceil((burst + max_wait * rate) / rate) + 1)
+return tostring(wait)
+"""
+
+
+class RedisTokenBucket(TokenBucket):
+    """Token bucket shared by all workers through Redis; falls back to the local bucket if Redis fails."""
+
+    shared = True
+
+    def __init__(self, key, rate, burst, redis_client):
+        super().__init__(rate, burst)
+        self.key = key
+        self.script = redis_client.register_script(RESERVE_SCRIPT)
+
+    def reserve(self, max_wait):
+        try:
+            wait = float(self.script(keys=[self.key], args=[self.rate, self.burst, max_wait]))
+        except Exception as e:
+            logger.warning("Shared rate limit unavailable, limiting per process: %s", e)
+            return super().reserve(max_wait)
+        return None if wait < 0 else wait
+
+
+class EndpointStats:
+    def __init__(self):
+        self.calls = 0
+        self.coalesced = 0
+        self.throttled = 0
+        self.rejected = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+
+    def as_dict(self):
+        return {
+            'calls': self.calls,
+            'coalesced': self.coalesced,
+            'throttled': self.throttled,
+            'rejected': self.rejected,
+            'avg_queue_wait_ms': round(1000 * self.wait_total / self.calls, 1) if self.calls else 0.0,
+            'max_queue_wait_ms': round(1000 * self.wait_max, 1),
+        }
+
+
+class AmadeusGateway:
+    """Every Amadeus call goes through here.
+
+    Identical calls already in flight are coalesced into one upstream request (single flight),
+    and each endpoint has a token bucket (shared through Redis when AMADEUS_SHARED_RATE_LIMIT is
+    on) so bursts queue briefly on our side instead of coming back as 429s.
+    """
+
+    def __init__(self):
+        self._buckets = {}
+        self._stats = {}
+        self._lock = threading.Lock()
+        self._in_flight = {}
+        self._async_in_flight = weakref.WeakKeyDictionary()
+
+    def bucket(self, endpoint):
+        bucket = self._buckets.get(endpoint)
+        if bucket is None:
+            with self._lock:
+                bucket = self._buckets.get(endpoint)
+                if bucket is None:
+                    rate = settings.AMADEUS_ENDPOINT_RATE_LIMITS.get(endpoint, settings.AMADEUS_RATE_LIMIT)
+                    burst = settings.AMADEUS_RATE_LIMIT_BURST
+                    redis_client = get_redis() if settings.AMADEUS_SHARED_RATE_LIMIT else None
+                    if redis_client is not None:
+                        bucket = RedisTokenBucket(f"amadeus:bucket:{endpoint}", rate, burst, redis_client)
+                    else:
+                        bucket = TokenBucket(rate, burst)
+                    self._buckets[endpoint] = bucket
+        return bucket
+
+    def stats_for(self, endpoint):
+        stats = self._stats.get(endpoint)
+        if stats is None:
+            stats = self._stats.setdefault(endpoint, EndpointStats())
+        return stats
+
+    def record(self, endpoint, wait):
+        with self._lock:
+            stats = self.stats_for(endpoint)
+            if wait is None:
+                stats.rejected += 1
+                return
+            stats.calls += 1
+            stats.wait_total += wait
+            stats.wait_max = max(stats.wait_max, wait)
+            if wait:
+                stats.throttled += 1
+
+    def record_coalesced(self, endpoint):
+        with self._lock:
+            self.stats_for(endpoint).coalesced += 1
+
+    @staticmethod
+    def call_key(endpoint, args, params):
+        payload = json.dumps([endpoint, args, params], sort_keys=True, default=str)
+        return hashlib.sha1(payload.encode()).hexdigest()
+
+    def request(self, endpoint, call, *args, **params):
+        """Run `call(*args, **params)` (e.g. an SDK `.get`) for `endpoint` and return its result."""
+        key = self.call_key(endpoint, args, params)
+        with self._lock:
+            future = self._in_flight.get(key)
+            leader = future is None
+            if leader:
+                future = self._in_flight[key] = Future()
+        if not leader:
+            self.record_coalesced(endpoint)
+            return future.result()
+
+        try:
+            wait = self.bucket(endpoint).reserve(settings.AMADEUS_MAX_QUEUE_WAIT)
+            self.record(endpoint, wait)
+            if wait is None:
+                raise RateLimited(endpoint)
+            if wait:
+                time.sleep(wait)
+            result = call(*args, **params)
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            with self._lock:
+                del self._in_flight[key]
+
+    async def request_async(self, endpoint, call, *args, **params):
+        """Async `request` for coroutine functions such as `AsyncAmadeus.get`.
+
+        The upstream call runs in a task of its own that every caller awaits through asyncio.shield,
+        so a caller that goes away (a cancelled request) does not cancel it for the others.
+        """
+        loop = asyncio.get_running_loop()
+        in_flight = self._async_in_flight.setdefault(loop, {})
+        key = self.call_key(endpoint, args, params)
+        task = in_flight.get(key)
+        if task is not None:
+            self.record_coalesced(endpoint)
+            return await asyncio.shield(task)
+
+        task = in_flight[key] = loop.create_task(self.call_async(endpoint, call, *args, **params))
+
+        def done(finished):
+            if in_flight.get(key) is finished:
+                del in_flight[key]
+            # mark the exception as retrieved even when no caller is left waiting for it
+            finished.cancelled() or finished.exception()
+
+        task.add_done_callback(done)
+        return await asyncio.shield(task)
+
+    async def call_async(self, endpoint, call, *args, **params):
+        bucket = self.bucket(endpoint)
+        if bucket.shared:
+            wait = await sync_to_async(bucket.reserve, thread_sensitive=False)(settings.AMADEUS_MAX_QUEUE_WAIT)
+        else:
+            wait = bucket.reserve(settings.AMADEUS_MAX_QUEUE_WAIT)
+        self.record(endpoint, wait)
+        if wait is None:
+            raise RateLimited(endpoint)
+        if wait:
+            await asyncio.sleep(wait)
+        return await call(*args, **params)
+
+    def stats(self):
+        with self._lock:
+            return {endpoint: stats.as_dict() for endpoint, stats in sorted(self._stats.items())}
+
 
-amadeus = Client(
-    client_id=settings.AMADEUS_API_KEY,
-    client_secret=settings.AMADEUS_API_SECRET
-)
+gateway = AmadeusGateway()
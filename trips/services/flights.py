@@ -0,0 +1,83 @@
+"""Amadeus flight offer search, shared by the flight views and the price watch scheduler.
+
+Searches are normalized and cached in `flight_search_cache`, so the same route searched from a
+view or by `run_price_watches` costs one upstream call.
+"""
+from ..cache import flight_search_cache
+from ..flight import Flight
+from ..price_history import record_flight_search
+from .amadeus_client import get_amadeus, gateway, FLIGHT_OFFERS
+
+
+def generate_booking_link(airline, origin, destination, date):
+    AIRLINE_LINKS = {
+        "IB": "https://www.iberia.com/flights/?origin={o}&destination={d}&departureDate={date}",
+        "LH": "https://www.lufthansa.com/fl/en/flight-search?origin={o}&destination={d}&departureDate={date}",
+        "KL": "https://www.klm.com/travel/ua_en/plan_and_book/book_a_flight/index.htm?origin={o}&destination={d}&departureDate={date}",
+        "AF": "https://wwws.airfrance.com.ua/search?origin={o}&destination={d}&outboundDate={date}",
+    }
+    if airline in AIRLINE_LINKS:
+        return AIRLINE_LINKS[airline].format(
+            o=origin,
+            d=destination,
+            date=date
+        )
+    return f"https://www.kayak.com/flights/{origin}-{destination}/{date}?sort=bestflight_a"
+
+
+def normalize_flight_search(kwargs):
+    missing = [key for key in ('originLocationCode', 'destinationLocationCode', 'departureDate') if not kwargs.get(key)]
+    if missing:
+        # str(None) would otherwise become a 'NONE' airport code in the cache key
+        raise ValueError(f"Missing search parameters: {', '.join(missing)}")
+    params = {
+        'originLocationCode': str(kwargs['originLocationCode']).strip().upper(),
+        'destinationLocationCode': str(kwargs['destinationLocationCode']).strip().upper(),
+        'departureDate': str(kwargs['departureDate']).strip(),
+        'adults': int(kwargs.get('adults') or 1),
+    }
+    if kwargs.get('returnDate'):
+        params['returnDate'] = str(kwargs['returnDate']).strip()
+    for key, value in kwargs.items():
+        params.setdefault(key, value)
+    return params
+
+
+def get_flight_offers(**kwargs):
+    params = normalize_flight_search(kwargs)
+    return flight_search_cache.get_or_set(params, lambda: search_flight_offers(**params))
+
+
+def search_flight_offers(**kwargs):
+    search_flights = gateway.request(FLIGHT_OFFERS, get_amadeus().shopping.flight_offers_search.get, **kwargs)
+    record_flight_search(kwargs, search_flights.data)
+    return construct_flight_offers(search_flights.data)
+
+
+def construct_flight_offers(data):
+    flight_offers = []
+    for flight in data:
+        offer = Flight(flight).construct_flights()
+        try:
+            first_segment = flight["itineraries"][0]["segments"][0]
+            last_segment = flight["itineraries"][0]["segments"][-1]
+
+            airline = first_segment["carrierCode"]
+            origin = first_segment["departure"]["iataCode"]
+            final_destination = last_segment["arrival"]["iataCode"]
+
+            date = first_segment["departure"]["at"].split("T")[0]
+
+            offer["bookingLink"] = generate_booking_link(
+                airline,
+                origin,
+                final_destination,
+                date
+            )
+
+        except Exception as e:
+            print("Could not generate booking link:", e)
+            offer["bookingLink"] = None
+
+        flight_offers.append(offer)
+    return flight_offers
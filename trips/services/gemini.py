@@ -0,0 +1,46 @@
+"""Gemini access for the trip planner. google.genai is imported when the first plan is generated."""
+import threading
+
+_client = None
+_client_lock = threading.Lock()
+
+
+class GeminiError(Exception):
+    """Gemini could not be set up or rejected the request."""
+
+
+def get_client():
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                from google import genai
+
+                try:
+                    _client = genai.Client()
+                except Exception as e:
+                    raise GeminiError(f"Gemini Client wasn't initialized: {e}") from e
+    return _client
+
+
+def generate(model, prompt):
+    from google.genai.errors import APIError
+
+    client = get_client()
+    try:
+        return client.models.generate_content(model=model, contents=prompt).text
+    except APIError as e:
+        raise GeminiError(str(e)) from e
+
+
+def generate_stream(model, prompt):
+    """Yield the response text chunk by chunk as Gemini produces it."""
+    from google.genai.errors import APIError
+
+    client = get_client()
+    try:
+        for chunk in client.models.generate_content_stream(model=model, contents=prompt):
+            if chunk.text:
+                yield chunk.text
+    except APIError as e:
+        raise GeminiError(str(e)) from e
@@ -0,0 +1,60 @@
+import asyncio
+import weakref
+
+from TravellinoCappuchino import settings
+
+# One pooled keep-alive session per event loop (an ASGI worker runs a single loop).
+_sessions = weakref.WeakKeyDictionary()
+
+
+class UpstreamError(Exception):
+    def __init__(self, status, body):
+        super().__init__(f"Upstream responded with {status}")
+        self.status = status
+        self.body = body
+
+
+def get_session():
+    loop = asyncio.get_running_loop()
+    session = _sessions.get(loop)
+    if session is None or session.closed:
+        # imported here so that loading the URLconf under WSGI does not pull in aiohttp
+        import aiohttp
+
+        connector = aiohttp.TCPConnector(
+            limit=settings.UPSTREAM_POOL_SIZE,
+            limit_per_host=settings.UPSTREAM_POOL_PER_HOST,
+            keepalive_timeout=settings.UPSTREAM_KEEPALIVE,
+            ttl_dns_cache=300,
+        )
+        session = aiohttp.ClientSession(
+            connector=connector,
+            timeout=aiohttp.ClientTimeout(
+                total=settings.UPSTREAM_TIMEOUT,
+                connect=settings.UPSTREAM_CONNECT_TIMEOUT,
+            ),
+        )
+        _sessions[loop] = session
+    return session
+
+
+async def request_json(method, url, **kwargs):
+    session = get_session()
+    async with session.request(method, url, **kwargs) as response:
+        body = await response.json(content_type=None)
+        if response.status >= 400:
+            raise UpstreamError(response.status, body)
+        return body
+
+
+async def get_json(url, params=None, headers=None, timeout=None):
+    import aiohttp
+
+    kwargs = {'params': params, 'headers': headers}
+    if timeout is not None:
+        kwargs['timeout'] = aiohttp.ClientTimeout(total=timeout)
+    return await request_json('GET', url, **kwargs)
+
+
+async def post_form(url, data, headers=None):
+    return await request_json('POST', url, data=data, headers=headers)
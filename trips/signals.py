@@ -0,0 +1,50 @@
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from .airports import reset_airport_index
+from .catalog_cache import bump_catalog_version
+from .models import Airport, City, Country, CachedTripPlan, Trip
+from .search import SEARCHABLE, update_search_vectors, reset_search_index
+
+
+@receiver([post_save, post_delete], sender=Airport)
+def airport_changed(sender, **kwargs):
+    reset_airport_index()
+
+
+@receiver(post_save, sender=City)
+def city_saved(sender, instance, created, **kwargs):
+    # cached trip plans embed the city's description in their prompt
+    if not created:
+        CachedTripPlan.objects.filter(city=instance).delete()
+
+
+@receiver(post_save, sender=Country)
+def country_saved(sender, instance, created, **kwargs):
+    if not created:
+        CachedTripPlan.objects.filter(city__country=instance).delete()
+
+
+@receiver([post_save, post_delete], sender=Country)
+@receiver([post_save, post_delete], sender=City)
+def catalog_changed(sender, **kwargs):
+    # bumped before the commit, a concurrent request could cache the old rows under the new version
+    transaction.on_commit(bump_catalog_version)
+
+
+@receiver(post_save, sender=Country)
+@receiver(post_save, sender=City)
+@receiver(post_save, sender=Trip)
+def searchable_saved(sender, instance, update_fields=None, **kwargs):
+    _, name_field, text_field = next(spec for spec in SEARCHABLE.values() if spec[0] is sender)
+    if update_fields is None or {name_field, text_field} & set(update_fields):
+        update_search_vectors(sender, pk=instance.pk)
+        reset_search_index()
+
+
+@receiver(post_delete, sender=Country)
+@receiver(post_delete, sender=City)
+@receiver(post_delete, sender=Trip)
+def searchable_deleted(sender, **kwargs):
+    reset_search_index()
@@ -1,3 +1,1021 @@
+import json
+import math
+import os
+import asyncio
+import base64
+import io
+import random
+import tempfile
+import threading
+import time
+from datetime import date, timedelta
+from unittest import mock, skipUnless
+
+from django.core.management import call_command
 from django.test import TestCase
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from TravellinoCappuchino import settings
+from users.models import CustomUser, OutboxEmail
+
+from .airports import AirportIndex, reset_airport_index
+from .cache import flight_search_cache
+from .catalog_cache import catalog_cache
+from .catalog_import import read_records, import_catalog, geocode_import
+from .geocoding import OfflineGeocoder, reverse_geocode_many
+from .kdtree import KDTree, EARTH_RADIUS_KM
+from .nearby import bounding_box, nearby_cities
+from .models import (Airport, Country, City, CachedTripPlan, ReverseGeocode, CatalogImport, Trip, PriceObservation,
+                     PriceDailyRollup, PriceWatch, PriceWatchCycle)
+from .plan_cache import canonical_budget, canonical_preferences
+from .price_history import (flight_observations, hotel_observations, write_batch, price_trend, prune_price_history,
+                            PriceRecorder)
+from .price_stats import QuantileSketch, summarize
+from .price_watch import run_cycle, should_alert
+from .search import reset_search_index
+from .services.amadeus_client import (AmadeusGateway, TokenBucket, RedisTokenBucket, RateLimited, RESERVE_SCRIPT,
+                                      FileTokenStore, RedisTokenStore, SharedAccessToken, shared_token)
+from .services.gemini import GeminiError
+from .views import search_hotel_offer_chunks, build_price_metrics, build_hotel_offers
+from .services.flights import normalize_flight_search, get_flight_offers
+
+
+class FlightSearchTests(TestCase):
+    def setUp(self):
+        flight_search_cache._local.clear()
+
+    def test_missing_airport_is_rejected(self):
+        with self.assertRaises(ValueError):
+            normalize_flight_search({'originLocationCode': None, 'destinationLocationCode': 'CDG',
+                                     'departureDate': '2030-01-01'})
+
+    def test_search_is_normalized(self):
+        params = normalize_flight_search({'originLocationCode': ' ist', 'destinationLocationCode': 'cdg',
+                                          'departureDate': '2030-01-01 '})
+        self.assertEqual(params, {'originLocationCode': 'IST', 'destinationLocationCode': 'CDG',
+                                  'departureDate': '2030-01-01', 'adults': 1})
+
+    @mock.patch('trips.services.flights.search_flight_offers')
+    def test_equivalent_searches_share_one_upstream_call(self, search):
+        search.return_value = [{'price': '150.00'}]
+
+        first = get_flight_offers(originLocationCode='ist', destinationLocationCode='CDG',
+                                  departureDate='2030-01-01')
+        second = get_flight_offers(originLocationCode='IST ', destinationLocationCode='cdg',
+                                   departureDate='2030-01-01', adults='1')
+
+        self.assertEqual(first, second)
+        self.assertEqual(search.call_count, 1)
+
+
+class AirportIndexTests(TestCase):
+    def setUp(self):
+        self.index = AirportIndex([
+            {'name': 'CHARLES DE GAULLE', 'iataCode': 'CDG', 'cityName': 'Paris', 'subType': 'AIRPORT'},
+            {'name': 'PARIS', 'iataCode': 'PAR', 'cityName': 'Paris', 'subType': 'CITY'},
+            {'name': 'ORLY', 'iataCode': 'ORY', 'cityName': 'Paris', 'subType': 'AIRPORT'},
+            {'name': 'SAO PAULO GUARULHOS', 'iataCode': 'GRU', 'cityName': 'São Paulo', 'subType': 'AIRPORT'},
+        ])
+
+    def test_city_comes_before_its_airports(self):
+        self.assertEqual([location['iataCode'] for location in self.index.search('paris')], ['PAR', 'CDG', 'ORY'])
+
+    def test_exact_code_comes_first(self):
+        self.assertEqual(self.index.search('ory')[0]['iataCode'], 'ORY')
+
+    def test_any_word_and_accents_match(self):
+        self.assertEqual([location['iataCode'] for location in self.index.search('gaul')], ['CDG'])
+        self.assertEqual([location['iataCode'] for location in self.index.search('São')], ['GRU'])
+        self.assertEqual(self.index.search('  '), [])
+
+    @mock.patch('trips.views.gateway.request')
+    def test_autocomplete_is_served_locally(self, upstream):
+        reset_airport_index()
+        Airport.objects.create(iata_code='CDG', name='Charles de Gaulle', city_name='Paris')
+
+        response = self.client.get('/trips/origin_airport_search/?term=char')
+
+        self.assertEqual(response.json(), ['CHARLES DE GAULLE (CDG)'])
+        upstream.assert_not_called()
+        reset_airport_index()
+
+
+def create_city(name='Paris', country='France', **fields):
+    country, _ = Country.objects.get_or_create(name=country)
+    fields.setdefault('latitude', 48.85)
+    fields.setdefault('longitude', 2.35)
+    return City.objects.create(country=country, name=name, **fields)
+
+
+class TripPlanStreamTests(TestCase):
+    def setUp(self):
+        self.city = create_city()
+        self.client = APIClient()
+
+    def events(self, response):
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        return b''.join(response.streaming_content).decode()
+
+    @mock.patch('trips.views.generate_stream', return_value=iter(['Day 1. ', 'Day 2.']))
+    def test_chunks_are_sent_as_events(self, generate_stream):
+        response = self.client.post('/trips/generate_city/', {'city_id': self.city.pk, 'stream': True},
+                                    format='json')
+
+        self.assertEqual(self.events(response),
+                         'data: {"text": "Day 1. "}\n\n'
+                         'data: {"text": "Day 2."}\n\n'
+                         'event: done\ndata: {}\n\n')
+
+    @mock.patch('trips.views.generate_stream')
+    def test_failure_mid_stream_ends_with_an_error_event(self, generate_stream):
+        def chunks(model, prompt):
+            yield 'Day 1. '
+            raise GeminiError('quota')
+        generate_stream.side_effect = chunks
+
+        response = self.client.post('/trips/generate_city/?stream=1', {'city_id': self.city.pk}, format='json')
+
+        self.assertEqual(self.events(response),
+                         'data: {"text": "Day 1. "}\n\n'
+                         'event: error\ndata: {"error": "Couldn\'t generate: quota"}\n\n')
+
+    def test_missing_city_is_not_streamed(self):
+        response = self.client.post('/trips/generate_city/', {'city_id': 999999, 'stream': True}, format='json')
+
+        self.assertEqual(response.status_code, 404)
+
+
+class TripPlanCacheTests(TestCase):
+    def setUp(self):
+        self.city = create_city()
+        self.client = APIClient()
+
+    def test_budget_buckets(self):
+        self.assertEqual(canonical_budget('1,049 USD'), '1000 usd')
+        self.assertEqual(canonical_budget('1.000'), '1000')
+        self.assertEqual(canonical_budget('50'), '50')
+        self.assertEqual(canonical_budget('cheap'), 'cheap')
+
+    def test_equivalent_preferences_share_a_key(self):
+        self.assertEqual(canonical_preferences(days='3', month='Jul', budget='1,020 usd', style=' Relaxed '),
+                         canonical_preferences(days=3, month='july', budget='1000 USD', style='relaxed'))
+
+    @mock.patch('trips.views.generate', return_value='Plan')
+    def test_equivalent_requests_generate_once(self, generate):
+        first = self.client.post('/trips/generate_city/',
+                                 {'city_id': self.city.pk, 'month': 'Jul', 'budget': '1,020 usd'}, format='json')
+        second = self.client.post('/trips/generate_city/',
+                                  {'city_id': self.city.pk, 'month': 'july', 'budget': '1000 USD'}, format='json')
+
+        self.assertEqual((first.data, second.data), ({'trip': 'Plan'}, {'trip': 'Plan'}))
+        self.assertEqual(generate.call_count, 1)
+        # the prompt carries the user's own wording, not the cache key's
+        self.assertIn('- Budget: 1,020 usd', generate.call_args.args[1])
+        self.assertEqual(CachedTripPlan.objects.get().hits, 1)
+
+    @mock.patch('trips.views.generate_stream', return_value=iter(['Day 1. ', 'Day 2.']))
+    def test_streamed_plan_is_cached(self, generate_stream):
+        response = self.client.post('/trips/generate_city/', {'city_id': self.city.pk, 'stream': True},
+                                    format='json')
+        b''.join(response.streaming_content)
+
+        with mock.patch('trips.views.generate') as generate:
+            response = self.client.post('/trips/generate_city/', {'city_id': self.city.pk}, format='json')
+
+        generate.assert_not_called()
+        self.assertEqual(response.data, {'trip': 'Day 1. Day 2.'})
+
+
+def hotel_offer(hotel_id, price):
+    return {'hotel': {'hotelId': hotel_id, 'name': f'Hotel {hotel_id}', 'cityCode': 'PAR'},
+            'offers': [{'id': f'offer-{hotel_id}', 'price': {'total': str(price), 'currency': 'EUR'}}]}
+
+
+def fake_hotel_offers(hotel_ids, params):
+    if 'SLOW' in hotel_ids:
+        time.sleep(0.5)
+    if 'BAD' in hotel_ids:
+        raise RuntimeError('upstream error')
+    return [hotel_offer(hotel_id, 100 + index) for index, hotel_id in enumerate(hotel_ids)]
+
+
+@mock.patch.object(settings, 'HOTEL_OFFERS_CHUNK_TIMEOUT', 0.2)
+@mock.patch('trips.views.fetch_hotel_offers', side_effect=fake_hotel_offers)
+class HotelChunkTests(TestCase):
+    def test_each_chunk_is_answered_or_reported(self, fetch):
+        results = search_hotel_offer_chunks([['H1', 'H2'], ['BAD'], ['SLOW'], ['H3']], {})
+
+        self.assertEqual(len(results[0]), 2)
+        self.assertIsInstance(results[1], RuntimeError)
+        self.assertIsInstance(results[2], TimeoutError)
+        self.assertEqual(len(results[3]), 1)
+
+    def test_slow_chunk_does_not_use_up_the_next_waves_time(self, fetch):
+        with mock.patch.object(settings, 'HOTEL_OFFERS_MAX_WORKERS', 2):
+            results = search_hotel_offer_chunks([['SLOW'], ['H1'], ['H2']], {})
+
+        self.assertIsInstance(results[0], TimeoutError)
+        self.assertEqual([len(result) for result in results[1:]], [1, 1])
+
+    @mock.patch.object(settings, 'HOTEL_OFFERS_CHUNK_SIZE', 2)
+    @mock.patch('trips.views.get_amadeus')
+    @mock.patch('trips.views.gateway.request')
+    def test_partial_results_list_the_failed_chunks(self, hotels, get_amadeus, fetch):
+        hotels.return_value.data = [{'hotelId': hotel_id} for hotel_id in ('H1', 'H2', 'BAD', 'H3')]
+
+        response = self.client.post('/trips/hotels/', json.dumps(
+            {'cityCode': 'PAR', 'checkInDate': '2030-01-01', 'checkOutDate': '2030-01-03', 'numOfGuests': 1}),
+            content_type='application/json')
+
+        data = response.json()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([hotel['hotelId'] for hotel in data['hotels']], ['H1', 'H2'])
+        self.assertEqual(data['chunks'], 2)
+        self.assertEqual(data['failed_chunks'], [{'chunk': 1, 'hotelIds': ['BAD', 'H3'], 'error': 'upstream error'}])
+        self.assertEqual(data['metrics']['cheapest'], 100.0)
+
+
+def haversine_km(a, b):
+    lat1, lon1, lat2, lon2 = map(math.radians, (*a, *b))
+    h = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(h))
+
+
+class KDTreeTests(TestCase):
+    def test_nearest_matches_a_linear_scan(self):
+        generator = random.Random(9)
+        points = [(generator.uniform(-80, 80), generator.uniform(-180, 180)) for _ in range(500)]
+        tree = KDTree(points, list(range(len(points))))
+
+        for _ in range(50):
+            target = (generator.uniform(-80, 80), generator.uniform(-180, 180))
+            expected = min(range(len(points)), key=lambda i: haversine_km(points[i], target))
+            index, distance = tree.nearest(*target)
+            self.assertEqual(index, expected)
+            self.assertAlmostEqual(distance, haversine_km(points[expected], target), places=6)
+
+    def test_empty_tree(self):
+        self.assertEqual(KDTree([], []).nearest(0, 0), (None, None))
+
+    def test_offline_geocoder_ignores_far_points(self):
+        with tempfile.NamedTemporaryFile('w', suffix='.csv', delete=False) as f:
+            f.write('LAT,LON,STREET,NUMBER\n48.8584,2.2945,Avenue Gustave Eiffel,5\nbad,row,,\n')
+        self.addCleanup(os.remove, f.name)
+        geocoder = OfflineGeocoder(f.name, max_distance_km=0.15)
+
+        self.assertEqual(geocoder.reverse(48.8585, 2.2946), {'street': 'Avenue Gustave Eiffel', 'housenumber': '5'})
+        self.assertIsNone(geocoder.reverse(48.87, 2.29))
+
+
+@mock.patch('trips.geocoding.reverse_geocode_online',
+            side_effect=lambda lat, lon: {'street': f'Street {lat}', 'housenumber': '1'})
+class ReverseGeocodeTests(TestCase):
+    def test_answers_are_cached_by_rounded_coordinates(self, online):
+        address = {'street': 'Street 48.85841', 'housenumber': '1'}
+        self.assertEqual(reverse_geocode_many([(48.85841, 2.29451)]), [address])
+        self.assertEqual(reverse_geocode_many([(48.85839, 2.29449)]), [address])
+
+        self.assertEqual(online.call_count, 1)
+        self.assertEqual(ReverseGeocode.objects.count(), 1)
+
+    def test_online_lookups_are_capped(self, online):
+        address = {'street': 'Street 1.0', 'housenumber': '1'}
+        self.assertEqual(reverse_geocode_many([(1.0, 1.0), (2.0, 2.0), (1.0, 1.0)], max_online=1),
+                         [address, None, address])
+        self.assertEqual(online.call_count, 1)
+
+    @mock.patch.object(settings, 'HOTEL_SEARCH_MAX_ONLINE_GEOCODES', 5)
+    @mock.patch('trips.views.fetch_hotel_offers')
+    @mock.patch('trips.views.get_amadeus')
+    @mock.patch('trips.views.gateway.request')
+    def test_hotel_search_returns_addresses(self, hotels, get_amadeus, fetch, online):
+        hotels.return_value.data = [{'hotelId': 'H1'}, {'hotelId': 'H2'}]
+        first, second = hotel_offer('H1', 100), hotel_offer('H2', 120)
+        first['hotel'].update(latitude=48.8584, longitude=2.2945)
+        fetch.return_value = [first, second]
+
+        response = self.client.post('/trips/hotels/', json.dumps(
+            {'cityCode': 'PAR', 'checkInDate': '2030-01-01', 'checkOutDate': '2030-01-03', 'numOfGuests': 1}),
+            content_type='application/json')
+
+        self.assertEqual([hotel['address'] for hotel in response.json()['hotels']], ['Street 48.8584 1', None])
+
+
+@mock.patch('trips.catalog_import.geocode_place', return_value=(1.0, 2.0))
+class CatalogImportTests(TestCase):
+    def test_bad_rows_are_reported_and_skipped(self, geocode):
+        job = import_catalog(
+            [{'name': 'France', 'latitude': '46.2', 'longitude': '2.2'},
+             {'name': 'Atlantis', 'latitude': 'north'},
+             'not a row'],
+            [{'name': 'Paris', 'country': 'france', 'latitude': '48.8', 'longitude': '2.3'},
+             {'name': 'Lyon', 'country_id': 'abc'},
+             {'name': 'Nice', 'country_id': 999999},
+             {'name': 'Brest', 'country': 'France', 'latitude': 'x'},
+             {'country': 'France'},
+             42],
+        )
+
+        self.assertEqual(job.countries_created, 1)
+        self.assertEqual(job.cities_created, 1)
+        self.assertEqual(list(City.objects.values_list('name', flat=True)), ['Paris'])
+        self.assertEqual(len(job.errors), 7)
+        self.assertTrue(job.errors[0].startswith('Country row 2:'))
+        self.assertTrue(job.errors[-1].startswith('City row 6:'))
+
+    def test_job_geocodes_only_its_own_cities(self, geocode):
+        country = Country.objects.create(name='France')
+        City.objects.bulk_create([City(country=country, name='Older')])
+
+        job = import_catalog((), [{'name': 'Lyon', 'country': 'France'},
+                                  {'name': 'Nice', 'country': 'France', 'latitude': '43.7', 'longitude': '7.3'}])
+        self.assertEqual((job.cities_created, job.cities_to_geocode), (2, 1))
+
+        geocode_import(job)
+
+        geocode.assert_called_once_with('Lyon')
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.cities_geocoded, job.geocoding_failed), ('done', 1, 0))
+        self.assertIsNone(City.objects.get(name='Older').latitude)
+
+    def test_interrupted_job_is_resumed_by_the_command(self, geocode):
+        Country.objects.create(name='France')
+        job = import_catalog((), [{'name': 'Lyon', 'country': 'France'}, {'name': 'Nice', 'country': 'France'}])
+        # the process running the background geocoding exited after one city
+        City.objects.filter(name='Lyon').update(latitude=45.7, longitude=4.8)
+        CatalogImport.objects.filter(pk=job.pk).update(cities_geocoded=1)
+
+        call_command('geocode_cities', '--resume', stdout=io.StringIO())
+
+        geocode.assert_called_once_with('Nice')
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.cities_geocoded), ('done', 2))
+        self.assertIsNotNone(job.finished_at)
+
+    def test_read_records(self, geocode):
+        rows = [{'name': 'France'}, {'name': 'Spain'}]
+        self.assertEqual(read_records(io.StringIO(json.dumps(rows)), 'countries.json'), rows)
+        self.assertEqual(read_records(io.BytesIO(b'{"name": "France"}\n\n{"name": "Spain"}\n'), 'c.jsonl'), rows)
+        self.assertEqual(read_records(io.StringIO('name\nFrance\nSpain\n'), 'countries.csv'), rows)
+        with self.assertRaises(ValueError):
+            read_records(io.StringIO('{"name": "France"}'), 'countries.json')
+
+
+class CatalogCacheTests(TestCase):
+    def setUp(self):
+        catalog_cache._local.clear()
+        self.country = Country.objects.create(name='France', currency='EUR')
+
+    def test_repeat_requests_are_served_from_the_cache(self):
+        first = self.client.get('/countries/')
+
+        with self.assertNumQueries(0):
+            second = self.client.get('/countries/')
+
+        self.assertEqual(first.content, second.content)
+        self.assertEqual(first['ETag'], second['ETag'])
+
+    def test_matching_etag_gets_304(self):
+        etag = self.client.get(f'/countries/{self.country.pk}/')['ETag']
+
+        response = self.client.get(f'/countries/{self.country.pk}/', HTTP_IF_NONE_MATCH=f'W/{etag}')
+
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b'')
+        self.assertEqual(response['ETag'], etag)
+        self.assertEqual(self.client.get(f'/countries/{self.country.pk}/', HTTP_IF_NONE_MATCH='"other"').status_code,
+                         200)
+
+    def test_changes_are_seen_once_committed(self):
+        etag = self.client.get('/countries/')['ETag']
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.country.currency = 'USD'
+            self.country.save()
+
+        response = self.client.get('/countries/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()[0]['currency'], 'USD')
+
+    def test_errors_are_not_cached(self):
+        self.assertEqual(self.client.get('/countries/999999/').status_code, 404)
+
+        country = Country.objects.create(id=999999, name='Spain')
+
+        self.assertEqual(self.client.get(f'/countries/{country.pk}/').status_code, 200)
+
+
+class KeysetPaginationTests(TestCase):
+    def setUp(self):
+        france = create_city('Paris').country
+        canada = Country.objects.create(name='Canada')
+        # two cities share a name, so the cursor has to fall back on the id
+        for country, name in [(france, 'London'), (france, 'Nice'), (canada, 'London'), (canada, 'Ottawa')]:
+            City.objects.create(country=country, name=name, latitude=1.0, longitude=1.0)
+        city = City.objects.get(name='Paris')
+        for price in ('30.00', '10.00', '20.00', '10.00'):
+            Trip.objects.create(city=city, title=f'Trip {price}', description='', price=price)
+
+    def pages(self, url):
+        seen = []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            self.assertLessEqual(len(response.data['results']), 2)
+            seen.extend(row['id'] for row in response.data['results'])
+            url = response.data['next']
+        return seen
+
+    def test_pages_follow_the_cursor_without_gaps_or_repeats(self):
+        self.assertEqual(self.pages('/cities/?page_size=2'),
+                         list(City.objects.order_by('name', 'id').values_list('id', flat=True)))
+        self.assertEqual(self.pages('/trips/?page_size=2&ordering=-price'),
+                         list(Trip.objects.order_by('-price', '-id').values_list('id', flat=True)))
+
+    def test_invalid_cursor_is_rejected(self):
+        for values in ('not-a-cursor', ['abc', '1'], ['10.00', 'x'], ['10.00'], {'price': 1}, [['1'], '1']):
+            cursor = values if isinstance(values, str) else base64.urlsafe_b64encode(json.dumps(values).encode())
+            response = self.client.get('/trips/', {'cursor': cursor})
+            self.assertEqual(response.status_code, 404, values)
+
+
+class CatalogSearchTests(TestCase):
+    def setUp(self):
+        reset_search_index()
+        self.addCleanup(reset_search_index)
+        self.nice = create_city('Nice', description='Beaches of the Côte d\'Azur')
+        self.paris = create_city('Paris', description='Museums and a beach by the Seine')
+        self.trip = Trip.objects.create(city=self.paris, title='Paris museums', description='Louvre and Orsay',
+                                        price='100.00')
+
+    def search(self, **params):
+        response = self.client.get('/search/', params)
+        self.assertEqual(response.status_code, 200)
+        return [(row['type'], row['id']) for row in response.data['results']]
+
+    def test_name_matches_rank_above_description_matches(self):
+        self.assertEqual(self.search(q='paris'), [('city', self.paris.pk), ('trip', self.trip.pk)])
+        self.assertEqual(self.search(q='museums'), [('trip', self.trip.pk), ('city', self.paris.pk)])
+
+    def test_every_word_has_to_match(self):
+        self.assertEqual(self.search(q='museums louvre'), [('trip', self.trip.pk)])
+        self.assertEqual(self.search(q='museums beaches'), [])
+
+    def test_accents_and_type_filter(self):
+        self.assertEqual(self.search(q='cote', type='city'), [('city', self.nice.pk)])
+        self.assertEqual(self.search(q='paris', type='trip,unknown'), [('trip', self.trip.pk)])
+
+    def test_saved_rows_are_searchable(self):
+        self.search(q='lyon')
+        create_city('Lyon')
+
+        self.assertEqual(len(self.search(q='lyon')), 1)
+
+    def test_pages(self):
+        response = self.client.get('/search/', {'q': 'paris', 'page_size': 1})
+        self.assertEqual(len(response.data['results']), 1)
+        self.assertIn('page=2', response.data['next'])
+        self.assertEqual(self.search(q='paris', page_size=1, page=2), [('trip', self.trip.pk)])
+        self.assertEqual(self.client.get('/search/').status_code, 400)
+
+
+class NearbyCitiesTests(TestCase):
+    def test_bounding_box_wraps_at_the_antimeridian_and_covers_poles(self):
+        self.assertEqual(len(bounding_box(0, 179.9, 50)[2]), 2)
+        self.assertEqual(bounding_box(89.9, 0, 50)[2], [(-180, 180)])
+        min_lat, max_lat, [(min_lon, max_lon)] = bounding_box(48.85, 2.35, 100)
+        self.assertTrue(min_lat < 48.85 < max_lat and min_lon < 2.35 < max_lon)
+
+    def test_matches_a_linear_scan(self):
+        generator = random.Random(14)
+        country = Country.objects.create(name='Anywhere')
+        City.objects.bulk_create([
+            City(country=country, name=f'City {i}', latitude=generator.uniform(-60, 60),
+                 longitude=generator.uniform(-180, 180))
+            for i in range(400)
+        ] + [City(country=country, name='Unplaced')])
+
+        for latitude, longitude, radius in [(0, 179.5, 2000), (45, 10, 1500), (-30, -60, 800)]:
+            expected = sorted(
+                (haversine_km((city.latitude, city.longitude), (latitude, longitude)), city.pk)
+                for city in City.objects.exclude(latitude=None)
+            )
+            expected = [(pk, distance) for distance, pk in expected if distance <= radius][:25]
+
+            found = [(city.pk, distance) for city, distance in nearby_cities(latitude, longitude, radius, limit=25)]
+
+            self.assertEqual([pk for pk, _ in found], [pk for pk, _ in expected])
+            for (_, distance), (_, expected_distance) in zip(found, expected):
+                self.assertAlmostEqual(distance, expected_distance, places=6)
+
+    def test_endpoint(self):
+        paris = create_city('Paris', latitude=48.8566, longitude=2.3522)
+        create_city('Versailles', latitude=48.8049, longitude=2.1204)
+        create_city('Lyon', latitude=45.764, longitude=4.8357)
+
+        response = self.client.get('/cities/nearby/', {'lat': 48.86, 'lon': 2.35, 'radius_km': 50})
+
+        self.assertEqual([city['name'] for city in response.data['results']], ['Paris', 'Versailles'])
+        self.assertEqual(response.data['results'][0]['id'], paris.pk)
+        self.assertEqual(response.data['results'][0]['distance_km'], 0.4)
+        self.assertEqual(self.client.get('/cities/nearby/', {'lat': 0, 'lon': 0}).data, {'results': []})
+        self.assertEqual(self.client.get('/cities/nearby/', {'lat': 'x', 'lon': 0}).status_code, 400)
+        self.assertEqual(self.client.get('/cities/nearby/', {'lat': 91, 'lon': 0}).status_code, 400)
+
+
+def fake_calendar_offers(**kwargs):
+    day = date.fromisoformat(kwargs['departureDate']).day
+    if kwargs.get('returnDate'):
+        day += date.fromisoformat(kwargs['returnDate']).day
+    if day % 7 == 0:
+        raise RuntimeError('upstream error')
+    return [{'price': str(100 + day)}, {'price': str(200 + day)}]
+
+
+@mock.patch('trips.views.get_flight_offers', side_effect=fake_calendar_offers)
+class FlightPriceCalendarTests(TestCase):
+    def calendar(self, **data):
+        data = {'Origin': 'IST', 'Destination': 'CDG', **data}
+        return self.client.post('/trips/flights/calendar/', json.dumps(data), content_type='application/json')
+
+    def test_one_way_calendar(self, search):
+        center = date(2030, 1, 10)
+        response = self.calendar(Departuredate=center.isoformat(), window=2).json()
+
+        self.assertEqual(response['departure_dates'], [f'2030-01-{day:02}' for day in range(8, 13)])
+        self.assertEqual(response['prices'], [108.0, 109.0, 110.0, 111.0, 112.0])
+        self.assertEqual(response['cheapest'], {'departure_date': '2030-01-08', 'return_date': None, 'price': 108.0})
+        self.assertTrue(response['complete'])
+        self.assertEqual(search.call_count, 5)
+
+    def test_round_trip_matrix_skips_impossible_cells(self, search):
+        response = self.calendar(Departuredate='2030-01-10', Returndate='2030-01-11', window=1).json()
+
+        self.assertEqual(response['return_dates'], ['2030-01-10', '2030-01-11', '2030-01-12'])
+        # a return on the 10th after leaving on the 11th is not searched; 9+12 and 10+11 fail upstream
+        self.assertEqual(response['prices'], [[119.0, 120.0, None], [120.0, None, 122.0], [None, 122.0, 123.0]])
+        self.assertEqual(response['cheapest_per_day'], [119.0, 120.0, 122.0])
+        self.assertEqual(response['missing'], [['2030-01-09', '2030-01-12'], ['2030-01-10', '2030-01-11']])
+        self.assertFalse(response['complete'])
+
+    def test_past_dates_are_not_searched(self, search):
+        today = date.today()
+        response = self.calendar(Departuredate=(today + timedelta(days=1)).isoformat(), window=3).json()
+
+        self.assertEqual(len(response['departure_dates']), 7)
+        self.assertEqual(search.call_count, 5)
+        self.assertEqual(response['prices'][:2], [None, None])
+
+    def test_bad_requests(self, search):
+        self.assertEqual(self.calendar(Departuredate='soon').status_code, 400)
+        self.assertEqual(self.calendar(Departuredate='2030-01-10', Origin=None).status_code, 400)
+        self.assertEqual(self.calendar(Departuredate='2000-01-10', window=1).status_code, 400)
+        search.assert_not_called()
+
+
+class TokenBucketTests(TestCase):
+    @mock.patch('trips.services.amadeus_client.time.monotonic', return_value=100.0)
+    def test_burst_then_queue_then_reject(self, clock):
+        bucket = TokenBucket(rate=2, burst=2)
+
+        self.assertEqual([bucket.reserve(1.0) for _ in range(4)], [0.0, 0.0, 0.5, 1.0])
+        # a fifth call would wait 1.5 s
+        self.assertIsNone(bucket.reserve(1.0))
+
+        clock.return_value = 101.0
+        self.assertEqual(bucket.reserve(1.0), 0.5)
+
+    @mock.patch('trips.services.amadeus_client.time.monotonic', return_value=100.0)
+    def test_refill_is_capped_at_the_burst(self, clock):
+        bucket = TokenBucket(rate=10, burst=1)
+        clock.return_value = 200.0
+
+        self.assertEqual([bucket.reserve(0.05) for _ in range(3)], [0.0, None, None])
+
+    def test_shared_bucket_falls_back_to_the_local_one(self):
+        redis_client = mock.Mock()
+        redis_client.register_script.return_value.side_effect = ConnectionError('redis down')
+        bucket = RedisTokenBucket('amadeus:bucket:test', rate=1, burst=1, redis_client=redis_client)
+
+        self.assertEqual(bucket.reserve(0.5), 0.0)
+        self.assertIsNone(bucket.reserve(0.5))
+
+    def test_shared_bucket_reads_the_script_result(self):
+        redis_client = mock.Mock()
+        bucket = RedisTokenBucket('amadeus:bucket:test', rate=1, burst=1, redis_client=redis_client)
+        redis_client.register_script.assert_called_once_with(RESERVE_SCRIPT)
+
+        redis_client.register_script.return_value.return_value = b'0.25'
+        self.assertEqual(bucket.reserve(1.0), 0.25)
+        redis_client.register_script.return_value.return_value = -1
+        self.assertIsNone(bucket.reserve(1.0))
+
+
+@skipUnless(settings.REDIS_URL, "REDIS_URL is not set")
+class RedisTokenBucketScriptTests(TestCase):
+    def test_script_matches_the_local_bucket(self):
+        import redis
+
+        redis_client = redis.Redis.from_url(settings.REDIS_URL)
+        key = f'amadeus:bucket:test:{time.time()}'
+        self.addCleanup(redis_client.delete, key)
+        bucket = RedisTokenBucket(key, rate=1, burst=2, redis_client=redis_client)
+
+        waits = [bucket.reserve(1.5) for _ in range(4)]
+
+        self.assertEqual(waits[:2], [0.0, 0.0])
+        self.assertAlmostEqual(waits[2], 1.0, places=1)
+        self.assertIsNone(waits[3])
+        self.assertLessEqual(redis_client.ttl(key), 4)
+
+
+class GatewayTests(TestCase):
+    def setUp(self):
+        self.gateway = AmadeusGateway()
+
+    def test_identical_calls_in_flight_share_one_upstream_request(self):
+        started = threading.Event()
+        release = threading.Event()
+        calls = []
+
+        def call(**params):
+            calls.append(params)
+            started.set()
+            release.wait(5)
+            return {'data': params['cityCode']}
+
+        results = []
+
+        def ask():
+            results.append(self.gateway.request('/hotels', call, cityCode='PAR'))
+
+        leader = threading.Thread(target=ask)
+        leader.start()
+        started.wait(5)
+        followers = [threading.Thread(target=ask) for _ in range(3)]
+        for follower in followers:
+            follower.start()
+        while self.gateway.stats()['/hotels']['coalesced'] < 3:
+            time.sleep(0.01)
+        release.set()
+        for thread in [leader, *followers]:
+            thread.join(5)
+
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(results, [{'data': 'PAR'}] * 4)
+        # a different call is not coalesced
+        self.assertEqual(self.gateway.request('/hotels', call, cityCode='LON'), {'data': 'LON'})
+        self.assertEqual(len(calls), 2)
+        self.assertEqual(self.gateway.stats()['/hotels']['calls'], 2)
+
+    def test_errors_reach_every_caller_and_are_not_kept(self):
+        def call():
+            raise ValueError('upstream error')
+
+        with self.assertRaises(ValueError):
+            self.gateway.request('/hotels', call)
+        self.assertEqual(self.gateway.request('/hotels', lambda: 'ok'), 'ok')
+
+    @mock.patch.object(settings, 'AMADEUS_RATE_LIMIT_BURST', 1)
+    @mock.patch.object(settings, 'AMADEUS_RATE_LIMIT', 1)
+    @mock.patch.object(settings, 'AMADEUS_MAX_QUEUE_WAIT', 0.1)
+    def test_over_the_queue_limit_raises_rate_limited(self):
+        self.assertEqual(self.gateway.request('/hotels', lambda city: city, 'PAR'), 'PAR')
+
+        with self.assertRaises(RateLimited) as raised:
+            self.gateway.request('/hotels', lambda city: city, 'LON')
+
+        self.assertEqual(raised.exception.status, 429)
+        self.assertEqual(self.gateway.stats()['/hotels']['rejected'], 1)
+
+    def test_async_calls_survive_a_cancelled_caller(self):
+        calls = []
+
+        async def call(**params):
+            calls.append(params)
+            await asyncio.sleep(0.05)
+            return params['cityCode']
+
+        async def scenario():
+            first = asyncio.ensure_future(self.gateway.request_async('/hotels', call, cityCode='PAR'))
+            second = asyncio.ensure_future(self.gateway.request_async('/hotels', call, cityCode='PAR'))
+            await asyncio.sleep(0.01)
+            first.cancel()
+            return await second, first.cancelled()
+
+        self.assertEqual(asyncio.run(scenario()), ('PAR', True))
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(self.gateway.stats()['/hotels']['coalesced'], 1)
+
+
+class StatsPermissionTests(TestCase):
+    def test_stats_are_for_staff_only(self):
+        staff = CustomUser.objects.create_user(email='staff@example.com', phone='+380000000009', password='x',
+                                               first_name='A', last_name='B', is_staff=True)
+        client = APIClient()
+        for url in ('/trips/cache-stats/', '/trips/upstream-stats/', '/trips/price-watches/stats/'):
+            client.force_authenticate(None)
+            self.assertEqual(client.get(url).status_code, 401, url)
+            client.force_authenticate(staff)
+            self.assertEqual(client.get(url).status_code, 200, url)
+
+
+class FakeTokenClient:
+    client_id = 'id'
+    client_secret = 'secret'
+
+    def __init__(self):
+        self.fetches = 0
+
+    def _unauthenticated_request(self, method, path, params):
+        self.fetches += 1
+        return mock.Mock(result={'access_token': f'token-{self.fetches}', 'expires_in': 1799})
+
+
+class SharedTokenTests(TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.store = FileTokenStore(os.path.join(directory.name, 'token.json'))
+
+    def test_workers_share_one_token(self):
+        client = FakeTokenClient()
+        workers = [SharedAccessToken(client, self.store) for _ in range(3)]
+
+        self.assertEqual({worker._bearer_token() for worker in workers}, {'Bearer token-1'})
+        self.assertEqual(client.fetches, 1)
+        self.assertEqual(os.stat(self.store.path).st_mode & 0o777, 0o600)
+
+    def test_token_is_refreshed_shortly_before_it_expires(self):
+        self.store.save({'access_token': 'old', 'expires_at': time.time() + settings.AMADEUS_TOKEN_REFRESH_MARGIN - 1})
+        fetch = mock.Mock(return_value={'access_token': 'new', 'expires_at': time.time() + 1800})
+
+        self.assertEqual(shared_token(self.store, fetch)['access_token'], 'new')
+        self.assertEqual(shared_token(self.store, fetch)['access_token'], 'new')
+        fetch.assert_called_once_with()
+
+    def test_refresh_under_the_lock_rereads_the_store(self):
+        fresh = {'access_token': 'from-another-worker', 'expires_at': time.time() + 1800}
+        fetch = mock.Mock()
+        store = mock.Mock(wraps=self.store)
+        # stale on the first read; another worker saved a fresh one before we got the lock
+        store.load.side_effect = [None, fresh]
+
+        self.assertEqual(shared_token(store, fetch), fresh)
+        fetch.assert_not_called()
+
+    def test_unreadable_file_counts_as_no_token(self):
+        with open(self.store.path, 'w') as f:
+            f.write('{not json')
+
+        self.assertIsNone(self.store.load())
+
+    def test_redis_store(self):
+        redis_client = mock.Mock()
+        store = RedisTokenStore(redis_client, 'amadeus:token:test')
+        token = {'access_token': 'abc', 'expires_at': time.time() + 100}
+
+        store.save(token)
+        key, value = redis_client.set.call_args.args
+        self.assertEqual(key, 'amadeus:token:test')
+        self.assertIn(redis_client.set.call_args.kwargs['ex'], (99, 100))
+
+        redis_client.get.return_value = value
+        self.assertEqual(store.load(), token)
+        redis_client.get.side_effect = ConnectionError('redis down')
+        self.assertIsNone(store.load())
+
+        store.save({'access_token': 'abc', 'expires_at': time.time() - 1})
+        self.assertEqual(redis_client.set.call_count, 1)
+
+
+class PriceStatsTests(TestCase):
+    def test_summarize_is_exact_and_skips_unusable_prices(self):
+        metrics = summarize([300, None, 100.0, float('nan'), 200, float('inf'), 400])
+
+        self.assertEqual({key: metrics[key] for key in ('count', 'min', 'first', 'median', 'third', 'max')},
+                         {'count': 4, 'min': 100.0, 'first': 175.0, 'median': 250.0, 'third': 325.0, 'max': 400.0})
+        self.assertEqual(sum(metrics['histogram']['counts']), 4)
+        self.assertEqual(metrics['histogram']['edges'][0], 100.0)
+        self.assertIsNone(summarize([None, float('nan')]))
+
+    def test_offer_metrics(self):
+        self.assertEqual(build_price_metrics([{'price': '120.5'}, {'price': '99'}])['cheapest_flight'], 99.0)
+        self.assertIsNone(build_price_metrics([]))
+        self.assertEqual(build_hotel_offers([hotel_offer('H1', 80), hotel_offer('H2', 60)])['metrics']['cheapest'],
+                         60.0)
+
+    def test_sketch_quantiles_are_within_the_relative_accuracy(self):
+        generator = random.Random(19)
+        prices = [generator.lognormvariate(5, 1) for _ in range(5000)] + [0.0] * 10
+        sketch = QuantileSketch(relative_accuracy=0.01).add(prices)
+        ordered = sorted(prices)
+
+        for q in (0.0, 0.01, 0.25, 0.5, 0.75, 0.99, 1.0):
+            exact = ordered[int(q * (len(ordered) - 1))]
+            self.assertLessEqual(abs(sketch.quantile(q) - exact), 0.01 * exact, q)
+        self.assertEqual((sketch.count, sketch.min, sketch.max), (5010, 0.0, max(prices)))
+
+    def test_merged_sketches_equal_one_sketch_of_everything(self):
+        generator = random.Random(20)
+        days = [[generator.uniform(50, 900) for _ in range(200)] for _ in range(3)]
+
+        merged = QuantileSketch()
+        for prices in days:
+            # stored and read back as the daily rollups are
+            merged.merge(QuantileSketch.from_dict(json.loads(json.dumps(QuantileSketch().add(prices).to_dict()))))
+
+        whole = QuantileSketch().add([price for prices in days for price in prices])
+        self.assertEqual(merged.summary(), whole.summary())
+        with self.assertRaises(ValueError):
+            merged.merge(QuantileSketch(relative_accuracy=0.05))
+
+    def test_empty_sketch(self):
+        sketch = QuantileSketch().add([None])
+
+        self.assertIsNone(sketch.summary())
+        self.assertIsNone(QuantileSketch.from_dict(sketch.to_dict()).quantile(0.5))
+
+
+def flight_offer(price, carrier, currency='EUR'):
+    return {'price': {'total': str(price), 'currency': currency}, 'validatingAirlineCodes': [carrier]}
+
+
+# write_batch runs on the recorder's own thread and closes its connection; here it shares the test's
+@mock.patch('trips.price_history.connection')
+class PriceHistoryTests(TestCase):
+    def setUp(self):
+        self.today = timezone.localdate()
+        self.params = {'originLocationCode': 'ist', 'destinationLocationCode': 'cdg', 'adults': 2,
+                       'departureDate': (self.today + timedelta(days=10)).isoformat()}
+
+    def observe(self, prices, observed_at=None, **params):
+        data = [flight_offer(price, carrier) for carrier, price in prices]
+        write_batch(flight_observations({**self.params, **params}, data, observed_at or timezone.now()))
+
+    def test_cheapest_price_per_carrier_and_adult(self, connection):
+        observations = flight_observations(self.params, [flight_offer(300, 'TK'), flight_offer(200, 'TK'),
+                                                         flight_offer(500, 'AF'), {'price': 'broken'}],
+                                           timezone.now())
+
+        self.assertEqual(sorted((o.route, o.carrier, o.price) for o in observations),
+                         [('IST-CDG', 'AF', 250.0), ('IST-CDG', 'TK', 100.0)])
+
+    def test_hotel_prices_are_per_night(self, connection):
+        offer = hotel_offer('H1', 300)
+        offer['hotel']['chainCode'] = 'HI'
+        params = {'cityCode': 'par', 'checkInDate': '2030-01-01', 'checkOutDate': '2030-01-04'}
+
+        observations = hotel_observations(params, [[offer], RuntimeError('chunk failed')], timezone.now())
+
+        self.assertEqual([(o.route, o.carrier, o.price) for o in observations], [('PAR', 'HI', 100.0)])
+
+    def test_batches_fold_into_one_rollup_per_route_date_and_day(self, connection):
+        self.observe([('TK', 200), ('AF', 400)])
+        self.observe([('TK', 300)])
+
+        rollup = PriceDailyRollup.objects.get()
+        self.assertEqual((rollup.count, rollup.min_price, rollup.max_price, rollup.sum_price),
+                         (3, 100.0, 200.0, 450.0))
+        self.assertEqual(QuantileSketch.from_dict(rollup.sketch).count, 3)
+        self.assertEqual(PriceObservation.objects.count(), 3)
+
+    def test_trend_per_travel_date_and_per_search_day(self, connection):
+        later = (self.today + timedelta(days=12)).isoformat()
+        self.observe([('TK', 200), ('AF', 400)])
+        self.observe([('TK', 300)], departureDate=later)
+        self.observe([('TK', 180)], observed_at=timezone.now() - timedelta(days=3))
+
+        upcoming = price_trend('flight', 'IST-CDG')
+        self.assertEqual([(point['date'], point['count'], point['min']) for point in upcoming['series']],
+                         [(self.params['departureDate'], 3, 90.0), (later, 1, 150.0)])
+        self.assertEqual((upcoming['metrics']['count'], upcoming['metrics']['min']), (4, 90.0))
+
+        history = price_trend('flight', 'IST-CDG', travel_date=date.fromisoformat(self.params['departureDate']))
+        self.assertEqual([(point['count'], point['average']) for point in history['series']], [(1, 90.0), (2, 150.0)])
+
+        response = self.client.get('/trips/price-trend/', {'origin': 'ist', 'destination': 'cdg'})
+        self.assertEqual(response.data['route'], 'IST-CDG')
+        self.assertEqual(len(response.data['series']), 2)
+        self.assertEqual(self.client.get('/trips/price-trend/', {'kind': 'hotel'}).status_code, 400)
+
+    def test_pruning_keeps_the_rollups(self, connection):
+        self.observe([('TK', 180)], observed_at=timezone.now() - timedelta(days=200))
+        self.observe([('TK', 200)])
+
+        self.assertEqual(prune_price_history(timedelta(days=180), batch_size=1), 1)
+        self.assertEqual(PriceObservation.objects.count(), 1)
+        self.assertEqual(PriceDailyRollup.objects.count(), 2)
+
+
+class PriceRecorderTests(TestCase):
+    @mock.patch.object(settings, 'PRICE_HISTORY_BATCH_SIZE', 3)
+    @mock.patch('trips.price_history.write_batch')
+    def test_observations_are_written_in_batches(self, write):
+        recorder = PriceRecorder()
+        self.addCleanup(recorder.close)
+
+        recorder.record([1, 2])
+        self.assertIsNotNone(recorder._timer)
+        recorder.record([3, 4])
+        recorder._writer.shutdown(wait=True)
+
+        write.assert_called_once_with([1, 2, 3, 4])
+        self.assertIsNone(recorder._timer)
+        self.assertEqual(recorder.pending, [])
+
+    @mock.patch('trips.price_history.write_batch')
+    def test_close_writes_what_is_left(self, write):
+        recorder = PriceRecorder()
+        recorder.record([1])
+
+        recorder.close()
+
+        write.assert_called_once_with([1])
+
+
+class PriceWatchAlertTests(TestCase):
+    def setUp(self):
+        flight_search_cache._local.clear()
+        self.departure = timezone.localdate() + timedelta(days=30)
+
+    def watch(self, user, **fields):
+        return PriceWatch.objects.create(user=user, origin='IST', destination='CDG',
+                                         departure_date=self.departure, **fields)
+
+    def user(self, email, phone):
+        return CustomUser.objects.create_user(email=email, phone=phone, password='passw0rd-123',
+                                              first_name='A', last_name='B', is_active=True)
+
+    def test_should_alert(self):
+        watch = PriceWatch(max_price=200)
+        self.assertFalse(should_alert(watch, None))
+        self.assertFalse(should_alert(watch, 250.0))
+        self.assertTrue(should_alert(watch, 200.0))
+
+        watch.notified_price = 180.0
+        self.assertFalse(should_alert(watch, 180.0))
+        self.assertTrue(should_alert(watch, 179.5))
+
+    @mock.patch('trips.price_watch.search_flight_offers')
+    def test_cycle_searches_each_route_once_and_queues_one_email_per_user(self, search):
+        search.return_value = [{'price': '150.00'}, {'price': '190.00'}]
+        first = self.user('a@example.com', '+380000000001')
+        second = self.user('b@example.com', '+380000000002')
+        self.watch(first, max_price=200)
+        self.watch(first, max_price=100)
+        self.watch(second, max_price=160)
+
+        cycle = run_cycle()
+
+        self.assertEqual(search.call_count, 1)
+        self.assertEqual((cycle.watches, cycle.routes, cycle.alerts, cycle.emails), (3, 1, 2, 2))
+        self.assertEqual(sorted(email.to[0] for email in OutboxEmail.objects.all()), ['a@example.com', 'b@example.com'])
+        self.assertEqual(PriceWatch.objects.filter(notified_price=150.0).count(), 2)
+
+        # same price again: served from the search cache, nobody is mailed twice
+        cycle = run_cycle()
+        self.assertEqual(search.call_count, 1)
+        self.assertEqual((cycle.cache_hits, cycle.alerts, cycle.emails), (1, 0, 0))
+        self.assertEqual(OutboxEmail.objects.count(), 2)
+        self.assertEqual(PriceWatchCycle.objects.count(), 2)
+
+    @mock.patch('trips.price_watch.search_flight_offers', return_value=[{'price': '150.00'}])
+    def test_cycle_does_not_need_a_mail_server(self, search):
+        self.watch(self.user('a@example.com', '+380000000001'), max_price=200)
+
+        with mock.patch('django.core.mail.get_connection', side_effect=ConnectionRefusedError):
+            cycle = run_cycle()
+
+        self.assertEqual((cycle.alerts, cycle.emails), (1, 1))
+        watch = PriceWatch.objects.get()
+        self.assertEqual((watch.last_price, watch.notified_price), (150.0, 150.0))
+        self.assertEqual(OutboxEmail.objects.get().status, 'pending')
+        self.assertEqual(PriceWatchCycle.objects.count(), 1)
+
+    @mock.patch('trips.price_watch.search_flight_offers', side_effect=RuntimeError('upstream down'))
+    def test_failed_route_is_counted(self, search):
+        self.watch(self.user('a@example.com', '+380000000001'), max_price=200)
+
+        cycle = run_cycle()
+
+        self.assertEqual((cycle.failed_routes, cycle.alerts), (1, 0))
+        self.assertIsNone(PriceWatch.objects.get().last_checked_at)
+
+    def test_scheduler_survives_a_failed_cycle(self):
+        calls = []
+
+        def cycle(scheduled_at):
+            calls.append(scheduled_at)
+            if len(calls) == 1:
+                raise RuntimeError('database unavailable')
+            raise KeyboardInterrupt
+
+        with mock.patch('trips.management.commands.run_price_watches.run_cycle', side_effect=cycle), \
+                mock.patch('trips.management.commands.run_price_watches.time.sleep'), \
+                self.assertLogs('trips.management.commands.run_price_watches', 'ERROR'):
+            with self.assertRaises(KeyboardInterrupt):
+                call_command('run_price_watches', interval=60, stdout=io.StringIO())
 
-# Create your tests here.
+        self.assertEqual(len(calls), 2)
@@ -1,26 +1,43 @@
 from django.urls import path
 
-from . import views
-from .views import country_list, country_detail, CityListView, TripListView, city_detail, get_weather, \
-    generate_city_trip_view, SaveTripView
+from TravellinoCappuchino import settings
+from . import views, async_views
+from .views import country_list, country_detail, CityListView, TripListView, city_detail, \
+    generate_city_trip_view, SaveTripView, CatalogImportView, CatalogImportDetailView, catalog_search, \
+    nearby_city_list
+
+# views that wait on external APIs; the async versions share one pooled HTTP client under ASGI
+io_views = async_views if settings.ASYNC_VIEWS else views
 
 urlpatterns = [
 
     path('countries/', country_list),
     path('countries/<int:country_id>/', country_detail),
+    path('catalog/import/', CatalogImportView.as_view(), name='catalog-import'),
+    path('catalog/import/<int:import_id>/', CatalogImportDetailView.as_view(), name='catalog-import-detail'),
+    path("search/", catalog_search, name="catalog-search"),
     path("cities/", CityListView.as_view(), name="city-list"),
+    path("cities/nearby/", nearby_city_list, name="city-nearby"),
     path("cities/<int:city_id>/", city_detail),
-    path('trips/city-to-iata/', views.city_to_iata, name='city-to-iata'),
+    path('trips/city-to-iata/', io_views.city_to_iata, name='city-to-iata'),
     path("trips/", TripListView.as_view(), name="trip-list"),
-    path("weather/<int:city_id>/", get_weather),
+    path("weather/", io_views.get_weather_batch),
+    path("weather/<int:city_id>/", io_views.get_weather),
     path("trips/generate_city/", generate_city_trip_view, name="generate-city-trip"),
 
-    path('trips/hotels/', views.hotel_search, name='hotels_search'),
+    path('trips/hotels/', io_views.hotel_search, name='hotels_search'),
 
     path('trips/save-trip/', SaveTripView.as_view(), name='save_trip'),
 
-    path('trips/flights/', views.flight_offers, name='flight_offers'),
-    path('trips/hotels/', views.hotel_search, name='hotel_search'),
+    path('trips/flights/', io_views.flight_offers, name='flight_offers'),
+    path('trips/flights/calendar/', views.flight_price_calendar, name='flight_price_calendar'),
+    path('trips/cache-stats/', views.cache_stats, name='cache_stats'),
+    path('trips/upstream-stats/', views.upstream_stats, name='upstream_stats'),
+    path('trips/price-trend/', views.price_trend_view, name='price_trend'),
+    path('trips/price-watches/', views.PriceWatchListView.as_view(), name='price-watch-list'),
+    path('trips/price-watches/stats/', views.price_watch_stats, name='price-watch-stats'),
+    path('trips/price-watches/<int:pk>/', views.PriceWatchDetailView.as_view(), name='price-watch-detail'),
+    path('trips/hotels/', io_views.hotel_search, name='hotel_search'),
     path('trips/origin_airport_search/', views.origin_airport_search, name='origin_airport_search'),
     path('trips/destination_airport_search/', views.destination_airport_search, name='destination_airport_search')
 ]
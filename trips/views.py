@@ -1,36 +1,47 @@
 import json
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError, wait
+from datetime import date, timedelta
 
-import requests
-from amadeus import Client, ResponseError, Location
-from django.http import JsonResponse
+from django.http import Http404, JsonResponse, StreamingHttpResponse
 from django.shortcuts import get_object_or_404
 from django.views.decorators.csrf import csrf_exempt
-from google import genai
-from google.genai.errors import APIError
 from rest_framework import generics, status
 from rest_framework.decorators import permission_classes, api_view
-from rest_framework.permissions import AllowAny, IsAuthenticated
+from rest_framework.permissions import AllowAny, IsAuthenticated, IsAdminUser
 from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
 from rest_framework.views import APIView
 
 from TravellinoCappuchino import settings
-from .flight import Flight
+from users.authentication import user_cache
+from .airports import get_airport_index
+from .cache import flight_search_cache, weather_cache
 from .metrics import Metrics
-from .models import Country, City, Trip, SavedTrip
-from .serializers import CitySerializer, TripSerializer, CountrySerializer
-
-try:
-    client = genai.Client()
-except Exception as e:
-    print(f"Error initializing Gemini: {e}")
-    client = None
-
-
+from .models import Country, City, Trip, SavedTrip, CatalogImport, PriceWatch, Hotel
+from .plan_cache import canonical_preferences, get_cached_plan, store_plan, plan_cache_stats
+from .catalog_cache import cached_catalog_response, catalog_cache
+from .pagination import KeysetPagination
+from .search import SEARCHABLE, search_catalog
+from .services import amadeus_client
+from .services.amadeus_client import (get_amadeus, gateway, RateLimited, HOTEL_OFFERS, HOTELS_BY_CITY,
+                                      LOCATIONS, PRICE_METRICS, TRIP_PURPOSE, ANY_LOCATION)
+from .services.flights import get_flight_offers
+from .services.gemini import GeminiError, generate, generate_stream
+from .nearby import nearby_cities
+from .price_history import record_hotel_search, flight_route, price_trend, parse_date
+from .catalog_import import read_records, import_catalog, start_geocoding
+from .serializers import (CitySerializer, TripSerializer, CountrySerializer, CatalogImportSerializer,
+                          PriceWatchSerializer)
+
+
+@cached_catalog_response
 def country_list(request):
     countries = Country.objects.all().values('id', 'name', 'description', 'flag_url', 'currency').order_by('name')
     return JsonResponse(list(countries), safe=False)
 
 
+@cached_catalog_response
 def country_detail(request, country_id):
     try:
         country = Country.objects.prefetch_related('cities').get(id=country_id)
@@ -42,65 +53,205 @@ def country_detail(request, country_id):
 
 def city_detail(request, city_id):
     try:
-        city = City.objects.get(id=city_id)
+        city = City.objects.select_related("country").get(id=city_id)
         serializer = CitySerializer(city)
         return JsonResponse(serializer.data, safe=False)
     except City.DoesNotExist:
         return JsonResponse({'error': 'City not found'}, status=404)
 
 
+WEATHER_URL = "https://api.openweathermap.org/data/2.5/weather"
+
+
+def weather_location(city):
+    # ~1 km grid, so nearby cities and repeat requests share one cached reading
+    if city.latitude is None or city.longitude is None:
+        raise ValueError(f"City {city.name} has no coordinates")
+    return {'lat': round(city.latitude, 2), 'lon': round(city.longitude, 2)}
+
+
+def weather_params(city):
+    return {
+        **weather_location(city),
+        'units': 'metric',
+        'appid': settings.WEATHER_API_KEY,
+    }
+
+
+def build_weather(city, data):
+    return {
+        "city": city.name,
+        "temperature": round(data["main"]["temp"]),
+        "feels_like": round(data["main"]["feels_like"]),
+        "description": data["weather"][0]["description"],
+        "icon": data["weather"][0]["icon"],
+    }
+
+
+def request_weather(city):
+    import requests
+
+    response = requests.get(WEATHER_URL, params=weather_params(city), timeout=settings.WEATHER_TIMEOUT)
+    response.raise_for_status()
+    return response.json()
+
+
+def fetch_weather(city):
+    return weather_cache.get_or_set(weather_location(city), lambda: request_weather(city))
+
+
 def get_weather(request, city_id):
     try:
         city = City.objects.get(id=city_id)
     except City.DoesNotExist:
         return JsonResponse({'error': 'City not found'}, status=404)
-    lat = city.latitude
-    lon = city.longitude
-
-    api_key = settings.WEATHER_API_KEY
-    url = (
-        f"https://api.openweathermap.org/data/2.5/weather?"
-        f"lat={city.latitude}&lon={city.longitude}&units=metric&appid={api_key}"
-    )
 
     try:
-        response = requests.get(url)
-        data = response.json()
+        data = fetch_weather(city)
     except Exception as e:
         return JsonResponse({"error": "Failed to fetch weather", "details": str(e)}, status=500)
 
-    return JsonResponse({
-        "city": city.name,
-        "temperature": round(data["main"]["temp"]),
-        "feels_like": round(data["main"]["feels_like"]),
-        "description": data["weather"][0]["description"],
-        "icon": data["weather"][0]["icon"],
-    })
+    return JsonResponse(build_weather(city, data))
+
+
+def parse_city_ids(request):
+    raw = request.GET.get('city_ids', '')
+    try:
+        city_ids = list(dict.fromkeys(int(value) for value in raw.split(',') if value.strip()))
+    except ValueError:
+        raise ValueError("city_ids must be a comma-separated list of integers")
+    if not city_ids:
+        raise ValueError("city_ids is required")
+    if len(city_ids) > settings.WEATHER_BATCH_LIMIT:
+        raise ValueError(f"At most {settings.WEATHER_BATCH_LIMIT} city_ids are allowed")
+    return city_ids
+
+
+def lookup_cached_weather(cities):
+    """Split cities into cached readings, errors and misses grouped by weather location."""
+    readings = {}
+    errors = {}
+    misses = {}
+    for city_id, city in cities.items():
+        try:
+            location = weather_location(city)
+        except ValueError as e:
+            errors[str(city_id)] = str(e)
+            continue
+        data = weather_cache.get(location)
+        if data is None:
+            misses.setdefault((location['lat'], location['lon']), []).append(city)
+        else:
+            readings[city_id] = data
+    return readings, errors, misses
+
+
+def store_weather(data, group, readings):
+    weather_cache.set(weather_location(group[0]), data)
+    for city in group:
+        readings[city.id] = data
+
+
+def weather_batch_result(city_ids, cities, readings, errors):
+    weather = {}
+    for city_id in city_ids:
+        city = cities.get(city_id)
+        if city is None:
+            errors[str(city_id)] = 'City not found'
+        elif str(city_id) not in errors:
+            weather[str(city_id)] = build_weather(city, readings[city_id])
+    return {'weather': weather, 'errors': errors}
+
+
+def get_weather_batch(request):
+    try:
+        city_ids = parse_city_ids(request)
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+
+    cities = City.objects.only('id', 'name', 'latitude', 'longitude').in_bulk(city_ids)
+
+    readings, errors, misses = lookup_cached_weather(cities)
+
+    if misses:
+        with ThreadPoolExecutor(max_workers=min(len(misses), settings.WEATHER_MAX_WORKERS)) as pool:
+            futures = {pool.submit(request_weather, group[0]): group for group in misses.values()}
+            for future, group in futures.items():
+                try:
+                    store_weather(future.result(), group, readings)
+                except Exception as e:
+                    for city in group:
+                        errors[str(city.id)] = f"Failed to fetch weather: {e}"
+
+    return JsonResponse(weather_batch_result(city_ids, cities, readings, errors))
 
 
 class CityListView(generics.ListAPIView):
     serializer_class = CitySerializer
+    pagination_class = KeysetPagination
+    keyset_ordering = ('name', 'id')
+
+    def get_queryset(self):
+        # the map url fields read city.country
+        return City.objects.select_related('country')
 
 
-def get_queryset(self):
-    cities = City.objects.all()
-    serializer = CitySerializer(cities, many=True)
-    return Response(serializer.data)
+@api_view(['GET'])
+@permission_classes([AllowAny])
+def nearby_city_list(request):
+    try:
+        latitude = float(request.query_params['lat'])
+        longitude = float(request.query_params['lon'])
+        radius_km = float(request.query_params.get('radius_km', settings.NEARBY_DEFAULT_RADIUS_KM))
+        limit = min(max(int(request.query_params.get('limit', 50)), 1), 200)
+    except (KeyError, ValueError):
+        return Response({"error": "lat and lon are required; lat, lon, radius_km and limit must be numbers"},
+                        status=400)
+    if not (-90 <= latitude <= 90 and -180 <= longitude <= 180) or radius_km <= 0:
+        return Response({"error": "Coordinates or radius out of range"}, status=400)
+    radius_km = min(radius_km, settings.NEARBY_MAX_RADIUS_KM)
+
+    results = []
+    for city, distance in nearby_cities(latitude, longitude, radius_km, limit):
+        data = CitySerializer(city).data
+        data['distance_km'] = round(distance, 1)
+        results.append(data)
+    return Response({'results': results})
+
+
+@api_view(['GET'])
+@permission_classes([AllowAny])
+def catalog_search(request):
+    text = request.query_params.get('q', '').strip()
+    if not text:
+        return Response({"error": "q is required"}, status=400)
 
+    types = request.query_params.get('type')
+    types = [kind for kind in types.split(',') if kind in SEARCHABLE] if types else list(SEARCHABLE)
+    try:
+        page = max(int(request.query_params.get('page', 1)), 1)
+        page_size = min(max(int(request.query_params.get('page_size', 20)), 1), 100)
+    except ValueError:
+        return Response({"error": "page and page_size must be integers"}, status=400)
 
-def post(self, request):
-    serializer = CitySerializer(data=request.data)
-    if serializer.is_valid():
-        serializer.save()
-        return Response(serializer.data, status=status.HTTP_201_CREATED)
-    return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+    results = search_catalog(text, types, limit=page_size + 1, offset=(page - 1) * page_size)
+    next_link = None
+    if len(results) > page_size:
+        next_link = replace_query_param(request.build_absolute_uri(), 'page', page + 1)
+    return Response({'next': next_link, 'results': results[:page_size]})
 
 
 class TripListView(generics.ListAPIView):
     serializer_class = TripSerializer
+    pagination_class = KeysetPagination
+
+    def get_keyset_ordering(self):
+        if self.request.query_params.get("ordering") == "-price":
+            return ('-price', '-id')
+        return ('price', 'id')
 
     def get_queryset(self):
-        trips = Trip.objects.all()
+        trips = Trip.objects.select_related('city__country')
         country_id = self.request.query_params.get("country")
         city_id = self.request.query_params.get("city")
 
@@ -110,36 +261,27 @@ class TripListView(generics.ListAPIView):
         if city_id:
             trips = trips.filter(city_id=city_id)
 
-        ordering = self.request.query_params.get("ordering")
-        if ordering == "price":
-            trips = trips.order_by("price")
-        elif ordering == "-price":
-            trips = trips.order_by("-price")
-
         return trips
 
 
-amadeus = Client()
+def flight_search_kwargs(data):
+    kwargs = {
+        'originLocationCode': data.get('Origin'),
+        'destinationLocationCode': data.get('Destination'),
+        'departureDate': data.get('Departuredate'),
+        'adults': 1
+    }
+
+    return_date = data.get('Returndate')
+    if return_date:
+        kwargs['returnDate'] = return_date
+    return kwargs
 
 
 @csrf_exempt
 def flight_offers(request):
     if request.method == "POST":
-        data = json.loads(request.body)
-        origin = data.get('Origin')
-        destination = data.get('Destination')
-        departure_date = data.get('Departuredate')
-        return_date = data.get('Returndate')
-
-        kwargs = {
-            'originLocationCode': origin,
-            'destinationLocationCode': destination,
-            'departureDate': departure_date,
-            'adults': 1
-        }
-
-        if return_date:
-            kwargs['returnDate'] = return_date
+        kwargs = flight_search_kwargs(json.loads(request.body))
 
         try:
             flight_offers = get_flight_offers(**kwargs)
@@ -150,7 +292,9 @@ def flight_offers(request):
             }
 
             return JsonResponse(response)
-        except ResponseError as e:  # Catch specifically ResponseError
+        except RateLimited as e:
+            return JsonResponse({'error': e.body}, status=429)
+        except amadeus_client.ResponseError as e:  # Catch specifically ResponseError
             print(f"Amadeus API detailed error: {e.response.body}")
             return JsonResponse({'error': e.response.body}, status=400)
         except Exception as e:
@@ -159,60 +303,141 @@ def flight_offers(request):
     return JsonResponse({'error': 'POST method required'}, status=405)
 
 
-def generate_booking_link(airline, origin, destination, date):
-    AIRLINE_LINKS = {
-        "IB": "https://www.iberia.com/flights/?origin={o}&destination={d}&departureDate={date}",
-        "LH": "https://www.lufthansa.com/fl/en/flight-search?origin={o}&destination={d}&departureDate={date}",
-        "KL": "https://www.klm.com/travel/ua_en/plan_and_book/book_a_flight/index.htm?origin={o}&destination={d}&departureDate={date}",
-        "AF": "https://wwws.airfrance.com.ua/search?origin={o}&destination={d}&outboundDate={date}",
-    }
-    if airline in AIRLINE_LINKS:
-        return AIRLINE_LINKS[airline].format(
-            o=origin,
-            d=destination,
-            date=date
-        )
-    return f"https://www.kayak.com/flights/{origin}-{destination}/{date}?sort=bestflight_a"
+@csrf_exempt
+def flight_price_calendar(request):
+    """Cheapest fare for every departure (and return) date within ±window days of the requested ones."""
+    if request.method != "POST":
+        return JsonResponse({'error': 'POST method required'}, status=405)
 
+    data = json.loads(request.body)
+    kwargs = flight_search_kwargs(data)
+    if not kwargs['originLocationCode'] or not kwargs['destinationLocationCode']:
+        return JsonResponse({'error': 'Origin and Destination are required'}, status=400)
+    try:
+        window = int(data.get('window', settings.PRICE_CALENDAR_DEFAULT_WINDOW))
+        window = min(max(window, 0), settings.PRICE_CALENDAR_MAX_WINDOW)
+        departure_dates = calendar_dates(kwargs['departureDate'], window)
+        return_dates = calendar_dates(kwargs['returnDate'], window) if kwargs.get('returnDate') else None
+    except (TypeError, ValueError):
+        return JsonResponse({'error': 'Departuredate/Returndate must be YYYY-MM-DD and window a number'},
+                            status=400)
 
-def get_flight_offers(**kwargs):
-    search_flights = amadeus.shopping.flight_offers_search.get(**kwargs)
-    flight_offers = []
-    for flight in search_flights.data:
-        offer = Flight(flight).construct_flights()
-        try:
-            first_segment = flight["itineraries"][0]["segments"][0]
-            last_segment = flight["itineraries"][0]["segments"][-1]
+    cells = price_calendar_cells(departure_dates, return_dates)
+    if not cells:
+        return JsonResponse({'error': 'No departure dates in the future'}, status=400)
 
-            airline = first_segment["carrierCode"]
-            origin = first_segment["departure"]["iataCode"]
-            final_destination = last_segment["arrival"]["iataCode"]
+    prices, missing = search_price_calendar(kwargs, cells)
+    return price_calendar_response(departure_dates, return_dates, prices, missing)
 
-            date = first_segment["departure"]["at"].split("T")[0]
 
-            offer["bookingLink"] = generate_booking_link(
-                airline,
-                origin,
-                final_destination,
-                date
-            )
+def calendar_dates(center, window):
+    day = date.fromisoformat(center)
+    return [(day + timedelta(days=offset)).isoformat() for offset in range(-window, window + 1)]
+
+
+def price_calendar_cells(departure_dates, return_dates):
+    """(departure, return) pairs worth searching: no past departures, no return before departure."""
+    today = date.today().isoformat()
+    return [
+        (departure, return_date)
+        for departure in departure_dates if departure >= today
+        for return_date in (return_dates or [None]) if return_date is None or return_date >= departure
+    ]
 
-        except Exception as e:
-            print("Could not generate booking link:", e)
-            offer["bookingLink"] = None
 
-        flight_offers.append(offer)
-    return flight_offers
+def search_price_calendar(kwargs, cells):
+    """Cheapest price per cell, searched on a bounded pool through the cached `get_flight_offers`.
+
+    Returns ({cell: price or None}, [cells that failed or did not finish in time]). Searches still
+    running at the deadline keep going and fill the cache for the next request.
+    """
+    workers = min(len(cells), settings.PRICE_CALENDAR_MAX_WORKERS)
+    pool = ThreadPoolExecutor(max_workers=workers)
+    futures = {}
+    for departure, return_date in cells:
+        cell_kwargs = {key: value for key, value in kwargs.items() if key != 'returnDate'}
+        cell_kwargs['departureDate'] = departure
+        if return_date:
+            cell_kwargs['returnDate'] = return_date
+        futures[departure, return_date] = pool.submit(get_flight_offers, **cell_kwargs)
+    wait(futures.values(), timeout=settings.PRICE_CALENDAR_TIMEOUT)
+    pool.shutdown(wait=False, cancel_futures=True)
+
+    prices = {}
+    missing = []
+    for cell, future in futures.items():
+        if future.done() and not future.cancelled() and future.exception() is None:
+            prices[cell] = min((float(offer['price']) for offer in future.result()), default=None)
+        else:
+            missing.append(cell)
+    return prices, missing
+
+
+def price_calendar_response(departure_dates, return_dates, prices, missing):
+    if return_dates:
+        matrix = [[prices.get((departure, return_date)) for return_date in return_dates]
+                  for departure in departure_dates]
+        per_day = [min((price for price in row if price is not None), default=None) for row in matrix]
+    else:
+        matrix = per_day = [prices.get((departure, None)) for departure in departure_dates]
+
+    priced = [(price, cell) for cell, price in prices.items() if price is not None]
+    cheapest = None
+    if priced:
+        price, (departure, return_date) = min(priced)
+        cheapest = {'departure_date': departure, 'return_date': return_date, 'price': price}
+
+    return JsonResponse({
+        'departure_dates': departure_dates,
+        'return_dates': return_dates,
+        'prices': matrix,
+        'cheapest_per_day': per_day,
+        'cheapest': cheapest,
+        'complete': not missing,
+        'missing': [list(cell) for cell in missing],
+    })
 
 
 def get_flight_price_metrics(**kwargs_metrics):
     kwargs_metrics['currencyCode'] = 'USD'
-    metrics = amadeus.analytics.itinerary_price_metrics.get(**kwargs_metrics)
+    metrics = gateway.request(PRICE_METRICS, get_amadeus().analytics.itinerary_price_metrics.get,
+                              **kwargs_metrics)
     return Metrics(metrics.data).construct_metrics()
 
 
+@api_view(['GET'])
+@permission_classes([AllowAny])
+def price_trend_view(request):
+    """Price trend of a flight route or hotel city from the locally stored search history."""
+    params = request.query_params
+    kind = params.get('kind', 'flight')
+    if kind == 'flight':
+        if not params.get('origin') or not params.get('destination'):
+            return Response({"error": "origin and destination are required"}, status=400)
+        route = flight_route(params['origin'], params['destination'])
+    elif kind == 'hotel':
+        if not params.get('city'):
+            return Response({"error": "city is required"}, status=400)
+        route = params['city'].upper()
+    else:
+        return Response({"error": "kind must be flight or hotel"}, status=400)
+
+    try:
+        travel_date = parse_date(params['date']) if params.get('date') else None
+        days = min(max(int(params.get('days', 30)), 1), 365)
+    except ValueError:
+        return Response({"error": "date must be YYYY-MM-DD and days a number"}, status=400)
+    round_trip = params.get('round_trip', '').lower() in ('1', 'true', 'yes')
+
+    trend = price_trend(kind, route, round_trip=round_trip, travel_date=travel_date, days=days)
+    trend.update({'kind': kind, 'route': route, 'round_trip': round_trip,
+                  'date': travel_date.isoformat() if travel_date else None})
+    return Response(trend)
+
+
 def get_trip_purpose(**kwargs_trip_purpose):
-    trip_purpose = amadeus.travel.predictions.trip_purpose.get(**kwargs_trip_purpose).data
+    trip_purpose = gateway.request(TRIP_PURPOSE, get_amadeus().travel.predictions.trip_purpose.get,
+                                   **kwargs_trip_purpose).data
     return trip_purpose['result']
 
 
@@ -221,21 +446,26 @@ def get_cheapest_flight_price(flight_offers):
 
 
 def build_price_metrics(flight_offers):
-    prices = [float(f["price"]) for f in flight_offers]
-    prices.sort()
+    # NumPy is loaded with the first search rather than at startup
+    from .price_stats import summarize
 
-    min_price = prices[0]
-    max_price = prices[-1]
+    metrics = summarize(float(f["price"]) for f in flight_offers)
+    if metrics is None:
+        return None
+    metrics["cheapest_flight"] = metrics["min"]
+    return metrics
 
-    n = len(prices)
 
-    cheapest = prices[0]
-
-    return {
-        "min": min_price,
-        "max": max_price,
-        "cheapest_flight": cheapest,
-    }
+def search_locations(term):
+    locations = get_airport_index().search(term)
+    if locations:
+        return locations
+    return gateway.request(
+        LOCATIONS,
+        get_amadeus().reference_data.locations.get,
+        keyword=term,
+        subType=ANY_LOCATION
+    ).data
 
 
 @csrf_exempt
@@ -244,13 +474,9 @@ def origin_airport_search(request):
     if not term:
         return JsonResponse([], safe=False)
     try:
-        amadeus_response = amadeus.reference_data.locations.get(
-            keyword=term,
-            subType=Location.ANY
-        ).data
-        result = get_city_airport_list(amadeus_response)
+        result = get_city_airport_list(search_locations(term))
         return JsonResponse(result, safe=False)
-    except ResponseError as e:
+    except (amadeus_client.ResponseError, RateLimited) as e:
         return JsonResponse([], safe=False)
 
 
@@ -260,13 +486,9 @@ def destination_airport_search(request):
     if not term:
         return JsonResponse([], safe=False)
     try:
-        amadeus_response = amadeus.reference_data.locations.get(
-            keyword=term,
-            subType=Location.ANY
-        ).data
-        result = get_city_airport_list(amadeus_response)
+        result = get_city_airport_list(search_locations(term))
         return JsonResponse(result, safe=False)
-    except ResponseError as e:
+    except (amadeus_client.ResponseError, RateLimited) as e:
         return JsonResponse([], safe=False)
 
 
@@ -280,6 +502,32 @@ def get_city_airport_list(amadeus_data):
     return result
 
 
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def cache_stats(request):
+    return Response({
+        'flight_offers': flight_search_cache.stats(),
+        'weather': weather_cache.stats(),
+        'trip_plans': plan_cache_stats(),
+        'catalog': catalog_cache.stats(),
+        'auth_users': user_cache.stats(),
+    })
+
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def upstream_stats(request):
+    return Response({'amadeus': gateway.stats()})
+
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def price_watch_stats(request):
+    from .price_watch import cycle_stats
+
+    return Response(cycle_stats())
+
+
 @api_view(['GET'])
 @permission_classes([AllowAny])
 def city_to_iata(request):
@@ -288,7 +536,9 @@ def city_to_iata(request):
         return Response({"error": "City is required"}, status=400)
 
     try:
-        response = amadeus.reference_data.locations.get(
+        response = gateway.request(
+            LOCATIONS,
+            get_amadeus().reference_data.locations.get,
             keyword=city_name,
             subType='CITY'
         )
@@ -298,14 +548,16 @@ def city_to_iata(request):
 
         iata_code = data[0]['iataCode']
         return Response({"iata": iata_code})
-    except ResponseError as e:
+    except RateLimited as e:
+        return Response({"error": e.body}, status=429)
+    except amadeus_client.ResponseError as e:
         return Response({"error": str(e)}, status=500)
 
 
-def generate_city_trip_plan(city_id, days=None, travel_goal=None, month=None, budget=None, style=None, company=None):
-    if not client:
-        raise Exception("Gemini Client wasn't initialized.")
+TRIP_PLAN_MODEL = "gemini-2.5-flash"
+
 
+def build_city_trip_prompt(city_id, days=None, travel_goal=None, month=None, budget=None, style=None, company=None):
     city = get_object_or_404(City.objects.select_related('country'), pk=city_id)
 
     user_preferences = []
@@ -350,13 +602,70 @@ def generate_city_trip_plan(city_id, days=None, travel_goal=None, month=None, bu
     - Use structured text with clear headers.
     - All content must be in English.
     """
+    return prompt
+
 
-    response = client.models.generate_content(
-        model="gemini-2.5-flash",
-        contents=prompt
-    )
+def generate_city_trip_plan(city_id, **preferences):
+    # identical (normalized) requests are answered from the plan cache instead of Gemini;
+    # the prompt itself is built from what the user asked for
+    cache_preferences = canonical_preferences(**preferences)
+    trip_plan = get_cached_plan(city_id, cache_preferences)
+    if trip_plan is not None:
+        return trip_plan
 
-    return response.text
+    prompt = build_city_trip_prompt(city_id, **preferences)
+    trip_plan = generate(TRIP_PLAN_MODEL, prompt)
+
+    store_plan(city_id, cache_preferences, trip_plan)
+    return trip_plan
+
+
+def stream_city_trip_plan(city_id, **preferences):
+    """Like generate_city_trip_plan, but yields the plan text chunk by chunk as Gemini produces it.
+
+    The city lookup happens before the first chunk is requested, so a missing city still raises here.
+    A cached plan is returned as a single chunk; a freshly generated one is cached once fully streamed.
+    """
+    cache_preferences = canonical_preferences(**preferences)
+    trip_plan = get_cached_plan(city_id, cache_preferences)
+    if trip_plan is not None:
+        return iter([trip_plan])
+
+    prompt = build_city_trip_prompt(city_id, **preferences)
+
+    def chunks():
+        parts = []
+        for text in generate_stream(TRIP_PLAN_MODEL, prompt):
+            parts.append(text)
+            yield text
+        store_plan(city_id, cache_preferences, "".join(parts))
+
+    return chunks()
+
+
+def server_sent_event(data, event=None):
+    message = f"event: {event}\n" if event else ""
+    return f"{message}data: {json.dumps(data)}\n\n"
+
+
+def trip_plan_events(chunks):
+    try:
+        for text in chunks:
+            yield server_sent_event({"text": text})
+    except GeminiError as e:
+        yield server_sent_event({"error": f"Couldn't generate: {e}"}, event="error")
+        return
+    except Exception as e:
+        yield server_sent_event({"error": f"Unknown error with server: {e}"}, event="error")
+        return
+    yield server_sent_event({}, event="done")
+
+
+def trip_plan_stream_response(chunks):
+    response = StreamingHttpResponse(trip_plan_events(chunks), content_type="text/event-stream")
+    response["Cache-Control"] = "no-cache"
+    response["X-Accel-Buffering"] = "no"
+    return response
 
 
 @api_view(['POST'])
@@ -370,23 +679,32 @@ def generate_city_trip_view(request):
         style = request.data.get('style')
         company = request.data.get('company')
 
+        stream = request.data.get('stream', request.query_params.get('stream'))
+
         if not city_id:
             return Response({"error": "You need to specify the city's id."}, status=status.HTTP_400_BAD_REQUEST)
 
+        preferences = {
+            'days': days,
+            'travel_goal': travel_goal,
+            'month': month,
+            'budget': budget,
+            'style': style,
+            'company': company,
+        }
+
         try:
-            trip_plan = generate_city_trip_plan(city_id=city_id,
-                                                days=days,
-                                                travel_goal=travel_goal,
-                                                month=month,
-                                                budget=budget,
-                                                style=style,
-                                                company=company)
+            # opt-in Server-Sent Events: one "data" event per chunk, then "done" (or "error")
+            if str(stream).lower() in ('1', 'true'):
+                return trip_plan_stream_response(stream_city_trip_plan(city_id, **preferences))
+
+            trip_plan = generate_city_trip_plan(city_id, **preferences)
 
             return Response({"trip": trip_plan}, status=status.HTTP_200_OK)
 
-        except City.DoesNotExist:
+        except (City.DoesNotExist, Http404):
             return Response({"error": "No city with such id."}, status=status.HTTP_404_NOT_FOUND)
-        except APIError as e:
+        except GeminiError as e:
             return Response(
                 {"error": f"Couldn't generate: {e}"},
                 status=status.HTTP_502_BAD_GATEWAY
@@ -403,70 +721,149 @@ def hotel_search(request):
     if request.method != "POST":
         return JsonResponse({"error": "POST required"}, status=405)
 
-    data = json.loads(request.body)
-
-    city_code = data.get("cityCode")
-    checkin = data.get("checkInDate")
-    checkout = data.get("checkOutDate")
-    num_of_guests = data.get("numOfGuests")
-
-    if not city_code or not checkin or not checkout or not num_of_guests:
+    params = hotel_search_params(json.loads(request.body))
+    if not all(params.values()):
         return JsonResponse({"error": "Missing params"}, status=400)
 
     try:
-        hotels = amadeus.reference_data.locations.hotels.by_city.get(
-            cityCode=city_code
+        hotels = gateway.request(
+            HOTELS_BY_CITY,
+            get_amadeus().reference_data.locations.hotels.by_city.get,
+            cityCode=params['cityCode']
         ).data
+    except RateLimited as e:
+        return JsonResponse({"error": e.body}, status=429)
+    except amadeus_client.ResponseError as e:
+        return JsonResponse({"error": e.response.body}, status=400)
 
-        hotel_ids = [h["hotelId"] for h in hotels[:25]]
+    chunks = chunk_hotel_ids(hotels)
+    results = search_hotel_offer_chunks(chunks, params)
+    record_hotel_search(params, results)
+    return hotel_offers_response(chunks, results)
 
-        offers = amadeus.shopping.hotel_offers_search.get(
-            hotelIds=hotel_ids,
-            checkInDate=checkin,
-            checkOutDate=checkout,
-            adults=num_of_guests
-        ).data
 
-        results = []
-        prices = []
-        if not offers:
-            return JsonResponse({
-                "hotels": [],
-                "message": "No hotel offers found for this city and dates."
-            })
-        for h in offers:
-            hotel = h["hotel"]
-            for offer in h["offers"]:
-                price = float(offer["price"]["total"])
-                prices.append(price)
-
-                results.append({
-                    "hotelId": hotel["hotelId"],
-                    "name": hotel["name"],
-                    "city": hotel["cityCode"],
-                    "price": price,
-                    "currency": offer["price"]["currency"],
-                    "offerId": offer["id"],
-                    "bookingLink": f"https://www.booking.com/searchresults.html?ss={hotel['name']}"
-                })
-
-        prices.sort()
-
-        metrics = {
-            "min": min(prices),
-            "max": max(prices),
-            "first": prices[len(prices) // 4],
-            "third": prices[len(prices) * 3 // 4],
-            "cheapest": prices[0]
+def fetch_hotel_offers(hotel_ids, params):
+    return gateway.request(
+        HOTEL_OFFERS,
+        get_amadeus().shopping.hotel_offers_search.get,
+        hotelIds=hotel_ids,
+        checkInDate=params['checkInDate'],
+        checkOutDate=params['checkOutDate'],
+        adults=params['adults']
+    ).data
+
+
+def search_hotel_offer_chunks(chunks, params):
+    """Price every chunk on a bounded thread pool; returns one offers list or exception per chunk.
+
+    Each chunk gets HOTEL_OFFERS_CHUNK_TIMEOUT seconds from the latest it can start (the pool runs
+    `workers` chunks per wave), so one slow chunk cannot use up the time of the ones queued behind it.
+    """
+    if not chunks:
+        return []
+
+    workers = min(len(chunks), settings.HOTEL_OFFERS_MAX_WORKERS)
+    start = time.monotonic()
+
+    pool = ThreadPoolExecutor(max_workers=workers)
+    futures = [pool.submit(fetch_hotel_offers, chunk, params) for chunk in chunks]
+    results = []
+    for index, future in enumerate(futures):
+        deadline = start + settings.HOTEL_OFFERS_CHUNK_TIMEOUT * (index // workers + 1)
+        try:
+            results.append(future.result(timeout=max(0.0, deadline - time.monotonic())))
+        except FutureTimeoutError:
+            future.cancel()
+            results.append(TimeoutError())
+        except Exception as e:
+            results.append(e)
+    pool.shutdown(wait=False, cancel_futures=True)
+    return results
+
+
+def chunk_hotel_ids(hotels):
+    hotel_ids = [h["hotelId"] for h in hotels[:settings.HOTEL_SEARCH_MAX_HOTELS]]
+    size = settings.HOTEL_OFFERS_CHUNK_SIZE
+    return [hotel_ids[i:i + size] for i in range(0, len(hotel_ids), size)]
+
+
+def hotel_chunk_error(e):
+    if isinstance(e, TimeoutError):
+        return "timed out"
+    if isinstance(e, amadeus_client.ResponseError):
+        return e.response.body
+    return getattr(e, 'body', None) or str(e)
+
+
+def hotel_offers_response(chunks, results):
+    offers = []
+    failed_chunks = []
+    for index, (chunk, result) in enumerate(zip(chunks, results)):
+        if isinstance(result, BaseException):
+            failed_chunks.append({"chunk": index, "hotelIds": chunk, "error": hotel_chunk_error(result)})
+        else:
+            offers.extend(result or [])
+
+    if failed_chunks and len(failed_chunks) == len(chunks):
+        return JsonResponse({"error": failed_chunks[0]["error"], "failed_chunks": failed_chunks}, status=400)
+
+    response = build_hotel_offers(offers)
+    response["chunks"] = len(chunks)
+    response["failed_chunks"] = failed_chunks
+    return JsonResponse(response)
+
+
+def hotel_search_params(data):
+    return {
+        'cityCode': data.get("cityCode"),
+        'checkInDate': data.get("checkInDate"),
+        'checkOutDate': data.get("checkOutDate"),
+        'adults': data.get("numOfGuests"),
+    }
+
+
+def build_hotel_offers(offers):
+    results = []
+    prices = []
+    if not offers:
+        return {
+            "hotels": [],
+            "message": "No hotel offers found for this city and dates."
         }
+    # one cache query for the page's addresses; OSM only for a few uncached ones
+    addresses = {
+        hotel["hotelID"]: hotel.get("address")
+        for hotel in Hotel.construct_hotels(offers, max_online=settings.HOTEL_SEARCH_MAX_ONLINE_GEOCODES)
+        if "hotelID" in hotel
+    }
+    for h in offers:
+        hotel = h["hotel"]
+        for offer in h["offers"]:
+            price = float(offer["price"]["total"])
+            prices.append(price)
+
+            results.append({
+                "hotelId": hotel["hotelId"],
+                "name": hotel["name"],
+                "city": hotel["cityCode"],
+                "address": addresses.get(hotel["hotelId"]),
+                "price": price,
+                "currency": offer["price"]["currency"],
+                "offerId": offer["id"],
+                "bookingLink": f"https://www.booking.com/searchresults.html?ss={hotel['name']}"
+            })
 
-        return JsonResponse({
-            "hotels": results,
-            "metrics": metrics
-        })
+    from .price_stats import summarize
 
-    except ResponseError as e:
-        return JsonResponse({"error": e.response.body}, status=400)
+    # offers can come back without a usable price, which leaves nothing to summarize
+    metrics = summarize(prices)
+    if metrics is not None:
+        metrics["cheapest"] = metrics["min"]
+
+    return {
+        "hotels": results,
+        "metrics": metrics
+    }
 
 
 class SaveTripView(APIView):
@@ -482,3 +879,58 @@ class SaveTripView(APIView):
 
         SavedTrip.objects.create(user=user, city=city, trip_plan=trip_plan)
         return Response({'success': True})
+
+
+class PriceWatchListView(generics.ListCreateAPIView):
+    serializer_class = PriceWatchSerializer
+    permission_classes = [IsAuthenticated]
+
+    def get_queryset(self):
+        return PriceWatch.objects.filter(user=self.request.user).order_by('departure_date', 'id')
+
+    def perform_create(self, serializer):
+        serializer.save(user=self.request.user)
+
+
+class PriceWatchDetailView(generics.RetrieveUpdateDestroyAPIView):
+    serializer_class = PriceWatchSerializer
+    permission_classes = [IsAuthenticated]
+
+    def get_queryset(self):
+        return PriceWatch.objects.filter(user=self.request.user)
+
+
+class CatalogImportView(APIView):
+    """Bulk import countries/cities from uploaded CSV/JSONL/JSON files (`countries`, `cities`) or JSON lists.
+
+    Rows are inserted right away; cities without coordinates are geocoded in the background
+    and the returned import can be polled for progress.
+    """
+    permission_classes = [IsAdminUser]
+
+    def post(self, request):
+        records = {}
+        try:
+            for kind in ('countries', 'cities'):
+                upload = request.FILES.get(kind)
+                if upload is not None:
+                    records[kind] = read_records(upload, upload.name)
+                elif isinstance(request.data.get(kind), list):
+                    records[kind] = request.data[kind]
+        except (ValueError, UnicodeDecodeError) as e:
+            return Response({'error': f'Could not parse file: {e}'}, status=status.HTTP_400_BAD_REQUEST)
+
+        if not records:
+            return Response({'error': 'Send countries and/or cities.'}, status=status.HTTP_400_BAD_REQUEST)
+
+        job = import_catalog(records.get('countries', ()), records.get('cities', ()))
+        start_geocoding(job)
+        return Response(CatalogImportSerializer(job).data, status=status.HTTP_202_ACCEPTED)
+
+
+class CatalogImportDetailView(APIView):
+    permission_classes = [IsAdminUser]
+
+    def get(self, request, import_id):
+        job = get_object_or_404(CatalogImport, pk=import_id)
+        return Response(CatalogImportSerializer(job).data)
@@ -1,6 +1,6 @@
 from django.contrib import admin
 
-from users.models import CustomUser
+from users.models import CustomUser, OutboxEmail
 
 
 # Register your models here.
@@ -8,4 +8,10 @@ from users.models import CustomUser
 @admin.register(CustomUser)
 class UserAdmin(admin.ModelAdmin):
     list_display = ('id','username', 'email', 'is_active', 'is_email_verified', 'is_staff')
-    search_fields = ('username', 'email')
\ No newline at end of file
+    search_fields = ('username', 'email')
+
+
+@admin.register(OutboxEmail)
+class OutboxEmailAdmin(admin.ModelAdmin):
+    list_display = ('id', 'subject', 'to', 'status', 'attempts', 'next_attempt_at', 'sent_at')
+    list_filter = ('status',)
@@ -0,0 +1,78 @@
+"""JWT authentication that serves the user from a short-lived cache instead of the database.
+
+Tokens are verified as usual; only the user lookup is cached (in Redis when configured, see
+trips.cache) for AUTH_USER_CACHE_TTL seconds, or AUTH_USER_LOCAL_CACHE_TTL without Redis, where
+invalidation only reaches the worker that made the change. The entry holds what the authentication
+and permission checks and the /protected/ and /profile/ responses read (CACHED_FIELDS), plus the
+digest of the password hash that CHECK_REVOKE_TOKEN compares with the token; never the hash itself.
+request.user loads any other field from the database when it is first read, and views that change
+the user reload it first, so a stale entry is never written back.
+users.signals drops a user's entry whenever the user is saved or deleted.
+"""
+from django.db import DEFAULT_DB_ALIAS
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.utils import get_md5_hash_password
+
+from TravellinoCappuchino import settings
+from trips.cache import ResultCache
+
+user_cache = ResultCache('auth_user', ttl=settings.AUTH_USER_CACHE_TTL, local_ttl=settings.AUTH_USER_LOCAL_CACHE_TTL)
+
+CACHED_FIELDS = ['id', 'is_active', 'is_staff', 'is_superuser', 'email', 'first_name', 'last_name', 'phone',
+                 'is_email_verified']
+
+
+def user_cache_params(user_id):
+    return {'user_id': str(user_id)}
+
+
+def dump_user(user):
+    data = {field: getattr(user, field) for field in CACHED_FIELDS}
+    data['password_hash'] = get_md5_hash_password(user.password)
+    return data
+
+
+def load_user(model, data):
+    """A user with only CACHED_FIELDS loaded (the rest are deferred), or None for an entry of another shape."""
+    if set(data) != {*CACHED_FIELDS, 'password_hash'}:
+        return None
+    # from_db() takes the values in the model's field order
+    fields = [field.attname for field in model._meta.concrete_fields if field.attname in CACHED_FIELDS]
+    return model.from_db(DEFAULT_DB_ALIAS, fields, [data[field] for field in fields])
+
+
+def invalidate_cached_user(user_id):
+    user_cache.delete(user_cache_params(user_id))
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    def get_user(self, validated_token):
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError as e:
+            raise InvalidToken(_("Token contained no recognizable user identification")) from e
+
+        data = user_cache.get(user_cache_params(user_id))
+        user = load_user(self.user_model, data) if data is not None else None
+        if user is None:
+            try:
+                user = self.user_model.objects.get(**{api_settings.USER_ID_FIELD: user_id})
+            except self.user_model.DoesNotExist as e:
+                raise AuthenticationFailed(_("User not found"), code="user_not_found") from e
+            data = dump_user(user)
+            user_cache.set(user_cache_params(user_id), data)
+
+        # the same checks as JWTAuthentication.get_user, against the cached entry
+        if api_settings.CHECK_USER_IS_ACTIVE and not user.is_active:
+            raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+        if api_settings.CHECK_REVOKE_TOKEN:
+            password_hash = validated_token.get(api_settings.REVOKE_TOKEN_CLAIM)
+            # tokens issued before CHECK_REVOKE_TOKEN was turned on have no claim to compare
+            if password_hash is None and settings.AUTH_ACCEPT_TOKENS_WITHOUT_REVOKE_CLAIM:
+                return user
+            if password_hash != data['password_hash']:
+                raise AuthenticationFailed(_("The user's password has been changed."), code="password_changed")
+        return user
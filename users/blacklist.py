@@ -0,0 +1,167 @@
+"""Refresh token blacklist in Redis, fronted by an in-process Bloom filter.
+
+Each blacklisted jti is a Redis key that expires with its token, and is also appended to a log
+(a sorted set scored by when it was added). Every process keeps a Bloom filter of the logged jtis,
+catching up on the log at most every TOKEN_BLACKLIST_SYNC_INTERVAL seconds, so most lookups (tokens
+that were never blacklisted) answer without asking Redis; only filter hits are confirmed there.
+Without Redis (or when a write to it fails) the blacklist is a dict in this process.
+"""
+import hashlib
+import logging
+import math
+import threading
+import time
+
+from rest_framework_simplejwt.settings import api_settings
+
+from TravellinoCappuchino import settings
+from trips.cache import get_redis
+
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX = 'token_blacklist:jti:'
+LOG_KEY = 'token_blacklist:log'
+# log entries are scored with the writer's clock; re-read this far back in case clocks disagree
+CLOCK_SKEW_MS = 5000
+
+
+class BloomFilter:
+    def __init__(self, capacity, error_rate):
+        self.capacity = capacity
+        self.size = max(64, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def positions(self, key):
+        # double hashing: k positions from the two halves of one digest
+        digest = hashlib.blake2b(key.encode(), digest_size=16).digest()
+        first = int.from_bytes(digest[:8], 'little')
+        second = int.from_bytes(digest[8:], 'little') | 1
+        return [(first + i * second) % self.size for i in range(self.hashes)]
+
+    def add(self, key):
+        for position in self.positions(key):
+            self.bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, key):
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self.positions(key))
+
+
+class TokenBlacklist:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._filter = None
+        self._built_at = 0.0
+        self._synced_at = 0.0
+        self._cursor = 0
+        # jtis already in the filter from the last CLOCK_SKEW_MS of the log, which the next sync reads again
+        self._recent = {}
+        self._local = {}
+
+    def new_filter(self):
+        return BloomFilter(settings.TOKEN_BLACKLIST_BLOOM_CAPACITY, settings.TOKEN_BLACKLIST_BLOOM_ERROR_RATE)
+
+    def add_local(self, jti, exp):
+        with self._lock:
+            now = time.time()
+            self._local = {key: expires for key, expires in self._local.items() if expires > now}
+            self._local[jti] = exp
+
+    def in_local(self, jti):
+        exp = self._local.get(jti)
+        return exp is not None and exp > time.time()
+
+    def add(self, jti, exp):
+        ttl = int(exp - time.time())
+        if ttl <= 0:
+            return
+        redis_client = get_redis()
+        if redis_client is None:
+            self.add_local(jti, exp)
+            return
+
+        now_ms = int(time.time() * 1000)
+        max_age_ms = int(api_settings.REFRESH_TOKEN_LIFETIME.total_seconds() * 1000)
+        try:
+            pipe = redis_client.pipeline()
+            pipe.set(KEY_PREFIX + jti, 1, ex=ttl)
+            pipe.zadd(LOG_KEY, {jti: now_ms})
+            # anything logged longer than a refresh token lives ago has expired
+            pipe.zremrangebyscore(LOG_KEY, '-inf', now_ms - max_age_ms - CLOCK_SKEW_MS)
+            pipe.execute()
+        except Exception as e:
+            # still refused by this process; the other workers cannot know about it
+            logger.warning("Could not blacklist token in Redis: %s", e)
+            self.add_local(jti, exp)
+            return
+        with self._lock:
+            if self._filter is not None and jti not in self._recent:
+                self._filter.add(jti)
+                self._recent[jti] = now_ms
+
+    def sync(self, redis_client):
+        """Bring the Bloom filter up to date with the log (rebuilt from scratch when full or old)."""
+        now = time.monotonic()
+        if self._filter is not None and now - self._synced_at < settings.TOKEN_BLACKLIST_SYNC_INTERVAL:
+            return
+        with self._lock:
+            if self._filter is not None and now - self._synced_at < settings.TOKEN_BLACKLIST_SYNC_INTERVAL:
+                return
+            rebuild = (self._filter is None or self._filter.count > self._filter.capacity
+                       or now - self._built_at > settings.TOKEN_BLACKLIST_REBUILD_INTERVAL)
+            start = '-inf' if rebuild else self._cursor - CLOCK_SKEW_MS
+            entries = redis_client.zrangebyscore(LOG_KEY, start, '+inf', withscores=True)
+            bloom = self.new_filter() if rebuild else self._filter
+            cursor = 0 if rebuild else self._cursor
+            seen = {} if rebuild else self._recent
+            for jti, score in entries:
+                jti = jti.decode() if isinstance(jti, bytes) else jti
+                if jti not in seen:
+                    bloom.add(jti)
+                seen[jti] = int(score)
+                cursor = max(cursor, int(score))
+            if rebuild:
+                self._built_at = now
+            self._filter = bloom
+            self._cursor = cursor
+            self._recent = {jti: score for jti, score in seen.items() if score >= cursor - CLOCK_SKEW_MS}
+            self._synced_at = now
+
+    def __contains__(self, jti):
+        if self.in_local(jti):
+            return True
+        redis_client = get_redis()
+        if redis_client is None:
+            return False
+
+        try:
+            self.sync(redis_client)
+        except Exception as e:
+            logger.warning("Token blacklist sync failed: %s", e)
+        if self._filter is None:
+            # no filter to go by: ask Redis directly, and let the token through if it cannot answer
+            return self.confirm(redis_client, jti, unavailable=False)
+        if jti not in self._filter:
+            return False
+        # a filter hit that cannot be confirmed is refused rather than let through
+        return self.confirm(redis_client, jti, unavailable=True)
+
+    def confirm(self, redis_client, jti, unavailable):
+        try:
+            return bool(redis_client.exists(KEY_PREFIX + jti))
+        except Exception as e:
+            logger.warning("Token blacklist lookup failed: %s", e)
+            return unavailable
+
+    def reset(self):
+        with self._lock:
+            self._filter = None
+            self._synced_at = 0.0
+            self._cursor = 0
+            self._recent.clear()
+            self._local.clear()
+
+
+token_blacklist = TokenBlacklist()
@@ -0,0 +1,68 @@
+from datetime import timezone as dt_timezone
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from users.blacklist import token_blacklist
+
+OUTSTANDING = 'token_blacklist_outstandingtoken'
+BLACKLISTED = 'token_blacklist_blacklistedtoken'
+
+
+class Command(BaseCommand):
+    help = ("Prune simplejwt's outstanding/blacklisted token tables in batches, after copying the blacklisted "
+            "tokens that have not expired yet into the Redis blacklist (users.blacklist).")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--all', action='store_true',
+                            help="Also delete tokens that have not expired (once copied, the tables are unused).")
+
+    def handle(self, *args, **options):
+        if not {OUTSTANDING, BLACKLISTED} <= set(connection.introspection.table_names()):
+            self.stdout.write("No token blacklist tables, nothing to prune.")
+            return
+
+        now = timezone.now()
+        copied = self.copy_blacklist(now, options['batch_size'])
+        deleted = self.prune(None if options['all'] else now, options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f"Copied {copied} blacklisted tokens, deleted {deleted} tokens."))
+
+    def copy_blacklist(self, now, batch_size):
+        copied = 0
+        last_id = 0
+        while True:
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    f"SELECT o.id, o.jti, o.expires_at FROM {OUTSTANDING} o JOIN {BLACKLISTED} b ON b.token_id = o.id "
+                    f"WHERE o.id > %s AND o.expires_at > %s ORDER BY o.id LIMIT %s",
+                    [last_id, now, batch_size],
+                )
+                rows = cursor.fetchall()
+            if not rows:
+                return copied
+            for token_id, jti, expires_at in rows:
+                if isinstance(expires_at, str):
+                    # SQLite returns the stored UTC text
+                    expires_at = parse_datetime(expires_at).replace(tzinfo=dt_timezone.utc)
+                token_blacklist.add(jti, expires_at.timestamp())
+            copied += len(rows)
+            last_id = rows[-1][0]
+
+    def prune(self, expired_before, batch_size):
+        """Delete outstanding tokens (expired before `expired_before`, or all) and their blacklist rows."""
+        deleted = 0
+        condition, params = ("WHERE expires_at < %s", [expired_before]) if expired_before else ("", [])
+        while True:
+            with transaction.atomic(), connection.cursor() as cursor:
+                cursor.execute(f"SELECT id FROM {OUTSTANDING} {condition} ORDER BY id LIMIT %s", params + [batch_size])
+                ids = [row[0] for row in cursor.fetchall()]
+                if not ids:
+                    return deleted
+                placeholders = ', '.join(['%s'] * len(ids))
+                cursor.execute(f"DELETE FROM {BLACKLISTED} WHERE token_id IN ({placeholders})", ids)
+                cursor.execute(f"DELETE FROM {OUTSTANDING} WHERE id IN ({placeholders})", ids)
+            deleted += len(ids)
+            self.stdout.write(f"Deleted {deleted} tokens so far")
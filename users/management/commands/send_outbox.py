@@ -0,0 +1,23 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from TravellinoCappuchino import settings
+from users.outbox import drain_outbox
+
+
+class Command(BaseCommand):
+    help = "Send queued emails, polling the outbox every --interval seconds."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--interval', type=float, default=settings.OUTBOX_POLL_INTERVAL)
+        parser.add_argument('--once', action='store_true', help="Send what is due now and exit.")
+
+    def handle(self, *args, **options):
+        while True:
+            sent, failed = drain_outbox()
+            if sent or failed:
+                self.stdout.write(f"Sent {sent} emails, {failed} failed and will be retried or given up.")
+            if options['once']:
+                return
+            time.sleep(options['interval'])
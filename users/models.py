@@ -3,7 +3,6 @@ import logging
 from django.contrib.auth.base_user import BaseUserManager
 from django.contrib.auth.models import AbstractUser
 from django.contrib.auth.tokens import default_token_generator
-from django.core.mail import send_mail
 from django.core.validators import RegexValidator
 from django.db import models
 from django.urls import reverse
@@ -59,12 +58,12 @@ class CustomUser(AbstractUser):
             reverse('users:verify-email', kwargs={'uidb64': uid, 'token': token})
         )
 
-        send_mail(
+        from .outbox import enqueue_email
+
+        enqueue_email(
             subject='Verify your email',
-            message=f'Almost done! Click the link to verify your email: {activation_link}',
-            from_email='noreply@yoursite.com',
-            recipient_list=[self.email],
-            fail_silently=False,
+            body=f'Almost done! Click the link to verify your email: {activation_link}',
+            to=[self.email],
         )
 
 
@@ -79,3 +78,29 @@ class CustomUser(AbstractUser):
     def __str__(self):
         return self.first_name
 
+
+class OutboxEmail(models.Model):
+    """An email waiting to be sent by `manage.py send_outbox` (see users.outbox)."""
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('sent', 'Sent'),
+        ('failed', 'Failed'),
+    ]
+
+    subject = models.CharField(max_length=255)
+    body = models.TextField()
+    from_email = models.CharField(max_length=255)
+    to = models.JSONField(default=list)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending')
+    attempts = models.PositiveSmallIntegerField(default=0)
+    # when a pending email is due; while a worker is sending it, when its claim runs out
+    next_attempt_at = models.DateTimeField()
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [models.Index(fields=["status", "next_attempt_at"])]
+
+    def __str__(self):
+        return f"{self.subject} -> {', '.join(self.to)} ({self.status})"
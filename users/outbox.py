@@ -0,0 +1,103 @@
+"""Email outbox: requests only insert an OutboxEmail row; `manage.py send_outbox` sends them.
+
+The worker claims a batch of due emails, sends it over one mail connection and reschedules the
+ones that failed with exponential backoff, until OUTBOX_MAX_ATTEMPTS is reached.
+"""
+import logging
+import random
+from datetime import timedelta
+
+from django.core.mail import EmailMessage, get_connection
+from django.db import transaction
+from django.utils import timezone
+
+from TravellinoCappuchino import settings
+from .models import OutboxEmail
+
+logger = logging.getLogger(__name__)
+
+
+def enqueue_email(subject, body, to, from_email=None):
+    return OutboxEmail.objects.create(
+        subject=subject,
+        body=body,
+        to=list(to),
+        from_email=from_email or settings.DEFAULT_FROM_EMAIL,
+        next_attempt_at=timezone.now(),
+    )
+
+
+def retry_delay(attempts):
+    """Exponential backoff with jitter, capped at OUTBOX_RETRY_MAX seconds."""
+    delay = min(settings.OUTBOX_RETRY_BASE * 2 ** (attempts - 1), settings.OUTBOX_RETRY_MAX)
+    return timedelta(seconds=delay * random.uniform(0.8, 1.2))
+
+
+def claim_batch(size=None):
+    """Due pending emails, pushed OUTBOX_CLAIM_TIMEOUT into the future so other workers skip them."""
+    now = timezone.now()
+    with transaction.atomic():
+        emails = list(
+            OutboxEmail.objects.select_for_update(skip_locked=True)
+            .filter(status='pending', next_attempt_at__lte=now)
+            .order_by('next_attempt_at')[:size or settings.OUTBOX_BATCH_SIZE]
+        )
+        # a worker that dies mid-batch leaves its emails to be picked up again after the claim runs out
+        OutboxEmail.objects.filter(pk__in=[email.pk for email in emails]).update(
+            next_attempt_at=now + timedelta(seconds=settings.OUTBOX_CLAIM_TIMEOUT)
+        )
+    return emails
+
+
+def send_batch(emails):
+    """Send `emails` over one connection; returns the number sent."""
+    sent = []
+    failed = []
+    try:
+        with get_connection() as connection:
+            for email in emails:
+                message = EmailMessage(subject=email.subject, body=email.body, from_email=email.from_email,
+                                       to=email.to)
+                try:
+                    connection.send_messages([message])
+                except Exception as e:
+                    email.last_error = str(e)
+                    failed.append(email)
+                else:
+                    sent.append(email)
+    except Exception as e:
+        # the connection could not be opened (or closed cleanly); whatever was not sent is retried
+        logger.warning("Mail connection failed: %s", e)
+        done = {email.pk for email in sent + failed}
+        for email in emails:
+            if email.pk not in done:
+                email.last_error = str(e)
+                failed.append(email)
+
+    now = timezone.now()
+    for email in sent:
+        email.status = 'sent'
+        email.attempts += 1
+        email.sent_at = now
+        email.last_error = ''
+    for email in failed:
+        email.attempts += 1
+        if email.attempts >= settings.OUTBOX_MAX_ATTEMPTS:
+            email.status = 'failed'
+            logger.error("Giving up on email %s to %s: %s", email.pk, email.to, email.last_error)
+        else:
+            email.next_attempt_at = now + retry_delay(email.attempts)
+    OutboxEmail.objects.bulk_update(sent + failed, ['status', 'attempts', 'sent_at', 'next_attempt_at', 'last_error'])
+    return len(sent)
+
+
+def drain_outbox():
+    """Send batches until nothing is due; returns (sent, failed attempts)."""
+    sent = failed = 0
+    while True:
+        emails = claim_batch()
+        if not emails:
+            return sent, failed
+        batch_sent = send_batch(emails)
+        sent += batch_sent
+        failed += len(emails) - batch_sent
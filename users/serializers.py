@@ -1,8 +1,12 @@
 from django.contrib.auth import get_user_model
+from django.contrib.auth.models import update_last_login
 from django.core.validators import validate_email
 from rest_framework import serializers
-from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
-from rest_framework_simplejwt.views import TokenObtainPairView
+from rest_framework_simplejwt.serializers import TokenObtainPairSerializer, TokenRefreshSerializer
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
+
+from .tokens import RefreshToken
 
 CustomUser = get_user_model()
 
@@ -56,6 +60,8 @@ class RegisterSerializer(serializers.ModelSerializer):
         return user
 
 class CustomTokenObtainPairSerializer(TokenObtainPairSerializer):
+    token_class = RefreshToken
+
     def validate(self, attrs):
         email = attrs.get('email') or attrs.get('username')  # фронт може прислати email
         password = attrs.get('password')
@@ -63,9 +69,12 @@ class CustomTokenObtainPairSerializer(TokenObtainPairSerializer):
         if not email or not password:
             raise serializers.ValidationError({'non_field_errors': ['Email and password required']})
 
+        # one query and one password hash: super().validate() would authenticate() all over again
         try:
             user = CustomUser.objects.get(email=email)
         except CustomUser.DoesNotExist:
+            # hash anyway, so an unknown email takes as long as a wrong password (as ModelBackend does)
+            CustomUser().set_password(password)
             raise serializers.ValidationError({'non_field_errors': ['Invalid email or password']})
 
         if not user.check_password(password):
@@ -74,7 +83,11 @@ class CustomTokenObtainPairSerializer(TokenObtainPairSerializer):
         if not user.is_active:
             raise serializers.ValidationError({'non_field_errors': ['User account is disabled.']})
 
-        data = super().validate(attrs)
+        self.user = user
+        refresh = self.get_token(user)
+        data = {'refresh': str(refresh), 'access': str(refresh.access_token)}
+        if api_settings.UPDATE_LAST_LOGIN:
+            update_last_login(None, user)
 
         data['user'] = {
             'id': self.user.id,
@@ -89,8 +102,17 @@ class CustomTokenObtainPairView(TokenObtainPairView):
     serializer_class = CustomTokenObtainPairSerializer
 
 
+class CustomTokenRefreshSerializer(TokenRefreshSerializer):
+    token_class = RefreshToken
+
+
+class CustomTokenRefreshView(TokenRefreshView):
+    serializer_class = CustomTokenRefreshSerializer
+
+
 class ProfileSerializer(serializers.ModelSerializer):
     class Meta:
         model = CustomUser
         fields = ['email', 'first_name', 'last_name', 'phone', 'is_email_verified', 'password']
         read_only_fields = ['is_email_verified', 'email']
+        extra_kwargs = {'password': {'write_only': True}}
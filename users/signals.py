@@ -0,0 +1,13 @@
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from .authentication import invalidate_cached_user
+from .models import CustomUser
+
+
+@receiver([post_save, post_delete], sender=CustomUser)
+def user_changed(sender, instance, **kwargs):
+    # after commit, so a concurrent request cannot cache the old row again in between
+    user_id = instance.pk
+    transaction.on_commit(lambda: invalidate_cached_user(user_id))
@@ -1,3 +1,381 @@
+import time
+import uuid
+from datetime import timedelta
+from unittest import mock
+
+from django.core import mail
 from django.test import TestCase
+from django.utils import timezone
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.settings import api_settings
+
+from TravellinoCappuchino import settings
+from .authentication import user_cache, user_cache_params
+from .blacklist import BloomFilter, TokenBlacklist, KEY_PREFIX, token_blacklist
+from .models import CustomUser, OutboxEmail
+from .outbox import enqueue_email, claim_batch, send_batch, drain_outbox
+from .tokens import RefreshToken
+
+
+def create_user(email='user@example.com', phone='+380000000001', password='passw0rd-123'):
+    return CustomUser.objects.create_user(email=email, phone=phone, password=password,
+                                          first_name='Ann', last_name='Lee', is_active=True)
+
+
+class BrokenConnection:
+    def __init__(self, *args, **kwargs):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def send_messages(self, messages):
+        raise ConnectionError('smtp down')
+
+
+class FakeRedis:
+    """The few Redis commands the token blacklist uses, with expiring keys and sorted sets."""
+
+    def __init__(self):
+        self.keys = {}
+        self.sorted_sets = {}
+        self.exists_calls = 0
+
+    def pipeline(self):
+        return FakePipeline(self)
+
+    def set(self, key, value, ex=None):
+        self.keys[key] = (value, time.time() + ex if ex else None)
+
+    def exists(self, key):
+        self.exists_calls += 1
+        value = self.keys.get(key)
+        return int(value is not None and (value[1] is None or value[1] > time.time()))
+
+    def zadd(self, key, mapping):
+        self.sorted_sets.setdefault(key, {}).update(mapping)
+
+    def zremrangebyscore(self, key, low, high):
+        entries = self.sorted_sets.get(key, {})
+        for member, score in list(entries.items()):
+            if float(low) <= score <= float(high):
+                del entries[member]
+
+    def zrangebyscore(self, key, low, high, withscores=False):
+        entries = sorted(self.sorted_sets.get(key, {}).items(), key=lambda item: item[1])
+        return [(member.encode(), float(score)) for member, score in entries if float(low) <= score <= float(high)]
+
+
+class FakePipeline:
+    def __init__(self, redis_client):
+        self.redis_client = redis_client
+        self.calls = []
+
+    def __getattr__(self, name):
+        return lambda *args, **kwargs: self.calls.append((name, args, kwargs))
+
+    def execute(self):
+        return [getattr(self.redis_client, name)(*args, **kwargs) for name, args, kwargs in self.calls]
+
+
+class BrokenRedis(FakeRedis):
+    def pipeline(self):
+        raise ConnectionError('redis down')
+
+    def exists(self, key):
+        raise ConnectionError('redis down')
+
+    def zrangebyscore(self, *args, **kwargs):
+        raise ConnectionError('redis down')
+
+
+class OutboxTests(TestCase):
+    def test_registration_only_queues_the_verification_email(self):
+        response = APIClient().post('/register/', {
+            'first_name': 'Ann', 'last_name': 'Lee', 'email': 'ann@example.com', 'phone': '+380000000001',
+            'password': 'passw0rd-123', 'password_check': 'passw0rd-123',
+        }, format='json')
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(mail.outbox, [])
+        email = OutboxEmail.objects.get()
+        self.assertEqual((email.to, email.status), (['ann@example.com'], 'pending'))
+        self.assertTrue(CustomUser.objects.filter(email='ann@example.com').exists())
+
+    def test_claim_hides_emails_from_other_workers(self):
+        email = enqueue_email('Hi', 'Body', ['a@example.com'])
+
+        self.assertEqual([claimed.pk for claimed in claim_batch()], [email.pk])
+        self.assertEqual(claim_batch(), [])
+        email.refresh_from_db()
+        self.assertGreater(email.next_attempt_at, timezone.now())
+
+    def test_not_due_emails_are_not_claimed(self):
+        enqueue_email('Hi', 'Body', ['a@example.com'])
+        OutboxEmail.objects.update(next_attempt_at=timezone.now() + timedelta(minutes=5))
+
+        self.assertEqual(claim_batch(), [])
+
+    def test_sent_emails_are_marked_sent(self):
+        enqueue_email('Hi', 'Body', ['a@example.com'])
+        enqueue_email('Hello', 'Body', ['b@example.com'])
+
+        self.assertEqual(drain_outbox(), (2, 0))
+
+        self.assertEqual(len(mail.outbox), 2)
+        self.assertEqual(set(OutboxEmail.objects.values_list('status', 'attempts')), {('sent', 1)})
+
+    @mock.patch('users.outbox.get_connection', BrokenConnection)
+    def test_failed_email_is_retried_later(self):
+        email = enqueue_email('Hi', 'Body', ['a@example.com'])
+
+        self.assertEqual(send_batch(claim_batch()), 0)
+
+        email.refresh_from_db()
+        self.assertEqual((email.status, email.attempts, email.last_error), ('pending', 1, 'smtp down'))
+        self.assertGreater(email.next_attempt_at, timezone.now())
+        self.assertEqual(claim_batch(), [])
+
+    @mock.patch('users.outbox.get_connection', side_effect=ConnectionRefusedError('no smtp server'))
+    def test_unreachable_mail_server_is_retried_later(self, get_connection):
+        email = enqueue_email('Hi', 'Body', ['a@example.com'])
+
+        self.assertEqual(drain_outbox(), (0, 1))
+
+        email.refresh_from_db()
+        self.assertEqual((email.status, email.attempts, email.last_error), ('pending', 1, 'no smtp server'))
+
+    @mock.patch('users.outbox.get_connection', BrokenConnection)
+    def test_gives_up_after_max_attempts(self):
+        email = enqueue_email('Hi', 'Body', ['a@example.com'])
+        OutboxEmail.objects.filter(pk=email.pk).update(attempts=settings.OUTBOX_MAX_ATTEMPTS - 1)
+
+        send_batch(claim_batch())
+
+        email.refresh_from_db()
+        self.assertEqual((email.status, email.attempts), ('failed', settings.OUTBOX_MAX_ATTEMPTS))
+
+
+class LoginTests(TestCase):
+    def setUp(self):
+        self.user = create_user()
+        self.client = APIClient()
+
+    def login(self, email, password):
+        return self.client.post('/token/', {'email': email, 'password': password}, format='json')
+
+    def test_login_takes_one_query(self):
+        with self.assertNumQueries(1):
+            response = self.login('user@example.com', 'passw0rd-123')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['user']['id'], self.user.pk)
+        self.assertIn('access', response.data)
+
+    def test_unknown_email_looks_like_a_wrong_password(self):
+        with mock.patch('users.serializers.CustomUser.set_password') as set_password:
+            unknown = self.login('nobody@example.com', 'passw0rd-123')
+        wrong = self.login('user@example.com', 'wrong-passw0rd')
+
+        # the unknown email still pays for a password hash
+        set_password.assert_called_once_with('passw0rd-123')
+        self.assertEqual((unknown.status_code, wrong.status_code), (400, 400))
+        self.assertEqual(unknown.data, wrong.data)
+
+    def test_there_is_no_second_login_endpoint(self):
+        self.assertEqual(self.login('user@example.com', 'passw0rd-123').status_code, 200)
+        self.assertEqual(self.client.post('/login/', {'email': 'user@example.com', 'password': 'passw0rd-123'},
+                                          format='json').status_code, 404)
+
+
+class AuthUserCacheTests(TestCase):
+    def setUp(self):
+        user_cache._local.clear()
+        self.user = create_user()
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {RefreshToken.for_user(self.user).access_token}')
+
+    def test_cached_user_serves_protected_and_profile_without_queries(self):
+        with self.assertNumQueries(1):
+            self.assertEqual(self.client.get('/protected/').status_code, 200)
+
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get('/protected/').data['user'], 'Ann')
+        with self.assertNumQueries(0):
+            response = self.client.get('/profile/')
+        self.assertEqual(response.data, {'email': 'user@example.com', 'first_name': 'Ann', 'last_name': 'Lee',
+                                         'phone': '+380000000001', 'is_email_verified': False})
+
+    def test_cache_never_holds_the_password_hash(self):
+        self.client.get('/profile/')
+
+        cached = user_cache.get(user_cache_params(self.user.pk))
+        self.assertNotIn('password', cached)
+        self.assertNotIn(self.user.password, cached.values())
+
+    def test_profile_update_drops_the_cached_user(self):
+        self.client.get('/profile/')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.put('/profile/', {'first_name': 'Bea'}, format='json')
+
+        self.assertEqual(response.data['first_name'], 'Bea')
+        self.assertIsNone(user_cache.get(user_cache_params(self.user.pk)))
+        self.assertEqual(self.client.get('/profile/').data['first_name'], 'Bea')
+        # the cached request.user did not write its fields back
+        self.assertTrue(CustomUser.objects.get(pk=self.user.pk).check_password('passw0rd-123'))
+
+    def test_deactivated_user_is_refused(self):
+        self.client.get('/profile/')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.is_active = False
+            self.user.save()
+
+        self.assertEqual(self.client.get('/profile/').status_code, 401)
+
+    def test_password_change_revokes_tokens(self):
+        self.client.get('/profile/')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.put('/profile/', {'password': 'new-passw0rd-456'}, format='json')
+
+        self.assertEqual(self.client.get('/profile/').status_code, 401)
+
+    def test_tokens_without_the_revoke_claim(self):
+        access = RefreshToken.for_user(self.user).access_token
+        del access[api_settings.REVOKE_TOKEN_CLAIM]
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {access}')
+
+        self.assertEqual(self.client.get('/profile/').status_code, 200)
+        with mock.patch.object(settings, 'AUTH_ACCEPT_TOKENS_WITHOUT_REVOKE_CLAIM', False):
+            self.assertEqual(self.client.get('/profile/').status_code, 401)
+
+
+class TokenBlacklistTests(TestCase):
+    def setUp(self):
+        token_blacklist.reset()
+        self.user = create_user()
+        self.client = APIClient()
+
+    def tearDown(self):
+        token_blacklist.reset()
+
+    def login(self):
+        response = self.client.post('/token/', {'email': 'user@example.com', 'password': 'passw0rd-123'},
+                                    format='json')
+        self.assertEqual(response.status_code, 200)
+        return response.data['refresh']
+
+    def test_logged_out_refresh_token_is_rejected(self):
+        refresh = self.login()
+        other = self.login()
+
+        self.assertEqual(self.client.post('/token/refresh/', {'refresh': refresh}, format='json').status_code, 200)
+        self.assertEqual(self.client.post('/logout/', {'refresh': refresh}, format='json').status_code, 200)
+
+        self.assertEqual(self.client.post('/token/refresh/', {'refresh': refresh}, format='json').status_code, 401)
+        self.assertEqual(self.client.post('/token/refresh/', {'refresh': other}, format='json').status_code, 200)
+
+    def test_logout_with_an_invalid_token_fails(self):
+        self.assertEqual(self.client.post('/logout/', {'refresh': 'junk'}, format='json').status_code, 401)
+
+    def test_bloom_filter_has_no_false_negatives(self):
+        bloom = BloomFilter(1000, 0.01)
+        added = [uuid.uuid4().hex for _ in range(1000)]
+        for jti in added:
+            bloom.add(jti)
+
+        self.assertTrue(all(jti in bloom for jti in added))
+        false_positives = sum(uuid.uuid4().hex in bloom for _ in range(10000))
+        self.assertLess(false_positives, 300)
+
+
+class RedisTokenBlacklistTests(TestCase):
+    """The Redis paths of users.blacklist, against an in-memory stand-in for Redis."""
+
+    def setUp(self):
+        self.redis = FakeRedis()
+        patcher = mock.patch('users.blacklist.get_redis', side_effect=lambda: self.redis)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.exp = time.time() + 3600
+
+    def test_blacklisted_jti_is_stored_in_redis_with_the_token_lifetime(self):
+        blacklist = TokenBlacklist()
+        blacklist.add('revoked', self.exp)
+
+        self.assertIn('revoked', blacklist)
+        self.assertNotIn('other', blacklist)
+        self.assertEqual(blacklist._local, {})
+        value, expires_at = self.redis.keys[KEY_PREFIX + 'revoked']
+        self.assertAlmostEqual(expires_at, self.exp, delta=2)
+
+    def test_expired_token_is_not_stored(self):
+        blacklist = TokenBlacklist()
+        blacklist.add('expired', time.time() - 1)
+
+        self.assertEqual(self.redis.keys, {})
+
+    def test_filter_misses_do_not_ask_redis(self):
+        blacklist = TokenBlacklist()
+        blacklist.add('revoked', self.exp)
+        self.assertIn('revoked', blacklist)
+        calls = self.redis.exists_calls
+
+        for _ in range(50):
+            self.assertNotIn(uuid.uuid4().hex, blacklist)
+
+        self.assertEqual(self.redis.exists_calls, calls)
+
+    @mock.patch.object(settings, 'TOKEN_BLACKLIST_SYNC_INTERVAL', 0)
+    def test_other_processes_catch_up_through_the_log(self):
+        worker = TokenBlacklist()
+        self.assertNotIn('revoked', worker)
+
+        TokenBlacklist().add('revoked', self.exp)
+
+        self.assertIn('revoked', worker)
+
+    def test_filter_hit_is_confirmed_in_redis(self):
+        blacklist = TokenBlacklist()
+        self.assertNotIn('seed', blacklist)
+        # a false positive: in the filter, but never blacklisted
+        blacklist._filter.add('innocent')
+        calls = self.redis.exists_calls
+
+        self.assertNotIn('innocent', blacklist)
+        self.assertEqual(self.redis.exists_calls, calls + 1)
+
+        # nor is a blacklisted jti kept once its Redis key has expired
+        blacklist.add('revoked', self.exp)
+        self.redis.keys.clear()
+        self.assertNotIn('revoked', blacklist)
+
+    def test_unconfirmed_filter_hit_is_refused(self):
+        blacklist = TokenBlacklist()
+        blacklist.add('revoked', self.exp)
+        self.assertIn('revoked', blacklist)
+
+        self.redis = BrokenRedis()
+        with self.assertLogs('users.blacklist', 'WARNING'):
+            self.assertIn('revoked', blacklist)
+
+    def test_unreachable_redis_without_a_filter_lets_tokens_through(self):
+        self.redis = BrokenRedis()
+        blacklist = TokenBlacklist()
+
+        with self.assertLogs('users.blacklist', 'WARNING'):
+            self.assertNotIn('anything', blacklist)
+
+    def test_failed_write_is_still_refused_by_this_process(self):
+        self.redis = BrokenRedis()
+        blacklist = TokenBlacklist()
 
-# Create your tests here.
+        with self.assertLogs('users.blacklist', 'WARNING'):
+            blacklist.add('revoked', self.exp)
+            self.assertIn('revoked', blacklist)
+        self.assertIn('revoked', blacklist._local)
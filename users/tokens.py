@@ -0,0 +1,21 @@
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt import tokens
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.settings import api_settings
+
+from .blacklist import token_blacklist
+
+
+class RefreshToken(tokens.RefreshToken):
+    """A refresh token blacklisted in users.blacklist rather than simplejwt's token_blacklist tables."""
+
+    def verify(self, *args, **kwargs):
+        super().verify(*args, **kwargs)
+        self.check_blacklist()
+
+    def check_blacklist(self):
+        if self.payload[api_settings.JTI_CLAIM] in token_blacklist:
+            raise TokenError(_("Token is blacklisted"))
+
+    def blacklist(self):
+        token_blacklist.add(self.payload[api_settings.JTI_CLAIM], self.payload['exp'])
@@ -1,17 +1,14 @@
 from django.urls import path
-from rest_framework_simplejwt.views import TokenRefreshView
-
-from .serializers import CustomTokenObtainPairView
-from .views import RegisterView, LoginView, LogoutView, ProtectedAPIView, VerifyEmailView, ForgotPasswordView, \
+from .serializers import CustomTokenObtainPairView, CustomTokenRefreshView
+from .views import RegisterView, LogoutView, ProtectedAPIView, VerifyEmailView, ForgotPasswordView, \
     ResetPasswordView, ProfileView
 
 app_name = 'users'
 
 urlpatterns = [
     path('register/', RegisterView.as_view(), name='register'),
-    path('login/', LoginView.as_view(), name='login'),
     path('token/', CustomTokenObtainPairView.as_view(), name='token_obtain_pair'),
-    path('token/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
+    path('token/refresh/', CustomTokenRefreshView.as_view(), name='token_refresh'),
     path('logout/', LogoutView.as_view(), name='logout'),
     path('protected/', ProtectedAPIView.as_view(), name='protected'),
     path('verify-email/<uidb64>/<token>/', VerifyEmailView.as_view(), name='verify-email'),
@@ -1,7 +1,8 @@
 import logging
 
-from django.contrib.auth import authenticate, get_user_model
+from django.contrib.auth import get_user_model
 from django.contrib.auth.tokens import default_token_generator
+from django.db import transaction
 from django.shortcuts import redirect
 from django.utils.encoding import force_str
 from django.utils.http import urlsafe_base64_decode
@@ -10,9 +11,9 @@ from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from rest_framework.views import APIView
-from rest_framework_simplejwt.tokens import RefreshToken
 from yaml import serialize
 
+from .tokens import RefreshToken
 from .utils import send_password_reset_email
 
 from users.serializers import RegisterSerializer, CustomUser, ProfileSerializer
@@ -29,8 +30,10 @@ class RegisterView(APIView):
     def post(self, request):
         serializer = RegisterSerializer(data=request.data)
         if serializer.is_valid():
-            user = serializer.save()
-            user.send_verification_email(request)
+            # the verification email is only queued; `manage.py send_outbox` sends it
+            with transaction.atomic():
+                user = serializer.save()
+                user.send_verification_email(request)
             return Response(
                 {
                     'user': RegisterSerializer(user).data,
@@ -60,42 +63,6 @@ class VerifyEmailView(APIView):
             return redirect("http://localhost:5173/email-error")
 
 
-class LoginView(APIView):
-    permission_classes = []
-    authentication_classes = []
-
-
-def post(self, request):
-    email = request.data.get('email')
-    password = request.data.get('password')
-
-    if not email or not password:
-        return Response({'error': 'Enter both email and password'}, status=status.HTTP_400_BAD_REQUEST)
-
-    try:
-        user = CustomUser.objects.get(email=email)
-    except CustomUser.DoesNotExist:
-        return Response({'error': 'User with this email does not exist'}, status=status.HTTP_404_NOT_FOUND)
-
-    user = authenticate(request, email=email, password=password)
-
-    if user is None:
-        return Response({'error': 'Invalid password or email'}, status=status.HTTP_401_UNAUTHORIZED)
-
-    if not user.is_email_verified:
-        return Response({'error': 'Email not verified'}, status=status.HTTP_403_FORBIDDEN)
-
-    refresh = RefreshToken.for_user(user)
-    return Response({
-        'access': str(refresh.access_token),
-        'refresh': str(refresh),
-        'user': {
-            'id': user.id,
-            'email': user.email,
-        }
-    })
-
-
 class LogoutView(APIView):
     permission_classes = (permissions.AllowAny,)
 
@@ -164,12 +131,17 @@ class ResetPasswordView(APIView):
 class ProfileView(APIView):
     permission_classes = [IsAuthenticated]
 
+    def get_object(self):
+        # request.user may come from the authentication cache and be a few seconds stale; writes start from the row
+        return CustomUser.objects.get(pk=self.request.user.pk)
+
     def get(self, request):
+        # every field the serializer reads is in the authentication cache
         serializer = ProfileSerializer(request.user)
         return Response(serializer.data)
 
     def put(self, request):
-        serializer = ProfileSerializer(request.user, data=request.data, partial=True)
+        serializer = ProfileSerializer(self.get_object(), data=request.data, partial=True)
         serializer.is_valid(raise_exception=True)
         new_password = serializer.validated_data.pop('password', None)
         user = serializer.instance
@@ -180,6 +152,6 @@ class ProfileView(APIView):
         return Response(ProfileSerializer(user).data)
 
     def delete(self, request):
-        user = request.user
+        user = self.get_object()
         user.delete()
         return Response({"message": "Account deleted"}, status=status.HTTP_200_OK)
\ No newline at end of file